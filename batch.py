@@ -0,0 +1,195 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from scipy.ndimage import gaussian_filter1d
+
+import gee
+import stats
+import weights
+import interpolate
+import store
+import partials
+import tiles
+import instrument
+
+# Default parameters, same as main.py
+DEFAULT_PARAMS = {
+    "start_date": "2023-12-01",
+    "end_date": "2024-12-01",
+    "cloud_pct": 90,
+    "cloud_threshold": 30,
+    "interp_start": "2024-06-01",
+    "interp_end": "2024-10-22",
+    "method": "univariate",
+    "sigma": 2,
+    "store_root": None,     # columnar statistics store (see store.py); None to skip
+    "tile_size": None,      # degrees; reduce large farms tile by tile (see partials.py)
+}
+
+# Read every farm polygon of a GeoPackage layer as (farm_id, exterior coords, crs)
+def read_farms(path="131_farms.gpkg", id_column=None):
+    import geopandas as gpd
+    data = gpd.read_file(path)
+    crs = data.crs.to_string() if data.crs else "EPSG:4326"
+    farms = []
+    for i, row in enumerate(data.itertuples(index=False)):
+        geom = row.geometry
+        if geom is None or geom.is_empty:
+            continue
+        # Multi-part farms: use the largest part
+        if geom.geom_type == "MultiPolygon":
+            geom = max(geom.geoms, key=lambda g: g.area)
+        farm_id = getattr(row, id_column) if id_column else i + 1
+        farms.append((farm_id, [list(p[:2]) for p in geom.exterior.coords], crs))
+    return farms
+
+def farm_output_dir(output_root, farm_id):
+    return os.path.join(output_root, f"custom farm {farm_id}")
+
+# Closed lon/lat ring of a farm polygon given in its layer CRS
+def farm_lonlat(coords, crs):
+    return gee.transform_coords(coords, from_crs=crs)
+
+# Closed lon/lat rings {farm_id: ring} for many farms, one bulk transform per CRS
+def farms_lonlat(farms):
+    by_crs = {}
+    for farm_id, coords, crs in farms:
+        by_crs.setdefault(crs, []).append((farm_id, coords))
+    lonlat = {}
+    for crs, members in by_crs.items():
+        rings = gee.transform_coords_bulk([coords for _, coords in members], from_crs=crs)
+        lonlat.update(zip([farm_id for farm_id, _ in members], rings))
+    return lonlat
+
+# Full single-farm pipeline: transform, load collection, mask, stats, weights, interpolation
+def run_farm_pipeline(farm_id, coords, crs, out_dir, params):
+    lonlat = farm_lonlat(coords, crs)
+    region = gee.create_region(lonlat)
+
+    ic = gee.load_s2_collection(region, params["start_date"], params["end_date"], cloud_pct=params["cloud_pct"])
+    ndvi_collection = gee.mask_and_calculate_ndvi(ic, cloud_threshold=params["cloud_threshold"])
+    if params.get("tile_size"):
+        series = partials.extract_partials_tiled(ndvi_collection, region, lonlat, params["tile_size"]).finalize()
+    else:
+        series = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+    return postprocess_farm(farm_id, series, out_dir, params)
+
+# Weights, interpolation and output of one farm's extracted statistics (the 8-tuple)
+def postprocess_farm(farm_id, series, out_dir, params):
+    dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = series
+
+    fractions_f = weights.calculate_valid_fractions(pixels_f, total_pixels_f)
+    weights_f = weights.assign_weights(fractions_f)
+
+    if len(dates_f) > 0:
+        means_masked = interpolate.mask_dates_for_interpolation(
+            dates_f, means_f, params["interp_start"], params["interp_end"], outside_to_nan=False)
+        means_spline = interpolate.spline_interpolate_ndvi(dates_f, means_masked, method=params["method"])
+        means_gauss = gaussian_filter1d(means_f, sigma=params["sigma"])
+    else:
+        means_spline = np.array([])
+        means_gauss = np.array([])
+
+    os.makedirs(out_dir, exist_ok=True)
+    table = pd.DataFrame({
+        "date": list(dates_f),
+        "mean": means_f,
+        "median": medians_f,
+        "std": stds_f,
+        "p10": perc_10_f,
+        "p90": perc_90_f,
+        "valid_pixels": pixels_f,
+        "total_pixels": total_pixels_f,
+        "fraction": fractions_f,
+        "weight": weights_f,
+        "mean_spline": means_spline,
+        "mean_gauss": means_gauss,
+    })
+    table.to_csv(os.path.join(out_dir, "stats.csv"), index=False)
+    if params.get("store_root"):
+        store.write_farm_stats(params["store_root"], farm_id, series, fractions_f, weights_f)
+    return {"farm_id": farm_id, "images": len(dates_f), "out_dir": out_dir}
+
+# One farm's work, attributed to the farm when instrumentation is on
+def _run_farm(fn, farm_id, *args):
+    with instrument.farm(farm_id):
+        return fn(farm_id, *args)
+
+# Run the pipeline for many farms on a bounded thread pool.
+# Earth Engine requests from all workers share the process-wide gee in-flight cap, which is set
+# once at startup (gee.set_max_inflight, --max-inflight) rather than per batch.
+def run_batch(farms, output_root=".", max_workers=8, pipeline=run_farm_pipeline, params=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_run_farm, pipeline, farm_id, coords, crs, farm_output_dir(output_root, farm_id), params): farm_id
+            for farm_id, coords, crs in farms
+        }
+        for future in as_completed(futures):
+            farm_id = futures[future]
+            try:
+                results[farm_id] = future.result()
+            except Exception as exc:
+                errors[farm_id] = exc
+                print(f"Farm {farm_id} failed: {exc}")
+    return results, errors
+
+# Same as run_batch, but statistics come from tile-grouped queries (see tiles.py):
+# one collection query and one reduceRegions per group of neighbouring farms
+def run_batch_by_tile(farms, output_root=".", max_workers=8, query_workers=8, params=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    lonlat = farms_lonlat(farms)
+    farm_stats, groups = tiles.extract_stats_by_tile(
+        lonlat, params["start_date"], params["end_date"], params["cloud_pct"], params["cloud_threshold"],
+        max_workers=query_workers)
+    print(f"Queried {len(groups)} tile groups for {len(farms)} farms")
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_run_farm, postprocess_farm, farm_id, series, farm_output_dir(output_root, farm_id), params): farm_id
+            for farm_id, series in farm_stats.items()
+        }
+        for future in as_completed(futures):
+            farm_id = futures[future]
+            try:
+                results[farm_id] = future.result()
+            except Exception as exc:
+                errors[farm_id] = exc
+                print(f"Farm {farm_id} failed: {exc}")
+    return results, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the NDVI pipeline for every farm of a GeoPackage layer")
+    parser.add_argument("--gpkg", default="131_farms.gpkg")
+    parser.add_argument("--id-column", default=None)
+    parser.add_argument("--output-root", default=".")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-inflight", type=int, default=8)
+    parser.add_argument("--project", default="brijesh-ndvi")
+    parser.add_argument("--store-root", default=None, help="write statistics to this columnar store")
+    parser.add_argument("--tile-size", type=float, default=None,
+                        help="reduce each farm in sub-tiles of this size (degrees) and merge the partials")
+    parser.add_argument("--group-by-tile", action="store_true", help="one query per group of neighbouring farms")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.start(args)
+
+    gee.initialize_ee(project=args.project)
+    gee.set_max_inflight(args.max_inflight)
+    farms = read_farms(args.gpkg, args.id_column)
+    print(f"Processing {len(farms)} farms with {args.workers} workers...")
+    t0 = time.perf_counter()
+    params = {"store_root": args.store_root, "tile_size": args.tile_size}
+    if args.group_by_tile:
+        results, errors = run_batch_by_tile(farms, args.output_root, args.workers, args.max_inflight, params=params)
+    else:
+        results, errors = run_batch(farms, args.output_root, args.workers, params=params)
+    print(f"Done: {len(results)} farms ok, {len(errors)} failed in {time.perf_counter() - t0:.1f} s")
+    instrument.finish(args)
@@ -0,0 +1,420 @@
+# benchmark.py
+# Throughput benchmarks for the post-processing stages. Run: python benchmark.py [name ...]
+# The "suite" benchmark runs stats, weights, gap-fill and plotting end to end on the fake Earth
+# Engine and appends its results to benchmark_results.jsonl so runs can be compared over time:
+#   python benchmark.py suite [--latency 0.02] [--results benchmark_results.jsonl]
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from scipy.interpolate import UnivariateSpline
+import interpolate
+import phenology
+
+
+def synthetic_series(n_farms=300, n_dates=73, seed=0):
+    # Noisy single-season NDVI curves on a 5-day Sentinel-2 revisit, ~15% cloud gaps
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2023-12-01") + np.arange(n_dates) * np.timedelta64(5, "D")
+    t = np.arange(n_dates) / n_dates
+    peak = rng.uniform(0.35, 0.65, (n_farms, 1))
+    ndvi = 0.2 + 0.6 * np.exp(-((t - peak) / 0.15) ** 2) + 0.03 * rng.standard_normal((n_farms, n_dates))
+    ndvi[rng.random((n_farms, n_dates)) < 0.15] = np.nan
+    return dates, ndvi
+
+
+def timed(fn, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def report(name, seconds, items, unit="series"):
+    print(f"{name:<40} {seconds * 1e3:9.2f} ms  {items / seconds:12.0f} {unit}/s")
+
+
+# Batched (farms x dates) gap-filling versus the per-series loop with string dates
+def bench_interpolate(n_farms=300):
+    dates, ndvi = synthetic_series(n_farms)
+    date_strings = [str(d) for d in dates]
+    print(f"\n-- interpolate: {n_farms} farms x {len(dates)} dates")
+    for method in ("pchip", "cubic", "univariate"):
+        def loop():
+            out = []
+            for row in ndvi:
+                masked = interpolate.mask_dates_for_interpolation(date_strings, row, "2024-06-01", "2024-10-22")
+                out.append(interpolate.spline_interpolate_ndvi(date_strings, masked, method=method))
+            return np.array(out)
+
+        def batched():
+            masked = interpolate.mask_dates_for_interpolation(dates, ndvi, "2024-06-01", "2024-10-22")
+            return interpolate.spline_interpolate_ndvi(dates, masked, method=method)
+
+        t_loop, a = timed(loop)
+        t_batch, b = timed(batched)
+        np.testing.assert_allclose(a, b, equal_nan=True)
+        report(f"{method} per-series loop", t_loop, n_farms)
+        report(f"{method} batched", t_batch, n_farms)
+
+
+# Weighted Whittaker gap-fill + smoothing on a multi-year daily grid
+def bench_whittaker(n_farms=300, years=3):
+    n_dates = 365 * years
+    dates = np.datetime64("2021-01-01") + np.arange(n_dates) * np.timedelta64(1, "D")
+    rng = np.random.default_rng(1)
+    ndvi = 0.4 + 0.3 * np.sin(2 * np.pi * np.arange(n_dates) / 365)[None] + 0.05 * rng.standard_normal((n_farms, n_dates))
+    weights = rng.integers(0, 6, ndvi.shape).astype(float)
+    ndvi[weights == 0] = np.nan
+    print(f"\n-- whittaker: {n_farms} farms x {n_dates} daily dates")
+    t, _ = timed(lambda: interpolate.spline_interpolate_ndvi(dates, ndvi, method="whittaker", weights=weights))
+    report("whittaker batched", t, n_farms)
+
+
+# Brute force: refit UnivariateSpline for every candidate s and every left-out point
+def brute_force_loo_smoothing(x, y, candidates):
+    scores = []
+    for s in candidates:
+        errors = []
+        for i in range(len(x)):
+            keep = np.arange(len(x)) != i
+            f = UnivariateSpline(x[keep], y[keep], s=s * (len(x) - 1) / len(x))
+            errors.append((f(x[i]) - y[i]) ** 2)
+        scores.append(np.mean(errors))
+    return candidates[int(np.argmin(scores))]
+
+
+# Closed-form GCV/LOO smoothing selection versus brute-force refitting
+def bench_smoothing(n_farms=200, n_brute=10):
+    dates, ndvi = synthetic_series(n_farms)
+    x_full = interpolate.days_since_start(dates)
+    print(f"\n-- smoothing selection: {len(dates)} dates per series")
+    t_gcv, (s_gcv, _) = timed(lambda: interpolate.select_smoothing(dates, ndvi, "gcv"), repeat=1)
+    t_loo, (s_loo, _) = timed(lambda: interpolate.select_smoothing(dates, ndvi, "loo"), repeat=1)
+    report("closed-form GCV", t_gcv, n_farms)
+    report("closed-form LOO", t_loo, n_farms)
+
+    candidates = np.logspace(-3, 0, 25)
+
+    def brute():
+        chosen = []
+        for row in ndvi[:n_brute]:
+            mask = ~np.isnan(row)
+            chosen.append(brute_force_loo_smoothing(x_full[mask], row[mask], candidates))
+        return np.array(chosen)
+    t_brute, s_brute = timed(brute, repeat=1)
+    report("brute-force LOO refits", t_brute, n_brute)
+    print(f"median chosen s: gcv {np.median(s_gcv):.4f}  loo {np.median(s_loo):.4f}  brute {np.median(s_brute):.4f}")
+
+
+# Vectorized stage classification and season metrics for many farms
+def bench_phenology(n_farms=500):
+    dates, ndvi = synthetic_series(n_farms)
+    filled = interpolate.spline_interpolate_ndvi(dates, ndvi, method="pchip")
+    print(f"\n-- phenology: {n_farms} farms x {len(dates)} dates")
+    t, _ = timed(lambda: phenology.classify_stages(filled))
+    report("classify_stages", t, n_farms)
+    t, _ = timed(lambda: phenology.season_metrics(dates, filled))
+    report("season_metrics", t, n_farms)
+
+
+# Headless rendering of the full figure set for one farm, and stage shading on its own
+def bench_plot(n_farms=3):
+    import tempfile
+    import matplotlib.pyplot as plt
+    import plot
+    dates, ndvi = synthetic_series(n_farms)
+    values = np.nan_to_num(ndvi, nan=0.3)
+    print(f"\n-- plot: {len(dates)} dates, 9 figures per farm")
+
+    plot.configure(output_dir=tempfile.mkdtemp(), formats=("png",))
+
+    def render():
+        for row in values:
+            plot.plot_mean_ndvi(dates, row, row)
+            plot.plot_median_ndvi(dates, row, row)
+            plot.plot_ndvi_stddev(dates, row, row)
+            plot.plot_ndvi_percentiles(dates, row, row, row, row)
+            plot.plot_valid_pixel_count(dates, np.arange(len(row)))
+            plot.plot_valid_pixel_fraction(dates, row)
+            plot.plot_all_ndvi_statistics(dates, row, row, row, row, row)
+            plot.plot_mean_ndvi_with_spline(dates, row, row, row)
+            plot.plot_mean_ndvi_with_linear(dates, row, row, row)
+    t, _ = timed(render, repeat=1)
+    report("headless figure set", t, n_farms, "farms")
+    plot.close()
+    plot.configure()
+
+    fig, ax = plt.subplots()
+    ax.plot(dates, values[0])
+    stages = plot.phenology.classify_stages(values[0])
+
+    def per_segment():
+        for i in range(1, len(dates)):
+            ax.fill_between(dates[i-1:i+1], 0, values[0][i-1:i+1], color=plot.phenology.STAGE_COLORS[stages[i]], alpha=0.38)
+        fig.canvas.draw()
+    t_seg, _ = timed(per_segment)
+    for c in list(ax.collections):
+        c.remove()
+    t_col, _ = timed(lambda: (plot.shade_stages(ax, dates, values[0], stages), fig.canvas.draw()))
+    report("shading: fill_between per segment", t_seg, 1, "figures")
+    report("shading: single collection", t_col, 1, "figures")
+    plt.close(fig)
+
+
+def synthetic_farm_rings(n_farms=2000, n_vertices=200, seed=0):
+    # Detailed field boundaries in EPSG:3857 around the main.py farm
+    rng = np.random.default_rng(seed)
+    centres = np.array([8915700.0, 3231770.0]) + rng.uniform(-5e4, 5e4, (n_farms, 2))
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    radii = rng.uniform(80, 200, (n_farms, 1)) * (1 + 0.1 * rng.standard_normal((n_farms, n_vertices)))
+    return np.stack([centres[:, :1] + radii * np.cos(angles), centres[:, 1:] + radii * np.sin(angles)], axis=-1)
+
+
+# Bulk coordinate transformation with cached transformers versus one Transformer per farm
+def bench_transform(n_farms=2000, n_vertices=200):
+    import sys
+    import fake_ee
+    sys.modules.setdefault("ee", fake_ee)
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+    from pyproj import Transformer
+    import gee
+
+    def legacy_transform_coords(coords_meters, from_crs="EPSG:3857", to_crs="EPSG:4326"):
+        transformer = Transformer.from_crs(from_crs, to_crs)
+        coords_lonlat = [transformer.transform(x, y) for x, y in coords_meters]
+        coords_lonlat_fixed = [[lon, lat] for lat, lon in coords_lonlat]
+        if coords_lonlat_fixed[0] != coords_lonlat_fixed[-1]:
+            coords_lonlat_fixed.append(coords_lonlat_fixed[0])
+        return coords_lonlat_fixed
+
+    rings = synthetic_farm_rings(n_farms, n_vertices)
+    gdf = gpd.GeoDataFrame(geometry=[Polygon(r) for r in rings], crs="EPSG:3857")
+    print(f"\n-- transform: {n_farms} farms x {n_vertices} vertices")
+    t_old, old = timed(lambda: [legacy_transform_coords(r.tolist()) for r in rings], repeat=1)
+    t_new, new = timed(lambda: gee.transform_coords_bulk(rings))
+    t_gdf, _ = timed(lambda: gee.transform_geodataframe(gdf))
+    np.testing.assert_allclose(np.array(old), np.array(new))
+    report("per-farm Transformer (before)", t_old, n_farms, "farms")
+    report("transform_coords_bulk", t_new, n_farms, "farms")
+    report("transform_geodataframe", t_gdf, n_farms, "farms")
+
+
+# Scene pre-screening on the fake Earth Engine backend: round trips and wall time of the
+# per-image and batched statistics paths with and without the coarse valid-fraction screen
+def bench_prescreen(n_scenes=73, latency=0.02):
+    import sys
+    import fake_ee
+    sys.modules.setdefault("ee", fake_ee)
+    import gee
+    import stats
+
+    rng = np.random.default_rng(2)
+    t0 = 1701388800000
+    clouds = np.where(rng.random(n_scenes) < 0.4, rng.uniform(0.75, 1.0, n_scenes), rng.uniform(0.0, 0.3, n_scenes))
+    scenes = [fake_ee.synthetic_scene(t0 + 5 * i * 86400000, ndvi=0.5, cloud_fraction=c, seed=i)
+              for i, c in enumerate(clouds)]
+    region = gee.create_region([[77.0, 28.0], [77.0, 28.006], [77.008, 28.006], [77.008, 28.0], [77.0, 28.0]])
+    ndvi_collection = gee.mask_and_calculate_ndvi(fake_ee.ImageCollection(scenes))
+    screened = gee.prescreen_collection(ndvi_collection, region)
+    kept = gee.screen_summary(ndvi_collection, region)["kept"]
+    print(f"\n-- prescreen: {n_scenes} scenes, {kept} kept, {latency * 1e3:.0f} ms per round trip")
+
+    fake_ee.latency = latency
+    try:
+        for label, collection in (("no screen", ndvi_collection), ("prescreened", screened)):
+            def per_image():
+                count = collection.size().getInfo()
+                return stats.extract_ndvi_stats(collection.toList(count), region, count)
+            for path, fn in (("per-image", per_image),
+                             ("batched", lambda: stats.extract_ndvi_stats_batched(collection, region))):
+                fake_ee.reset()
+                t, _ = timed(fn, repeat=1)
+                print(f"{path + ' ' + label:<40} {t * 1e3:9.2f} ms  {fake_ee.calls:8d} round trips")
+    finally:
+        fake_ee.latency = 0.0
+
+
+# Cold start of cli.py in fresh interpreters on statistics fetched (from the fake) beforehand:
+# wall time and the heavy top-level packages each subcommand ends up importing
+def bench_cli(repeat=3):
+    import tempfile
+    import fake_ee
+    fake_ee.install(n_scenes=73)
+    import cli
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    heavy = ("ee", "pyproj", "scipy", "pandas", "pyarrow", "matplotlib")
+    print("\n-- cli cold start: fresh interpreter, statistics already fetched")
+    with tempfile.TemporaryDirectory() as tmp:
+        coords = os.path.join(tmp, "farm.json")
+        with open(coords, "w") as f:
+            json.dump([[8571600.0, 3252400.0], [8571600.0, 3252800.0], [8572200.0, 3252800.0], [8572200.0, 3252400.0]], f)
+        common = ["--coords", coords, "--cache-dir", os.path.join(tmp, "memo"),
+                  "--stats-cache", os.path.join(tmp, "cache.sqlite"), "--store-root", ""]
+        cli.main(["fetch", *common])
+        for argv in (["--help"], ["report", *common, "--cache-only", "--output", os.path.join(tmp, "r.csv")],
+                     ["gap-fill", *common, "--cache-only", "--output", os.path.join(tmp, "g.csv")],
+                     ["plot", *common, "--cache-only", "--output-dir", os.path.join(tmp, "plots")]):
+            best, imported = np.inf, set()
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                proc = subprocess.run([sys.executable, "-X", "importtime", "cli.py", *argv],
+                                      capture_output=True, text=True, cwd=here)
+                best = min(best, time.perf_counter() - t0)
+                imported = {line.split("|")[-1].strip().split(".")[0]
+                            for line in proc.stderr.splitlines() if line.startswith("import time:")}
+            print(f"{argv[0]:<40} {best * 1e3:9.2f} ms  imports: {', '.join(m for m in heavy if m in imported) or '-'}")
+
+
+RESULTS_FILE = "benchmark_results.jsonl"
+SUITE_REGION = [[77.0, 28.0], [77.0, 28.004], [77.006, 28.004], [77.006, 28.0], [77.0, 28.0]]
+
+
+# Wall time (best of repeat), fake Earth Engine round trips and peak traced memory of one stage
+def measure(stage, fn, items, unit, repeat=3):
+    import fake_ee
+    fake_ee.reset()
+    wall, _ = timed(fn, repeat)
+    round_trips = fake_ee.calls // repeat
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"stage": stage, "wall_s": wall, "round_trips": round_trips, "peak_mib": peak / 2 ** 20,
+            "items": items, "unit": unit, "throughput": items / wall}
+
+
+def run_suite(latency=0.02, n_scenes=73, n_farms=300, plot_farms=2, repeat=3):
+    import tempfile
+    import fake_ee
+    fake_ee.install(n_scenes=n_scenes, latency_s=latency)
+    import gee
+    import stats
+    import weights
+    import plot
+
+    try:
+        region = gee.create_region(SUITE_REGION)
+        ic = gee.load_s2_collection(region, "2023-12-01", "2024-12-01")
+        ndvi_collection = gee.mask_and_calculate_ndvi(ic)
+        scenes = gee.get_info(ndvi_collection.size())
+        dates, ndvi = synthetic_series(n_farms)
+        valid = np.where(np.isnan(ndvi), 0, 900 - (np.arange(ndvi.size).reshape(ndvi.shape) % 400))
+        masked = interpolate.mask_dates_for_interpolation(dates, ndvi, "2024-06-01", "2024-10-22")
+        series = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+        def weigh():
+            fractions = weights.calculate_valid_fractions(valid, 1000)
+            return weights.assign_weights(fractions)
+
+        def render():
+            for _ in range(plot_farms):
+                plot.plot_mean_ndvi(series[0], series[1], series[1])
+                plot.plot_ndvi_percentiles(series[0], series[4], series[4], series[5], series[5])
+                plot.plot_valid_pixel_fraction(series[0], series[6] / series[7])
+                plot.plot_all_ndvi_statistics(series[0], *series[1:6])
+
+        plot.configure(output_dir=tempfile.mkdtemp(), formats=("png",))
+        records = [
+            measure("stats.batched", lambda: stats.extract_ndvi_stats_batched(ndvi_collection, region),
+                    scenes, "scenes", repeat),
+            measure("stats.stream", lambda: list(stats.iter_ndvi_stats(ndvi_collection, region, chunk_size=16)),
+                    scenes, "scenes", repeat),
+            measure("weights", weigh, n_farms, "series", repeat),
+            measure("gapfill.pchip", lambda: interpolate.spline_interpolate_ndvi(dates, masked, method="pchip"),
+                    n_farms, "series", repeat),
+            measure("gapfill.whittaker", lambda: interpolate.spline_interpolate_ndvi(
+                dates, ndvi, method="whittaker", weights=weigh()), n_farms, "series", repeat),
+            measure("plot", render, plot_farms, "farms", 1),
+        ]
+    finally:
+        plot.close()
+        plot.configure()
+        fake_ee.latency = 0.0
+    return records
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# Append one suite run to the JSONL results file (one line per stage)
+def save_results(records, path=RESULTS_FILE, latency=None):
+    run = {"run": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git_commit(), "latency_s": latency,
+           "python": platform.python_version(), "numpy": np.__version__}
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps({**run, **record}) + "\n")
+
+# Print this run next to the most recent earlier run in the results file
+def print_comparison(records, previous):
+    last = {}
+    if previous:
+        last_run = previous[-1]["run"]
+        last = {r["stage"]: r for r in previous if r["run"] == last_run}
+        print(f"\ncompared with run {last_run} ({previous[-1].get('commit')})")
+    print(f"{'stage':<20} {'wall ms':>10} {'change':>8} {'round trips':>12} {'peak MiB':>9} {'throughput':>16}")
+    for r in records:
+        before = last.get(r["stage"])
+        change = f"{(r['wall_s'] / before['wall_s'] - 1) * 100:+7.1f}%" if before else ""
+        print(f"{r['stage']:<20} {r['wall_s'] * 1e3:10.2f} {change:>8} {r['round_trips']:12d} "
+              f"{r['peak_mib']:9.2f} {r['throughput']:10.4g} {r['unit']}/s")
+
+
+def bench_suite(latency=0.02, results=RESULTS_FILE):
+    print(f"\n-- suite: fake Earth Engine, {latency * 1e3:.0f} ms per round trip")
+    records = run_suite(latency)
+    print_comparison(records, load_results(results))
+    if results:
+        save_results(records, results, latency)
+    return records
+
+
+BENCHMARKS = {
+    "interpolate": bench_interpolate,
+    "whittaker": bench_whittaker,
+    "smoothing": bench_smoothing,
+    "phenology": bench_phenology,
+    "plot": bench_plot,
+    "transform": bench_transform,
+    "prescreen": bench_prescreen,
+    "cli": bench_cli,
+    "suite": bench_suite,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NDVI pipeline benchmarks")
+    parser.add_argument("names", nargs="*", help=", ".join(BENCHMARKS))
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Earth Engine seconds per round trip")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSONL file the suite appends to ('' to skip)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        if name == "suite":
+            bench_suite(args.latency, args.results)
+        else:
+            BENCHMARKS[name]()
@@ -0,0 +1,179 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+import instrument
+import pipeline
+
+# Command line for the single-farm workflow of main.py, one subcommand per pipeline target:
+#   python cli.py fetch    --coords farm1.json --farm-id 1 --start 2023-12-01 --end 2024-12-01
+#   python cli.py gap-fill --coords farm1.json --farm-id 1 --method pchip --output gapfill.csv
+#   python cli.py smooth   --coords farm1.json --farm-id 1 --sigma 3
+#   python cli.py plot     --coords farm1.json --farm-id 1 --output-dir "custom farm 1"
+#   python cli.py report   --coords farm1.json --farm-id 1
+# Only stdlib, numpy and the pipeline are imported up front. Stages import ee, pyproj, scipy,
+# matplotlib or pyarrow when they actually run, so Earth Engine is initialized only when the
+# statistics are not memoized yet: gap-fill, smooth, plot and report on fetched data never log in.
+# fetch checks the date window's scene list and picks up newly acquired scenes.
+# --dry-run prints which stages would run or load; --cache-only refuses to reach Earth Engine.
+
+COMMANDS = {
+    "fetch": ["stats", "weights", "store"],
+    "gap-fill": ["stats", "gapfill"],
+    "smooth": ["stats", "smoothing"],
+    "plot": ["plots"],
+    "report": ["stats", "weights"],
+}
+
+# Stages that initialize or query Earth Engine (statistics of the "ee" and "cube" backends depend on them)
+EE_STAGES = ("region", "collection", "mask")
+
+
+# Farm polygon in EPSG:3857: a JSON file, or the JSON ring itself
+def load_coords(value):
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+def build_parser():
+    defaults = pipeline.DEFAULT_PARAMS
+    common = argparse.ArgumentParser(add_help=False)
+    farm = common.add_argument_group("farm and data")
+    farm.add_argument("--coords", required=True, help="farm polygon in EPSG:3857: JSON file or inline JSON ring")
+    farm.add_argument("--farm-id", default=defaults["farm_id"])
+    farm.add_argument("--project", default=defaults["project"])
+    farm.add_argument("--start", default=defaults["start_date"])
+    farm.add_argument("--end", default=defaults["end_date"])
+    farm.add_argument("--cloud-pct", type=int, default=defaults["cloud_pct"])
+    farm.add_argument("--cloud-threshold", type=int, default=defaults["cloud_threshold"])
+    farm.add_argument("--no-prescreen", action="store_true", help="keep scenes below the valid-fraction threshold")
+    farm.add_argument("--backend", choices=("ee", "local", "cube"), default="ee")
+    farm.add_argument("--stack-dir", default="stack",
+                      help="local backend: <band>.tif stacks and dates.txt (default: %(default)s)")
+    farm.add_argument("--cube-root", default=defaults["cube_root"])
+    farm.add_argument("--stats-cache", default=defaults["stats_cache"])
+    farm.add_argument("--store-root", default=defaults["store_root"], help="empty string: do not write the store")
+    series = common.add_argument_group("gap-fill and smoothing")
+    series.add_argument("--interp-start", default=defaults["interp_start"])
+    series.add_argument("--interp-end", default=defaults["interp_end"])
+    series.add_argument("--method", default=defaults["method"])
+    series.add_argument("--sigma", type=float, default=defaults["sigma"])
+    run = common.add_argument_group("execution")
+    run.add_argument("--cache-dir", default=pipeline.CACHE_DIR)
+    run.add_argument("--dry-run", action="store_true", help="print the stages that would run, run nothing")
+    run.add_argument("--cache-only", action="store_true", help="fail instead of querying Earth Engine")
+    run.add_argument("-v", "--verbose", action="store_true", help="print per-stage timings")
+    instrument.add_arguments(common)
+
+    parser = argparse.ArgumentParser(description="NDVI time series of one farm")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch = commands.add_parser("fetch", parents=[common], help="query statistics and write them to the store")
+    fetch.add_argument("--refresh", action="store_true", help="drop memoized statistics and recompute them even if no scene was added")
+    for name, help_text in (("gap-fill", "spline and Whittaker gap-filled mean NDVI"),
+                            ("smooth", "Gaussian-smoothed statistics"),
+                            ("report", "per-date statistics, valid fractions and weights")):
+        sub = commands.add_parser(name, parents=[common], help=help_text)
+        sub.add_argument("--output", default=None, help="write CSV here instead of printing a table")
+    plots = commands.add_parser("plot", parents=[common], help="render the figures")
+    plots.add_argument("--output-dir", default=None, help="save figures here instead of opening windows")
+    return parser
+
+def params_from_args(args):
+    return {
+        **pipeline.DEFAULT_PARAMS,
+        "project": args.project,
+        "farm_id": str(args.farm_id),
+        "coords_meters": load_coords(args.coords),
+        "start_date": args.start,
+        "end_date": args.end,
+        "cloud_pct": args.cloud_pct,
+        "cloud_threshold": args.cloud_threshold,
+        "prescreen": not args.no_prescreen,
+        "stats_cache": args.stats_cache,
+        "local_stack": {b: os.path.join(args.stack_dir, f"{b}.tif") for b in ("B4", "B8", "QA60", "CLDPRB")},
+        "local_dates_file": os.path.join(args.stack_dir, "dates.txt"),
+        "cube_root": args.cube_root,
+        "store_root": args.store_root,
+        "interp_start": args.interp_start,
+        "interp_end": args.interp_end,
+        "method": args.method,
+        "sigma": args.sigma,
+        "plot_output_dir": getattr(args, "output_dir", None),
+    }
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return f"{value:10.4f}"
+    return f"{value:>10}"
+
+# Aligned table on stdout, or CSV when a path is given
+def write_rows(header, rows, path=None):
+    if path:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} rows to {path}")
+        return
+    print(" | ".join(_cell(h) for h in header))
+    for row in rows:
+        print(" | ".join(_cell(v) for v in row))
+
+def show(command, outputs, args):
+    series = outputs["stats"]
+    dates = list(series[0])
+    if command == "fetch":
+        print(f"{len(dates)} acquisitions for farm {args.farm_id}"
+              + (f", stored in {args.store_root}" if args.store_root else ""))
+    elif command == "gap-fill":
+        spline, whittaker = outputs["gapfill"]
+        write_rows(["date", "mean", args.method, "whittaker"],
+                   [[d, float(m), float(s), float(w)] for d, m, s, w in zip(dates, series[1], spline, whittaker)],
+                   args.output)
+    elif command == "smooth":
+        write_rows(["date", "mean", "median", "std", "p10", "p90"],
+                   [[d, *map(float, values)] for d, *values in zip(dates, *outputs["smoothing"])], args.output)
+    elif command == "report":
+        fractions, weights = outputs["weights"]
+        write_rows(["date", "mean", "median", "std", "p10", "p90", "pixels", "fraction", "weight"],
+                   [[d, *map(float, values), int(c), float(f), int(w)]
+                    for d, *values, c, f, w in zip(dates, *series[1:6], series[6], fractions, weights)],
+                   args.output)
+    elif command == "plot" and args.output_dir:
+        print(f"Figures written to {args.output_dir}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    params = params_from_args(args)
+    targets = COMMANDS[args.command]
+    # Only fetch checks Earth Engine for new scenes; other commands work on the fetched scene list
+    offline = args.command != "fetch" or args.cache_only or args.dry_run
+    pipe = pipeline.farm_pipeline(backend=args.backend, cache_dir=args.cache_dir, offline=offline)
+    if args.command == "fetch" and args.refresh:
+        pipe.clear("stats", params)
+
+    plan = pipe.plan(targets, params)
+    if args.dry_run:
+        for name, how in plan.items():
+            print(f"{name:<12} {how}")
+        return None
+    needs_ee = [name for name, how in plan.items() if how == "run" and name in EE_STAGES]
+    if args.cache_only and needs_ee:
+        sys.exit(f"--cache-only: stages {', '.join(needs_ee)} would query Earth Engine; run `fetch` first")
+
+    instrument.start(args)
+    outputs = pipe.run(targets, params)
+    if args.verbose:
+        print(pipe.summary())
+    show(args.command, outputs, args)
+    instrument.finish(args)
+    return outputs
+
+
+if __name__ == "__main__":
+    main()
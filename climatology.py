@@ -0,0 +1,207 @@
+import argparse
+
+import numpy as np
+
+import interpolate
+
+# Per-farm day-of-year NDVI climatology and anomaly scoring.
+# Multi-year mean NDVI of every farm is gap-filled onto a daily grid with the weighted Whittaker
+# smoother (cloudy acquisitions down-weighted by weights.assign_weights), then pooled per
+# day-of-year bin over all years into mean, spread and percentiles. The result is a compact
+# (farms x bins) index saved as one .npz; scoring new acquisitions against it is a lookup of
+# (farm row, DOY bin) for every farm at once, with no recomputation of history.
+#   python climatology.py build --store-root ndvi_store --output ndvi_climatology.npz
+#   python climatology.py score --store-root ndvi_store --index ndvi_climatology.npz --date 2024-08-12
+
+BIN_DAYS = 8
+PERCENTILES = (0, 5, 10, 25, 50, 75, 90, 95, 100)
+# Filled days further than this from the nearest weighted observation are left missing, so a
+# skipped season or year is not bridged by the smoother and pooled into the baseline as data
+MAX_GAP_DAYS = 2 * BIN_DAYS
+# Spread floor for z-scores, so near-constant bins do not turn noise into large anomalies
+MIN_STD = 0.01
+INDEX_FILE = "ndvi_climatology.npz"
+
+
+def doy_bins(dates, bin_days=BIN_DAYS):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    return (dates - dates.astype("datetime64[Y]")).astype(int) // bin_days
+
+def n_bins(bin_days=BIN_DAYS):
+    return -(-366 // bin_days)
+
+# Linear-interpolated percentiles q of every row of a 2-D array, ignoring NaN (all-NaN rows -> NaN)
+def _row_percentiles(values, q):
+    s = np.sort(values, axis=1)
+    n = np.isfinite(s).sum(axis=1)
+    pos = np.maximum(n - 1, 0)[:, None] * (np.asarray(q, dtype=float) / 100)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    v_lo = np.take_along_axis(s, lo, axis=1)
+    v_hi = np.take_along_axis(s, hi, axis=1)
+    out = v_lo + (pos - lo) * (v_hi - v_lo)
+    out[n == 0] = np.nan
+    return out
+
+# Days from every (row, day) cell to the nearest True cell of its row (inf for rows without any)
+def _distance_to_nearest(observed):
+    day = np.arange(observed.shape[1], dtype=float)
+    last = np.maximum.accumulate(np.where(observed, day, -np.inf), axis=1)
+    following = np.minimum.accumulate(np.where(observed, day, np.inf)[:, ::-1], axis=1)[:, ::-1]
+    return np.minimum(day - last, following - day)
+
+# Weight-aware daily gap-fill of irregular per-farm observations:
+# (daily dates, farms x days filled values, farms x days mask of weighted observations)
+def daily_filled(farm_rows, dates, ndvi, weights, n_farms, max_gap=MAX_GAP_DAYS):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    t0 = dates.min()
+    day = (dates - t0).astype(int)
+    y = np.full((n_farms, day.max() + 1), np.nan)
+    w = np.zeros(y.shape)
+    y[farm_rows, day] = ndvi
+    w[farm_rows, day] = np.where(np.isfinite(ndvi), weights, 0)
+    daily = t0 + np.arange(y.shape[1])
+    filled = interpolate.spline_interpolate_ndvi(daily, y, method="whittaker", weights=w)
+    observed = w > 0
+    filled[_distance_to_nearest(observed) > max_gap] = np.nan
+    return daily, filled, observed
+
+
+class Climatology:
+    def __init__(self, farm_ids, mean, std, percentiles, years, bin_days=BIN_DAYS, levels=PERCENTILES):
+        order = np.argsort(np.asarray(farm_ids, dtype=str))
+        self.farm_ids = np.asarray(farm_ids, dtype=str)[order]    # sorted, for searchsorted lookups
+        self.mean = np.asarray(mean, dtype=np.float32)[order]      # (farms, bins)
+        self.std = np.asarray(std, dtype=np.float32)[order]        # (farms, bins)
+        self.percentiles = np.asarray(percentiles, dtype=np.float32)[order]    # (farms, bins, levels)
+        self.years = np.asarray(years, dtype=np.int16)[order]      # (farms, bins) years with data
+        self.bin_days = int(bin_days)
+        self.levels = np.asarray(levels, dtype=float)
+
+    # Build from observations in long form: one (farm id, date, mean NDVI, weight) per row
+    @classmethod
+    def build(cls, farm_ids, dates, ndvi, weights, bin_days=BIN_DAYS, levels=PERCENTILES):
+        ids, rows = np.unique(np.asarray(farm_ids, dtype=str), return_inverse=True)
+        if not len(ids):
+            shape = (0, n_bins(bin_days))
+            return cls(ids, np.empty(shape), np.empty(shape), np.empty(shape + (len(levels),)),
+                       np.empty(shape, dtype=int), bin_days, levels)
+        daily, filled, observed = daily_filled(rows, dates, np.asarray(ndvi, dtype=float),
+                                               np.asarray(weights, dtype=float), len(ids))
+        bins = doy_bins(daily, bin_days)
+        year = daily.astype("datetime64[Y]").astype(int)
+        shape = (len(ids), n_bins(bin_days))
+        mean, std = np.full(shape, np.nan), np.full(shape, np.nan)
+        percentiles = np.full(shape + (len(levels),), np.nan)
+        years = np.zeros(shape, dtype=int)
+        for b in range(shape[1]):
+            in_bin = bins == b
+            if not in_bin.any():
+                continue
+            values = filled[:, in_bin]
+            count = np.isfinite(values).sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean[:, b] = np.nansum(values, axis=1) / count
+                std[:, b] = np.sqrt(np.nansum((values - mean[:, [b]]) ** 2, axis=1) / count)
+            percentiles[:, b] = _row_percentiles(values, levels)
+            # years with a real (weighted) acquisition in the bin, not just filled values
+            seen = observed[:, in_bin]
+            years[:, b] = sum(seen[:, year[in_bin] == y].any(axis=1) for y in np.unique(year[in_bin]))
+        return cls(ids, mean, std, percentiles, years, bin_days, levels)
+
+    # Build from the columnar store (store.py): every stored acquisition of the selected farms
+    @classmethod
+    def from_store(cls, root, farm_ids=None, start=None, end=None, bin_days=BIN_DAYS, levels=PERCENTILES):
+        import store
+        table = store.read_table(root, farm_ids, start, end, columns=["mean", "weight"])
+        return cls.build(table.column("farm_id").to_numpy(zero_copy_only=False),
+                         table.column("date").to_numpy(), table.column("mean").to_numpy(zero_copy_only=False),
+                         table.column("weight").to_numpy(), bin_days, levels)
+
+    def save(self, path=INDEX_FILE):
+        np.savez_compressed(path, farm_ids=self.farm_ids, mean=self.mean, std=self.std,
+                            percentiles=self.percentiles, years=self.years,
+                            bin_days=self.bin_days, levels=self.levels)
+        return path
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        with np.load(path) as data:
+            return cls(data["farm_ids"], data["mean"], data["std"], data["percentiles"], data["years"],
+                       int(data["bin_days"]), data["levels"])
+
+    # (row, bin) index of every (farm, date); row is -1 for farms without a climatology
+    def lookup(self, farm_ids, dates):
+        farm_ids = np.asarray(farm_ids, dtype=str)
+        pos = np.clip(np.searchsorted(self.farm_ids, farm_ids), 0, max(len(self.farm_ids) - 1, 0))
+        known = (self.farm_ids[pos] == farm_ids) if len(self.farm_ids) else np.zeros(farm_ids.shape, bool)
+        bins = np.broadcast_to(doy_bins(dates, self.bin_days), farm_ids.shape)
+        return np.where(known, pos, -1), bins
+
+    # Entries of a (farms, bins, ...) table at (rows, bins), NaN where the farm is unknown (row -1)
+    def _at(self, table, rows, bins):
+        if not len(self.farm_ids):
+            return np.full(rows.shape + table.shape[2:], np.nan)
+        out = np.array(table[np.maximum(rows, 0), bins], dtype=float)
+        out[rows < 0] = np.nan
+        return out
+
+    # Standardized anomaly (value - climatological mean) / spread; NaN for unknown farms or empty bins
+    def zscore(self, farm_ids, dates, values):
+        rows, bins = self.lookup(farm_ids, dates)
+        mean = self._at(self.mean, rows, bins)
+        std = np.maximum(self._at(self.std, rows, bins), MIN_STD)
+        return (np.asarray(values, dtype=float) - mean) / std
+
+    # Percentile rank 0-100 of each value within its farm's DOY bin, interpolated between the stored levels
+    def percentile_rank(self, farm_ids, dates, values):
+        rows, bins = self.lookup(farm_ids, dates)
+        knots = self._at(self.percentiles, rows, bins)             # (n, levels)
+        values = np.asarray(values, dtype=float)
+        k = (knots < values[..., None]).sum(axis=-1)
+        lo = np.clip(k - 1, 0, len(self.levels) - 1)
+        hi = np.clip(k, 0, len(self.levels) - 1)
+        x0 = np.take_along_axis(knots, lo[..., None], -1)[..., 0]
+        x1 = np.take_along_axis(knots, hi[..., None], -1)[..., 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(x1 > x0, (values - x0) / (x1 - x0), 0.0)
+        rank = self.levels[lo] + np.clip(frac, 0, 1) * (self.levels[hi] - self.levels[lo])
+        return np.where((rows >= 0) & np.isfinite(knots[..., 0]) & np.isfinite(values), rank, np.nan)
+
+    def score(self, farm_ids, dates, values):
+        return self.zscore(farm_ids, dates, values), self.percentile_rank(farm_ids, dates, values)
+
+
+# Scores of every farm's acquisition on one date in the store: (farm ids, values, z-scores, ranks)
+def score_store_date(climatology, root, date):
+    import store
+    table = store.read_table(root, start=date, end=date, columns=["mean"])
+    farm_ids = table.column("farm_id").to_numpy(zero_copy_only=False)
+    values = table.column("mean").to_numpy(zero_copy_only=False).astype(float)
+    return (farm_ids, values, *climatology.score(farm_ids, np.datetime64(date, "D"), values))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Day-of-year NDVI climatology and anomaly scores")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the climatology index from the store")
+    build.add_argument("--store-root", default="ndvi_store")
+    build.add_argument("--output", default=INDEX_FILE)
+    build.add_argument("--start", default=None)
+    build.add_argument("--end", default=None)
+    build.add_argument("--bin-days", type=int, default=BIN_DAYS)
+    score = commands.add_parser("score", help="score every farm's acquisition on one date")
+    score.add_argument("--store-root", default="ndvi_store")
+    score.add_argument("--index", default=INDEX_FILE)
+    score.add_argument("--date", required=True)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        clim = Climatology.from_store(args.store_root, start=args.start, end=args.end, bin_days=args.bin_days)
+        clim.save(args.output)
+        print(f"Climatology of {len(clim.farm_ids)} farms x {clim.mean.shape[1]} bins written to {args.output}")
+    else:
+        farm_ids, values, z, rank = score_store_date(Climatology.load(args.index), args.store_root, args.date)
+        print(f"{'farm':>10} | {'NDVI':>7} | {'z':>7} | {'rank':>6}")
+        for f, v, zi, r in zip(farm_ids, values, z, rank):
+            print(f"{f:>10} | {v:7.4f} | {zi:7.2f} | {r:6.1f}")
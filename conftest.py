@@ -0,0 +1,9 @@
+# conftest.py
+import sys
+import fake_ee
+
+# Tests run against the in-process fake, never against live Earth Engine
+sys.modules["ee"] = fake_ee
+
+# test.py is a manual smoke test that needs a live Earth Engine project
+collect_ignore = ["test.py"]
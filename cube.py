@@ -0,0 +1,225 @@
+import json
+import os
+
+import numpy as np
+
+import local_backend
+
+# On-disk (time, y, x) pixel cubes of the raw B4/B8/QA60(/CLDPRB) bands of one farm.
+# Pixels are fetched once through a pluggable downloader (Earth Engine computePixels, or a
+# local directory of scene files) and stored as compressed time chunks; reads go through a
+# decompressed memory-mapped copy, so new statistics, mask thresholds or per-pixel phenology
+# are computed locally with NumPy and no further network calls.
+#
+# Layout of <root>/<farm_id>/:
+#   meta.json             dates, scene ids, bands, (time, y, x) shape, chunk size, grid
+#   mask.npy              (y, x) region mask
+#   <band>/<start>.npz    compressed float32 chunk of chunk_size dates
+#   .mmap/<band>.npy      decompressed copy, built on first access
+
+CUBE_BANDS = ("B4", "B8", "QA60", "CLDPRB")
+CHUNK_SIZE = 16
+
+
+def farm_cube_dir(root, farm_id):
+    return os.path.join(root, str(farm_id))
+
+# WGS 84 / UTM zone of a lon/lat point (the projection of the Sentinel-2 tiles covering it)
+def utm_crs(lon, lat):
+    zone = min(int((lon + 180) // 6) + 1, 60)
+    return f"EPSG:{32600 + zone if lat >= 0 else 32700 + zone}"
+
+# Download grid over a lon/lat ring. By default it is built in the farm's UTM zone with a step of
+# scale metres, snapped to multiples of the step, which lines up with the Sentinel-2 10 m pixels of
+# the tiles in that zone (farms in a zone overlap may be served from a tile of the other zone, which
+# Earth Engine then resamples). With pixel_size (degrees) it is an EPSG:4326 grid instead.
+def grid_for_region(coords_lonlat, scale=10, pixel_size=None, crs=None):
+    lons = np.array([p[0] for p in coords_lonlat], dtype=float)
+    lats = np.array([p[1] for p in coords_lonlat], dtype=float)
+    if pixel_size:
+        crs, step, xs, ys = "EPSG:4326", pixel_size, lons, lats
+    else:
+        from pyproj import Transformer
+        crs = crs or utm_crs(lons.mean(), lats.mean())
+        step = scale
+        xs, ys = Transformer.from_crs("EPSG:4326", crs, always_xy=True).transform(lons, lats)
+    col0, col1 = int(np.floor(np.min(xs) / step)), int(np.ceil(np.max(xs) / step))
+    row0, row1 = int(np.floor(np.min(ys) / step)), int(np.ceil(np.max(ys) / step))
+    return {
+        "dimensions": {"width": col1 - col0, "height": row1 - row0},
+        "affineTransform": {"scaleX": step, "shearX": 0, "translateX": col0 * step,
+                            "shearY": 0, "scaleY": -step, "translateY": row1 * step},
+        "crsCode": crs,
+    }
+
+
+# ------------------------------------------------------------------ downloaders
+# A downloader is a (scenes, fetch, region_mask) triple of callables:
+#   scenes()          -> list of (scene_id, date string) in time order
+#   fetch(scene_id)   -> {band: (y, x) array} on the cube grid
+#   region_mask()     -> (y, x) boolean mask of the pixels inside the farm
+
+# Earth Engine: one computePixels request per scene, on the raw (unmasked) collection
+def ee_downloader(ic, region, grid, bands=CUBE_BANDS):
+    import ee
+    import gee
+    import stats
+
+    def scenes():
+        info = gee.get_info(ee.Dictionary({
+            'ids': ic.aggregate_array('system:index'),
+            'times': ic.aggregate_array('system:time_start'),
+        }))
+        return [(i, stats.format_date(t)) for i, t in zip(info['ids'], info['times'])]
+
+    # Sentinel-2 SR has no CLDPRB band (only MSK_CLDPRB), so optional bands are selected only when
+    # the image has them, the same server-side check as cloud_mask.mask_clouds_s2
+    required = [b for b in bands if b != 'CLDPRB']
+
+    def fetch(scene_id):
+        image = ee.Image(ic.filter(ee.Filter.eq('system:index', scene_id)).first())
+        if 'CLDPRB' in bands:
+            image = ee.Image(ee.Algorithms.If(image.bandNames().contains('CLDPRB'),
+                                              image.select(required + ['CLDPRB']), image.select(required)))
+        else:
+            image = image.select(required)
+        pixels = gee.compute_pixels(image, grid)
+        return {b: pixels[b] for b in bands if b in pixels.dtype.names}
+
+    def region_mask():
+        inside = gee.compute_pixels(ee.Image.constant(1).clip(region).rename('inside'), grid)['inside']
+        return np.nan_to_num(inside) == 1
+
+    return scenes, fetch, region_mask
+
+# Local stand-in: a directory with scenes.json ([{"id", "date"}, ...]), mask.npy and one
+# <scene_id>.npz of band arrays per scene
+def file_downloader(source_dir, bands=CUBE_BANDS):
+    def scenes():
+        with open(os.path.join(source_dir, "scenes.json")) as f:
+            return [(s["id"], s["date"]) for s in json.load(f)]
+
+    def fetch(scene_id):
+        with np.load(os.path.join(source_dir, f"{scene_id}.npz")) as data:
+            return {b: data[b] for b in bands if b in data.files}
+
+    def region_mask():
+        return np.load(os.path.join(source_dir, "mask.npy"))
+
+    return scenes, fetch, region_mask
+
+
+# ------------------------------------------------------------------ writing
+def _write_chunk(out_dir, bands, start, buffers):
+    for band in bands:
+        np.savez_compressed(os.path.join(out_dir, band, f"{start:06d}.npz"),
+                            data=np.stack(buffers[band]).astype(np.float32))
+
+# Fetch every scene of a downloader and store the cube; an existing cube holding the same
+# scenes, requested bands and grid is reused as is (no requests beyond the scene list)
+def download_cube(root, farm_id, downloader, bands=CUBE_BANDS, chunk_size=CHUNK_SIZE, grid=None):
+    scenes, fetch, region_mask = downloader
+    out_dir = farm_cube_dir(root, farm_id)
+    scene_list = scenes()
+    grid = json.loads(json.dumps(grid))     # as stored in meta.json
+    if os.path.exists(os.path.join(out_dir, "meta.json")):
+        cube = PixelCube(out_dir)
+        if (cube.scene_ids == [s for s, _ in scene_list] and cube.meta.get("grid") == grid
+                and cube.meta.get("requested_bands", cube.meta["bands"]) == list(bands)):
+            return cube
+
+    mask = np.asarray(region_mask(), dtype=bool)
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "mask.npy"), mask)
+    stored = []
+    buffers = {}
+    for k, (scene_id, _) in enumerate(scene_list):
+        arrays = fetch(scene_id)
+        if k == 0:
+            stored = [b for b in bands if b in arrays]
+            for band in stored:
+                os.makedirs(os.path.join(out_dir, band), exist_ok=True)
+            buffers = {band: [] for band in stored}
+        for band in stored:
+            buffers[band].append(np.asarray(arrays[band], dtype=np.float32))
+        if len(buffers[stored[0]]) == chunk_size:
+            _write_chunk(out_dir, stored, k + 1 - chunk_size, buffers)
+            buffers = {band: [] for band in stored}
+    if stored and buffers[stored[0]]:
+        _write_chunk(out_dir, stored, len(scene_list) - len(buffers[stored[0]]), buffers)
+
+    meta = {
+        "farm_id": str(farm_id),
+        "scene_ids": [s for s, _ in scene_list],
+        "dates": [d for _, d in scene_list],
+        "bands": stored,
+        "requested_bands": list(bands),
+        "shape": [len(scene_list), *mask.shape],
+        "chunk_size": chunk_size,
+        "grid": grid,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    _clear_mmap(out_dir)
+    return PixelCube(out_dir)
+
+def _clear_mmap(out_dir):
+    mmap_dir = os.path.join(out_dir, ".mmap")
+    if os.path.isdir(mmap_dir):
+        for name in os.listdir(mmap_dir):
+            os.remove(os.path.join(mmap_dir, name))
+
+
+# ------------------------------------------------------------------ reading
+class PixelCube:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.region_mask = np.load(os.path.join(path, "mask.npy"))
+
+    @classmethod
+    def open(cls, root, farm_id):
+        return cls(farm_cube_dir(root, farm_id))
+
+    @property
+    def dates(self):
+        return self.meta["dates"]
+
+    @property
+    def scene_ids(self):
+        return self.meta["scene_ids"]
+
+    @property
+    def shape(self):
+        return tuple(self.meta["shape"])
+
+    # Read-only (time, y, x) memory map of one band, decompressed from the chunks on first use
+    def band(self, name):
+        path = os.path.join(self.path, ".mmap", f"{name}.npy")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=self.shape)
+            for start in range(0, self.shape[0], self.meta["chunk_size"]):
+                with np.load(os.path.join(self.path, name, f"{start:06d}.npz")) as chunk:
+                    data = chunk["data"]
+                out[start:start + len(data)] = data
+            out.flush()
+            del out
+            os.replace(tmp, path)
+        return np.load(path, mmap_mode="r")
+
+    # Cloud-masked NDVI cube for any mask threshold
+    def ndvi(self, cloud_threshold=30):
+        cldprb = self.band("CLDPRB") if "CLDPRB" in self.meta["bands"] else None
+        return local_backend.mask_and_calculate_ndvi(
+            self.band("B4"), self.band("B8"), self.band("QA60"), cldprb, cloud_threshold)
+
+    # The 8-tuple of stats.extract_ndvi_stats, computed locally
+    def stats(self, cloud_threshold=30):
+        return local_backend.ndvi_cube_stats(self.dates, self.ndvi(cloud_threshold), self.region_mask)
+
+    # (pixels, time) NDVI series of every pixel inside the region, e.g. for phenology.season_metrics
+    def pixel_series(self, cloud_threshold=30):
+        return self.ndvi(cloud_threshold)[:, self.region_mask].T
@@ -0,0 +1,599 @@
+# fake_ee.py
+# Small in-process stand-in for the parts of the Earth Engine API used in this repo.
+# Images are lazy per-band functions of (lon, lat) evaluated on a regular pixel grid
+# when reduced, so geometry, clipping and masking behave like the real thing.
+# Only getInfo() counts as a network round trip.
+import threading
+import time
+import numpy as np
+
+# One 10 m Sentinel-2 pixel in degrees (approximately)
+PIXEL_DEG = 1e-4
+
+calls = 0
+latency = 0.0   # seconds slept per getInfo(), to mimic network round trips
+_lock = threading.Lock()
+_collections = {}
+
+
+class EEException(Exception):
+    pass
+
+
+def Initialize(project=None, **kwargs):
+    return None
+
+
+def reset():
+    global calls
+    with _lock:
+        calls = 0
+
+
+def register_collection(collection_id, images):
+    _collections[collection_id] = list(images)
+
+
+def _round_trip(value):
+    global calls
+    with _lock:
+        calls += 1
+    if latency:
+        time.sleep(latency)
+    return value
+
+
+def _info(value):
+    # Convert a fake server-side value to plain python (what getInfo returns)
+    if isinstance(value, ComputedObject):
+        return _info(value._value)
+    if isinstance(value, Feature):
+        return {
+            "type": "Feature",
+            "geometry": None,
+            "id": value._props.get("system:index"),
+            "properties": {k: _info(v) for k, v in value._props.items()},
+        }
+    if isinstance(value, (FeatureCollection, ImageCollection)):
+        features = [_info(f) for f in value._items]
+        return {"type": "FeatureCollection", "features": features}
+    if isinstance(value, Image):
+        return {"type": "Image", "bands": [{"id": b} for b in value._bands],
+                "properties": {k: _info(v) for k, v in value._props.items()}}
+    if isinstance(value, dict):
+        return {k: _info(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_info(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class ComputedObject:
+    def __init__(self, value=None):
+        self._value = value.value if isinstance(value, ComputedObject) else value
+
+    @property
+    def value(self):
+        return self._value
+
+    def getInfo(self):
+        return _round_trip(_info(self._value))
+
+
+class Number(ComputedObject):
+    def divide(self, other):
+        a = self._value
+        b = other.value if isinstance(other, ComputedObject) else other
+        return Number(None if a is None or not b else a / b)
+
+
+class String(ComputedObject):
+    pass
+
+
+class List(ComputedObject):
+    def __init__(self, value=None):
+        super().__init__(list(value.value if isinstance(value, ComputedObject) else (value or [])))
+
+    def get(self, index):
+        index = index.value if isinstance(index, ComputedObject) else index
+        return ComputedObject(self._value[index])
+
+    def size(self):
+        return Number(len(self._value))
+
+    def contains(self, item):
+        return ComputedObject(item in self._value)
+
+
+class Dictionary(ComputedObject):
+    def __init__(self, value=None):
+        super().__init__(dict(value.value if isinstance(value, ComputedObject) else (value or {})))
+
+    def get(self, key, default=None):
+        return ComputedObject(self._value.get(key, default))
+
+    def keys(self):
+        return List(sorted(self._value))
+
+
+# ---------------------------------------------------------------- geometry
+def _points_in_ring(lon, lat, ring):
+    # Vectorized even-odd ray casting
+    inside = np.zeros(lon.shape, dtype=bool)
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    n = len(ring)
+    j = n - 1
+    for i in range(n):
+        xi, yi, xj, yj = xs[i], ys[i], xs[j], ys[j]
+        crosses = (yi > lat) != (yj > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (xj - xi) * (lat - yi) / (yj - yi) + xi
+        inside ^= crosses & (lon < x_cross)
+        j = i
+    return inside
+
+
+class Geometry:
+    def __init__(self, contains, bbox):
+        self._contains = contains
+        self._bbox = bbox
+
+    @staticmethod
+    def Polygon(coords, *args, **kwargs):
+        rings = coords if isinstance(coords[0][0], (list, tuple)) else [coords]
+        outer = [list(p) for p in rings[0]]
+        holes = [[list(p) for p in r] for r in rings[1:]]
+        xs = [p[0] for p in outer]
+        ys = [p[1] for p in outer]
+
+        def contains(lon, lat):
+            inside = _points_in_ring(lon, lat, outer)
+            for hole in holes:
+                inside &= ~_points_in_ring(lon, lat, hole)
+            return inside
+
+        return Geometry(contains, (min(xs), min(ys), max(xs), max(ys)))
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        xmin, ymin, xmax, ymax = coords
+
+        def contains(lon, lat):
+            return (lon >= xmin) & (lon < xmax) & (lat >= ymin) & (lat < ymax)
+
+        return Geometry(contains, (xmin, ymin, xmax, ymax))
+
+    def intersection(self, other, *args, **kwargs):
+        a, b = self._bbox, other._bbox
+        bbox = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+        return Geometry(lambda lon, lat: self._contains(lon, lat) & other._contains(lon, lat), bbox)
+
+    def union(self, other, *args, **kwargs):
+        a, b = self._bbox, other._bbox
+        bbox = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+        return Geometry(lambda lon, lat: self._contains(lon, lat) | other._contains(lon, lat), bbox)
+
+    def bounds(self, *args, **kwargs):
+        return Geometry.Rectangle(list(self._bbox))
+
+    def pixel_grid(self, scale=10):
+        # (y, x) pixel centres of the fake grid covering the bounding box, plus the inside mask
+        step = PIXEL_DEG * scale / 10.0
+        xmin, ymin, xmax, ymax = self._bbox
+        if xmax <= xmin or ymax <= ymin:
+            return np.empty((0, 0)), np.empty((0, 0)), np.empty((0, 0), dtype=bool)
+        cols = np.arange(np.floor(xmin / step), np.ceil(xmax / step)) * step + step / 2
+        rows = np.arange(np.floor(ymin / step), np.ceil(ymax / step))[::-1] * step + step / 2
+        lon, lat = np.meshgrid(cols, rows)
+        return lon, lat, self._contains(lon, lat)
+
+    def pixel_centers(self, scale=10):
+        # Pixel centres of the fake grid that fall inside this geometry
+        lon, lat, inside = self.pixel_grid(scale)
+        return lon[inside], lat[inside]
+
+
+# ---------------------------------------------------------------- reducers
+class Reducer:
+    def __init__(self, outputs, combined=False):
+        # outputs: list of (name, fn(values) -> python value)
+        self._outputs = outputs
+        self._combined = combined
+
+    @staticmethod
+    def mean():
+        return Reducer([("mean", lambda v: float(v.mean()) if v.size else None)])
+
+    @staticmethod
+    def median():
+        return Reducer([("median", lambda v: float(np.median(v)) if v.size else None)])
+
+    @staticmethod
+    def stdDev():
+        return Reducer([("stdDev", lambda v: float(v.std()) if v.size else None)])
+
+    @staticmethod
+    def sum():
+        return Reducer([("sum", lambda v: float(v.sum()))])
+
+    @staticmethod
+    def count():
+        return Reducer([("count", lambda v: int(v.size))])
+
+    @staticmethod
+    def percentile(percentiles):
+        def make(p):
+            return lambda v: float(np.percentile(v, p)) if v.size else None
+        return Reducer([(f"p{p}", make(p)) for p in percentiles])
+
+    @staticmethod
+    def fixedHistogram(min, max, steps):
+        edges = np.linspace(min, max, steps + 1)
+
+        def hist(v):
+            counts = np.histogram(np.clip(v, min, max), bins=edges)[0]
+            return [[float(e), int(c)] for e, c in zip(edges[:-1], counts)]
+        return Reducer([("histogram", hist)])
+
+    def unweighted(self):
+        # The fake reduces whole pixel centres only, so weighted and unweighted inputs agree
+        return self
+
+    def combine(self, reducer2, outputPrefix="", sharedInputs=False):
+        outputs = self._outputs + [(outputPrefix + n, f) for n, f in reducer2._outputs]
+        return Reducer(outputs, combined=True)
+
+    def _apply(self, band_values):
+        result = {}
+        for band, values in band_values.items():
+            for name, fn in self._outputs:
+                key = band if len(self._outputs) == 1 else f"{band}_{name}"
+                result[key] = fn(values)
+        return result
+
+
+# ---------------------------------------------------------------- images
+def _const_band(value):
+    return lambda lon, lat: np.full(lon.shape, float(value))
+
+
+class Image:
+    def __init__(self, arg=None, bands=None, props=None):
+        if isinstance(arg, Image):
+            bands, props = arg._bands, arg._props
+        elif isinstance(arg, ComputedObject) and isinstance(arg.value, Image):
+            bands, props = arg.value._bands, arg.value._props
+        elif isinstance(arg, (int, float)):
+            bands = {"constant": _const_band(arg)}
+        self._bands = dict(bands or {})
+        self._props = dict(props or {})
+
+    @staticmethod
+    def constant(value):
+        return Image(bands={"constant": _const_band(value)})
+
+    def _first(self):
+        return next(iter(self._bands.values()))
+
+    def _derive(self, bands):
+        return Image(bands=bands, props=self._props)
+
+    def _binary(self, other, op):
+        a = self._first()
+        b = other._first() if isinstance(other, Image) else _const_band(other)
+        name = next(iter(self._bands))
+
+        def band(lon, lat):
+            with np.errstate(invalid="ignore"):
+                x, y = a(lon, lat), b(lon, lat)
+                out = op(x, y).astype(float)
+            out[np.isnan(x) | np.isnan(y)] = np.nan
+            return out
+        return self._derive({name: band})
+
+    def get(self, prop):
+        return ComputedObject(self._props.get(prop))
+
+    def set(self, *args):
+        props = dict(args[0]) if len(args) == 1 else {args[0]: args[1]}
+        props = {k: (v.value if isinstance(v, ComputedObject) else v) for k, v in props.items()}
+        return Image(bands=self._bands, props={**self._props, **props})
+
+    def bandNames(self):
+        return List(list(self._bands))
+
+    def select(self, names, new_names=None):
+        if isinstance(names, str):
+            names = [names]
+        new_names = new_names or names
+        return self._derive({n: self._bands.get(o, _missing_band(o)) for o, n in zip(names, new_names)})
+
+    def rename(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else names
+        return self._derive(dict(zip(names, self._bands.values())))
+
+    def addBands(self, other):
+        return self._derive({**self._bands, **other._bands})
+
+    def clip(self, geometry):
+        def clipped(fn):
+            def band(lon, lat):
+                out = fn(lon, lat).astype(float)
+                out[~geometry._contains(lon, lat)] = np.nan
+                return out
+            return band
+        return self._derive({n: clipped(f) for n, f in self._bands.items()})
+
+    def updateMask(self, mask):
+        m = mask._first()
+
+        def masked(fn):
+            def band(lon, lat):
+                out = fn(lon, lat).astype(float)
+                keep = m(lon, lat)
+                out[~(np.nan_to_num(keep) > 0)] = np.nan
+                return out
+            return band
+        return self._derive({n: masked(f) for n, f in self._bands.items()})
+
+    def normalizedDifference(self, names):
+        a, b = self._bands[names[0]], self._bands[names[1]]
+
+        def band(lon, lat):
+            x, y = a(lon, lat), b(lon, lat)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return (x - y) / (x + y)
+        return self._derive({"nd": band})
+
+    def bitwiseAnd(self, value):
+        return self._binary(value, lambda x, y: np.bitwise_and(np.nan_to_num(x).astype(np.int64),
+                                                               np.nan_to_num(y).astype(np.int64)))
+
+    def eq(self, value):
+        return self._binary(value, lambda x, y: x == y)
+
+    def lt(self, value):
+        return self._binary(value, lambda x, y: x < y)
+
+    def gte(self, value):
+        return self._binary(value, lambda x, y: x >= y)
+
+    def And(self, other):
+        return self._binary(other, lambda x, y: (x != 0) & (y != 0))
+
+    def pow(self, value):
+        return self._binary(value, np.power)
+
+    def multiply(self, value):
+        return self._binary(value, np.multiply)
+
+    def sample(self, geometry, scale=10):
+        # Band arrays on the pixel grid of the geometry's bounding box (no round trip)
+        lon, lat, inside = geometry.pixel_grid(scale)
+        return {name: fn(lon, lat).astype(float) for name, fn in self._bands.items()}, inside
+
+    def reduceRegion(self, reducer, geometry=None, scale=10, maxPixels=None, **kwargs):
+        lon, lat = geometry.pixel_centers(scale)
+        band_values = {}
+        for name, fn in self._bands.items():
+            values = fn(lon, lat).astype(float) if lon.size else np.empty(0)
+            band_values[name] = values[~np.isnan(values)]
+        return Dictionary(reducer._apply(band_values))
+
+    def reduceRegions(self, collection, reducer, scale=10, **kwargs):
+        features = []
+        band = next(iter(self._bands))
+        for feature in collection._items:
+            stats = self.reduceRegion(reducer, feature._geometry, scale).value
+            if len(self._bands) == 1:
+                # Like Earth Engine: single-band outputs are named by the reducer outputs only
+                stats = {k[len(band) + 1:] if k.startswith(band + "_") else reducer._outputs[0][0]: v
+                         for k, v in stats.items()}
+            features.append(Feature(feature._geometry, {**feature._props, **stats}))
+        return FeatureCollection(features)
+
+
+# ---------------------------------------------------------------- features and collections
+class Feature:
+    def __init__(self, geometry=None, props=None):
+        if isinstance(props, ComputedObject):
+            props = props.value
+        self._geometry = geometry
+        self._props = dict(props or {})
+
+    def set(self, *args):
+        props = dict(args[0].value if isinstance(args[0], ComputedObject) else args[0]) \
+            if len(args) == 1 else {args[0]: args[1]}
+        props = {k: (v.value if isinstance(v, ComputedObject) else v) for k, v in props.items()}
+        return Feature(self._geometry, {**self._props, **props})
+
+    def get(self, prop):
+        return ComputedObject(self._props.get(prop))
+
+    def geometry(self):
+        return self._geometry
+
+
+class Filter:
+    def __init__(self, predicate):
+        self._predicate = predicate
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) < value)
+
+    @staticmethod
+    def gt(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) > value)
+
+    @staticmethod
+    def gte(name, value):
+        return Filter(lambda p: p.get(name) is not None and p.get(name) >= value)
+
+    @staticmethod
+    def eq(name, value):
+        return Filter(lambda p: p.get(name) == value)
+
+    @staticmethod
+    def inList(name, values):
+        values = set(values.value if isinstance(values, ComputedObject) else values)
+        return Filter(lambda p: p.get(name) in values)
+
+
+class _Collection:
+    def __init__(self, items=None):
+        if isinstance(items, _Collection):
+            items = items._items
+        self._items = list(items or [])
+
+    def map(self, fn):
+        return type(self)([fn(item) for item in self._items])
+
+    def filter(self, flt):
+        return type(self)([i for i in self._items if flt._predicate(i._props)])
+
+    def size(self):
+        return Number(len(self._items))
+
+    def toList(self, count, offset=0):
+        count = count.value if isinstance(count, ComputedObject) else count
+        return List(self._items[offset:offset + count])
+
+    def first(self):
+        return self._items[0] if self._items else None
+
+    def aggregate_array(self, prop):
+        return List([i._props.get(prop) for i in self._items])
+
+    def getInfo(self):
+        return _round_trip(_info(self))
+
+
+class ImageCollection(_Collection):
+    def __init__(self, items=None):
+        if isinstance(items, str):
+            items = _collections.get(items, [])
+        super().__init__(items)
+
+    def filterDate(self, start, end):
+        import pandas as pd
+        t0 = pd.Timestamp(start).value // 10**6
+        t1 = pd.Timestamp(end).value // 10**6
+        return ImageCollection([i for i in self._items
+                                if t0 <= i._props.get("system:time_start", 0) < t1])
+
+    def filterBounds(self, geometry):
+        return ImageCollection(self._items)
+
+    def select(self, *args):
+        return self.map(lambda img: img.select(*args))
+
+
+class FeatureCollection(_Collection):
+    def flatten(self):
+        items = []
+        for item in self._items:
+            items.extend(item._items if isinstance(item, _Collection) else [item])
+        return FeatureCollection(items)
+
+
+def _missing_band(name):
+    # Like Earth Engine, selecting a band the image lacks only fails once pixels are computed
+    def band(lon, lat):
+        raise EEException(f"Image.select: Band '{name}' not found.")
+    return band
+
+
+class data:
+    @staticmethod
+    def computePixels(params):
+        # NUMPY_NDARRAY download: structured (height, width) array, one field per band,
+        # evaluated at the pixel centres of the requested affine grid (one round trip)
+        image = params["expression"]
+        grid = params["grid"]
+        t = grid["affineTransform"]
+        w, h = grid["dimensions"]["width"], grid["dimensions"]["height"]
+        step = t["scaleX"]
+        # Same centre arithmetic as Geometry.pixel_grid, so grids snapped to step line up exactly
+        col0, row1 = round(t["translateX"] / step), round(t["translateY"] / -t["scaleY"])
+        cols = np.arange(col0, col0 + w, dtype=float) * step + step / 2
+        rows = np.arange(row1 - h, row1, dtype=float)[::-1] * step + step / 2
+        lon, lat = np.meshgrid(cols, rows)
+        if grid.get("crsCode", "EPSG:4326") != "EPSG:4326":
+            # projected grid (e.g. UTM metres): evaluate the scene at the lon/lat of the pixel centres
+            from pyproj import Transformer
+            lon, lat = Transformer.from_crs(grid["crsCode"], "EPSG:4326", always_xy=True).transform(lon, lat)
+        out = np.zeros((h, w), dtype=[(name, "f8") for name in image._bands])
+        for name, fn in image._bands.items():
+            out[name] = fn(lon, lat)
+        return _round_trip(out)
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, true_case, false_case):
+        cond = condition.value if isinstance(condition, ComputedObject) else condition
+        return true_case if cond else false_case
+
+
+# ---------------------------------------------------------------- synthetic scenes
+def _noise(lon, lat, seed):
+    v = np.sin(lon * 1.29898e5 + lat * 7.8233e5 + seed * 12.9898) * 43758.5453
+    return v - np.floor(v)
+
+
+def synthetic_scene(time_start, ndvi=0.5, cloud_fraction=0.0, seed=0, index=None, cldprb=True):
+    # Sentinel-2 like image with B4/B8/QA60 (and optionally CLDPRB) bands
+    def b8(lon, lat):
+        return 3000.0 + 200.0 * _noise(lon, lat, seed)
+
+    def b4(lon, lat):
+        level = np.clip(ndvi + 0.05 * (_noise(lon, lat, seed + 1) - 0.5), -0.99, 0.99)
+        return b8(lon, lat) * (1 - level) / (1 + level)
+
+    def qa60(lon, lat):
+        return np.where(_noise(lon, lat, seed + 2) < cloud_fraction, 1024.0, 0.0)
+
+    def prob(lon, lat):
+        return np.where(_noise(lon, lat, seed + 2) < cloud_fraction, 90.0,
+                        20.0 * _noise(lon, lat, seed + 3))
+
+    bands = {"B4": b4, "B8": b8, "QA60": qa60}
+    if cldprb:
+        bands["CLDPRB"] = prob
+    props = {
+        "system:time_start": int(time_start),
+        "system:index": index if index is not None else f"scene_{seed}",
+        "CLOUDY_PIXEL_PERCENTAGE": 100.0 * cloud_fraction,
+    }
+    return Image(bands=bands, props=props)
+
+
+def synthetic_collection(n_scenes=73, start_ms=1701388800000, revisit_days=5, cloudy_every=4, seed=0):
+    # A season of scenes on a fixed revisit: NDVI follows one crop cycle, every cloudy_every-th
+    # scene is heavily clouded and the rest carry light cloud
+    scenes = []
+    for i in range(n_scenes):
+        t = i / max(n_scenes - 1, 1)
+        ndvi = 0.2 + 0.6 * np.exp(-((t - 0.55) / 0.18) ** 2)
+        cloud = 0.9 if cloudy_every and i % cloudy_every == cloudy_every - 1 else 0.1
+        scenes.append(synthetic_scene(start_ms + i * revisit_days * 86400000, ndvi=ndvi,
+                                      cloud_fraction=cloud, seed=seed + i))
+    return scenes
+
+
+def install(n_scenes=73, latency_s=0.0, collection_id="COPERNICUS/S2_SR_HARMONIZED", **kwargs):
+    # Stand in for the `ee` module: later `import ee` gets this fake, with the Sentinel-2
+    # collection registered and every getInfo() delayed by latency_s
+    import sys
+    global latency
+    latency = latency_s
+    register_collection(collection_id, synthetic_collection(n_scenes, **kwargs))
+    reset()
+    sys.modules["ee"] = sys.modules[__name__]
+    return sys.modules[__name__]
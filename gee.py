@@ -1,7 +1,27 @@
+import functools
+import random
+import threading
+import time
+import numpy as np
 import ee
 from pyproj import Transformer
 from cloud_mask import mask_clouds_s2
 
+# Global cap on in-flight Earth Engine requests, shared by every worker thread
+_ee_slots = threading.BoundedSemaphore(8)
+
+# Scene pre-screening: scenes whose post-mask valid fraction is at most SCREEN_MIN_FRACTION
+# get weight 0 in weights.assign_weights, so they are dropped server-side before the
+# full-resolution statistics reducer runs. The screen counts pixels at SCREEN_SCALE (30 m),
+# and that fraction can land above or below the 10 m one (edge pixels, small cloud gaps), so
+# the screen keeps scenes within SCREEN_MARGIN below the threshold and leaves borderline
+# cases to the exact 10 m weighting.
+SCREEN_MIN_FRACTION = 0.30
+SCREEN_MARGIN = 0.05
+SCREEN_SCALE = 30
+
+QUOTA_ERROR_MARKERS = ("quota", "too many concurrent", "rate limit", "429")
+
 def initialize_ee(project=None):
     if project:
         ee.Initialize(project=project)
@@ -10,15 +30,75 @@ def initialize_ee(project=None):
     print("Google Earth Engine initialized successfully.")
 
 
+# Set the global in-flight cap; call once at startup, before any worker threads run
+def set_max_inflight(n):
+    global _ee_slots
+    _ee_slots = threading.BoundedSemaphore(n)
+
+def is_quota_error(exc):
+    msg = str(exc).lower()
+    return any(marker in msg for marker in QUOTA_ERROR_MARKERS)
+
+# One Earth Engine request attempt, made while holding an in-flight slot
+# (the point instrument.py times, so its latencies exclude slot waits and backoff sleeps)
+def _request(fn):
+    return fn()
+
+# Earth Engine call under the global in-flight cap, retried with exponential backoff on quota errors
+def _call(fn, retries=5, backoff=1.0):
+    for attempt in range(retries + 1):
+        try:
+            with _ee_slots:
+                return _request(fn)
+        except ee.EEException as exc:
+            if attempt == retries or not is_quota_error(exc):
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+
+def get_info(obj, retries=5, backoff=1.0):
+    return _call(obj.getInfo, retries, backoff)
+
+# Pixels of an image on an explicit grid, as a structured NumPy array (one field per band)
+def compute_pixels(image, grid, retries=5, backoff=1.0):
+    params = {'expression': image, 'fileFormat': 'NUMPY_NDARRAY', 'grid': grid}
+    return _call(lambda: ee.data.computePixels(params), retries, backoff)
+
+
+# One transformer per CRS pair, reused across calls; always_xy keeps (x, y) / (lon, lat) order
+@functools.lru_cache(maxsize=None)
+def get_transformer(from_crs, to_crs):
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
 def transform_coords(coords_meters, from_crs="EPSG:3857", to_crs="EPSG:4326"):
-    transformer = Transformer.from_crs(from_crs, to_crs)
-    coords_lonlat = [transformer.transform(x, y) for x, y in coords_meters]
-    # pyproj returns (lat, lon), swap to (lon, lat)
-    coords_lonlat_fixed = [[lon, lat] for lat, lon in coords_lonlat]
-    # Close the polygon
-    if coords_lonlat_fixed[0] != coords_lonlat_fixed[-1]:
-        coords_lonlat_fixed.append(coords_lonlat_fixed[0])
-    return coords_lonlat_fixed
+    return transform_coords_bulk([coords_meters], from_crs, to_crs)[0]
+
+# Transform many polygon rings in one vectorized call and close every ring.
+# Returns [[lon, lat], ...] lists ready for create_region.
+def transform_coords_bulk(rings, from_crs="EPSG:3857", to_crs="EPSG:4326"):
+    arrays = [np.asarray(r, dtype=float)[:, :2] for r in rings]
+    if not arrays:
+        return []
+    xy = np.concatenate(arrays)
+    lon, lat = get_transformer(from_crs, to_crs).transform(xy[:, 0], xy[:, 1])
+    lonlat = np.column_stack([lon, lat])
+    ends = np.cumsum([len(a) for a in arrays])
+    out = []
+    for ring in np.split(lonlat, ends[:-1]):
+        # Close the polygon
+        if not np.array_equal(ring[0], ring[-1]):
+            ring = np.vstack([ring, ring[:1]])
+        out.append(ring.tolist())
+    return out
+
+# Exterior rings of every polygon in a GeoDataFrame (largest part of multi-polygons),
+# transformed to lon/lat in one call
+def transform_geodataframe(gdf, to_crs="EPSG:4326"):
+    import shapely
+    geoms = np.array([max(g.geoms, key=lambda p: p.area) if g.geom_type == "MultiPolygon" else g
+                      for g in gdf.geometry])
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(geoms), return_index=True)
+    rings = np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+    return transform_coords_bulk(rings, gdf.crs.to_string(), to_crs)
 
 def create_region(coords_lonlat):
     region = ee.Geometry.Polygon(coords_lonlat)
@@ -40,4 +120,29 @@ def add_ndvi(image):
 def mask_and_calculate_ndvi(ic, cloud_threshold=30):
     ic_masked = ic.map(lambda img: mask_clouds_s2(img, cloud_threshold))
     ndvi_collection = ic_masked.map(add_ndvi)
-    return ndvi_collection
\ No newline at end of file
+    return ndvi_collection
+
+# Set 'valid_fraction' (valid NDVI pixels / region pixels, counted at a coarse scale) on every image
+def add_valid_fraction(ndvi_collection, region, scale=SCREEN_SCALE):
+    total = ee.Image.constant(1).clip(region).reduceRegion(
+        reducer=ee.Reducer.count(), geometry=region, scale=scale, maxPixels=int(1e9)).get('constant')
+
+    def screen(img):
+        valid = img.select('NDVI').reduceRegion(
+            reducer=ee.Reducer.count(), geometry=region, scale=scale, maxPixels=int(1e9)).get('NDVI')
+        return img.set('valid_fraction', ee.Number(valid).divide(total))
+    return ndvi_collection.map(screen)
+
+# Drop scenes with almost no valid pixels over the region, in the same server-side graph
+# (no extra round trip); the statistics reducer then only runs on the remaining scenes
+def prescreen_collection(ndvi_collection, region, min_fraction=SCREEN_MIN_FRACTION, scale=SCREEN_SCALE,
+                         margin=SCREEN_MARGIN):
+    screened = add_valid_fraction(ndvi_collection, region, scale)
+    return screened.filter(ee.Filter.gt('valid_fraction', min_fraction - margin))
+
+# Kept/dropped scene counts of the screen, for reporting (one round trip)
+def screen_summary(ndvi_collection, region, min_fraction=SCREEN_MIN_FRACTION, scale=SCREEN_SCALE,
+                   margin=SCREEN_MARGIN):
+    fractions = get_info(add_valid_fraction(ndvi_collection, region, scale).aggregate_array('valid_fraction'))
+    kept = sum(1 for f in fractions if f is not None and f > min_fraction - margin)
+    return {"scenes": len(fractions), "kept": kept, "dropped": len(fractions) - kept}
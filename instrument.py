@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import csv
+import functools
+import importlib
+import inspect
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Opt-in instrumentation of the pipeline modules.
+# Disabled (the default), nothing is wrapped and stage()/farm() return a shared no-op context,
+# so production runs pay nothing. enable() wraps every public function of the modules below
+# to record wall time per function, per pipeline stage and per farm, and wraps gee._request
+# (each attempt of gee.get_info / gee.compute_pixels, inside the in-flight slot) to record
+# every Earth Engine round trip's latency and payload size, retried attempts included.
+# report() summarizes everything, including peak memory; the summary is written as JSON or
+# CSV, and an optional cProfile dump is taken alongside.
+
+MODULES = ("gee", "cloud_mask", "stats", "interpolate", "weights", "plot")
+
+_NULL = contextlib.nullcontext()
+_lock = threading.Lock()
+_local = threading.local()
+_state = {"enabled": False, "patched": [], "profiler": None, "profile_path": None, "tracemalloc": False}
+_timings = {}       # (kind, name, farm) -> [calls, total seconds, max seconds]
+_round_trips = []   # (latency seconds, bytes, farm, failed)
+
+
+def enabled():
+    return _state["enabled"]
+
+def _record(kind, name, seconds):
+    key = (kind, name, getattr(_local, "farm", None))
+    with _lock:
+        entry = _timings.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+@contextlib.contextmanager
+def _timed(kind, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(kind, name, time.perf_counter() - t0)
+
+# Time a named pipeline stage: `with instrument.stage("stats"): ...`
+def stage(name):
+    return _timed("stage", name) if _state["enabled"] else _NULL
+
+@contextlib.contextmanager
+def _farm_scope(farm_id):
+    previous = getattr(_local, "farm", None)
+    _local.farm = str(farm_id)
+    try:
+        with _timed("farm", "total"):
+            yield
+    finally:
+        _local.farm = previous
+
+# Attribute everything recorded in this thread to a farm: `with instrument.farm(farm_id): ...`
+def farm(farm_id):
+    return _farm_scope(farm_id) if _state["enabled"] else _NULL
+
+
+# fn carrying the calling thread's farm into worker threads (returned unchanged when disabled)
+def bind(fn):
+    if not _state["enabled"]:
+        return fn
+    farm_id = getattr(_local, "farm", None)
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        previous = getattr(_local, "farm", None)
+        _local.farm = farm_id
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.farm = previous
+    return bound
+
+
+def _payload_bytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+def _wrap_function(module_name, fn):
+    name = f"{module_name}.{fn.__name__}"
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timed("function", name):
+                yield from fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timed("function", name):
+                return fn(*args, **kwargs)
+    return wrapper
+
+def _wrap_request(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        size, failed = 0, True
+        try:
+            result = fn(*args, **kwargs)
+            size, failed = _payload_bytes(result), False
+            return result
+        finally:
+            latency = time.perf_counter() - t0
+            with _lock:
+                _round_trips.append((latency, size, getattr(_local, "farm", None), failed))
+    return wrapper
+
+def _patch(module, attr, replacement):
+    _state["patched"].append((module, attr, getattr(module, attr)))
+    setattr(module, attr, replacement)
+
+# Start recording. Also rebinds names other instrumented modules imported directly
+# (e.g. gee's `from cloud_mask import mask_clouds_s2`)
+def enable(profile_path=None, trace_memory=False):
+    if _state["enabled"]:
+        return
+    modules = [importlib.import_module(m) for m in MODULES]
+    wrapped = {}
+    for module in modules:
+        for attr, fn in list(vars(module).items()):
+            if attr.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != module.__name__:
+                continue
+            wrapped[fn] = _wrap_function(module.__name__, fn)
+            _patch(module, attr, wrapped[fn])
+    for module in modules:
+        for attr, fn in list(vars(module).items()):
+            if inspect.isfunction(fn) and fn in wrapped and getattr(module, attr) is fn:
+                _patch(module, attr, wrapped[fn])
+    gee = sys.modules["gee"]
+    _patch(gee, "_request", _wrap_request(gee._request))
+
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+        _state["tracemalloc"] = True
+    if profile_path:
+        import cProfile
+        _state["profiler"] = cProfile.Profile()
+        _state["profile_path"] = profile_path
+        _state["profiler"].enable()
+    _state["enabled"] = True
+
+# Stop recording and restore the original functions (recorded data is kept until reset())
+def disable():
+    if not _state["enabled"]:
+        return
+    for module, attr, original in reversed(_state["patched"]):
+        setattr(module, attr, original)
+    _state["patched"] = []
+    if _state["profiler"] is not None:
+        _state["profiler"].disable()
+        _state["profiler"].dump_stats(_state["profile_path"])
+        _state["profiler"] = None
+    if _state["tracemalloc"]:
+        import tracemalloc
+        _state["traced_peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        _state["tracemalloc"] = False
+    _state["enabled"] = False
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _round_trips.clear()
+    _state.pop("traced_peak", None)
+
+
+def _peak_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+# Summary of everything recorded so far
+def report():
+    with _lock:
+        timings = [
+            {"kind": kind, "name": name, "farm": farm_id, "calls": calls,
+             "total_s": total, "mean_s": total / calls, "max_s": longest}
+            for (kind, name, farm_id), (calls, total, longest) in sorted(
+                _timings.items(), key=lambda item: (item[0][0], item[0][1], str(item[0][2])))
+        ]
+        trips = list(_round_trips)
+    latencies = np.array([t[0] for t in trips])
+    round_trips = {"count": len(trips), "failed": sum(t[3] for t in trips),
+                   "bytes": int(sum(t[1] for t in trips))}
+    if len(trips):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        round_trips.update({"total_s": float(latencies.sum()), "p50_s": float(p50), "p90_s": float(p90),
+                            "p99_s": float(p99), "max_s": float(latencies.max())})
+    per_farm = {}
+    for _, size, farm_id, _ in trips:
+        if farm_id is not None:
+            entry = per_farm.setdefault(farm_id, {"count": 0, "bytes": 0})
+            entry["count"] += 1
+            entry["bytes"] += size
+    memory = {"peak_rss_mib": _peak_rss_mib()}
+    if _state["tracemalloc"]:
+        import tracemalloc
+        memory["traced_peak_mib"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    elif "traced_peak" in _state:
+        memory["traced_peak_mib"] = _state["traced_peak"] / 2 ** 20
+    return {"timings": timings, "round_trips": round_trips, "round_trips_per_farm": per_farm, "memory": memory}
+
+def write_json(path, summary=None):
+    with open(path, "w") as f:
+        json.dump(summary or report(), f, indent=2)
+
+# One row per timed function/stage/farm, plus one row for the Earth Engine round trips
+def write_csv(path, summary=None):
+    summary = summary or report()
+    fields = ["kind", "name", "farm", "calls", "total_s", "mean_s", "max_s"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(summary["timings"])
+        trips = summary["round_trips"]
+        if trips["count"]:
+            writer.writerow({"kind": "ee", "name": "round_trip", "farm": None, "calls": trips["count"],
+                             "total_s": trips["total_s"], "mean_s": trips["total_s"] / trips["count"],
+                             "max_s": trips["max_s"]})
+
+
+# ------------------------------------------------------------------ command line switches
+def add_arguments(parser):
+    parser.add_argument("--instrument", metavar="PATH", default=None,
+                        help="record timings and Earth Engine round trips; write PATH.json and PATH.csv")
+    parser.add_argument("--profile", metavar="PATH", default=None, help="also write a cProfile dump to PATH")
+    parser.add_argument("--trace-memory", action="store_true", help="track peak Python memory with tracemalloc")
+    return parser
+
+def start(args):
+    if args.instrument or args.profile:
+        enable(profile_path=args.profile, trace_memory=args.trace_memory)
+
+# Stop recording and write the reports requested on the command line
+def finish(args):
+    if not enabled():
+        return None
+    disable()
+    summary = report()
+    if args.instrument:
+        write_json(args.instrument + ".json", summary)
+        write_csv(args.instrument + ".csv", summary)
+        print(f"Instrumentation: {summary['round_trips']['count']} Earth Engine round trips, "
+              f"report in {args.instrument}.json / .csv")
+    return summary
+
+# Parse only the instrumentation switches, for scripts without their own argument parser
+def args_from_argv(argv=None):
+    parser = add_arguments(argparse.ArgumentParser(add_help=False))
+    return parser.parse_known_args(argv)[0]
@@ -1,17 +1,37 @@
 import numpy as np
 import pandas as pd
-from scipy.interpolate import PchipInterpolator, UnivariateSpline
+from scipy.interpolate import PchipInterpolator, UnivariateSpline, interp1d
+from scipy.linalg import solveh_banded
+from ndvi_series import NDVISeries, dates_of
 
-# Mask NDVI values within a specified date range for interpolation
+METHODS = ("pchip", "cubic", "univariate", "whittaker")
+
+# Default Whittaker penalty on a daily grid (second differences)
+WHITTAKER_LAMBDA = 100.0
+
+# Convert dates (strings, Timestamps or datetime64; 1-D or per-row 2-D) to datetime64 once
+def to_datetime64(dates):
+    dates = np.asarray(dates_of(dates))
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return dates
+    return np.asarray(pd.to_datetime(dates.ravel())).reshape(dates.shape)
+
+# Days since the first date of each row (the real time axis used for fitting)
+def days_since_start(dates):
+    dates = to_datetime64(dates)
+    return (dates - dates[..., :1]).astype("timedelta64[D]").astype(float)
+
+# Mask NDVI values within a specified date range for interpolation.
+# ndvi may be one series or a (farms x dates) array with a shared or per-row date axis.
 def mask_dates_for_interpolation(dates, ndvi, start_str, end_str, outside_to_nan=False):
-    dates_pd = pd.to_datetime(dates)
-    start = pd.to_datetime(start_str)
-    end = pd.to_datetime(end_str)
+    dates_dt = to_datetime64(dates)
+    start = np.datetime64(pd.to_datetime(start_str))
+    end = np.datetime64(pd.to_datetime(end_str))
 
     ndvi_masked = np.asarray(ndvi, dtype=float).copy()
 
     # Core mask: inside the period that should be interpolated
-    in_window = (dates_pd >= start) & (dates_pd <= end)
+    in_window = np.broadcast_to((dates_dt >= start) & (dates_dt <= end), ndvi_masked.shape)
 
     if outside_to_nan:
         # Optional: keep only this window, drop outside
@@ -23,56 +43,196 @@ def mask_dates_for_interpolation(dates, ndvi, start_str, end_str, outside_to_nan
 
     return ndvi_masked
 
-#  fill missing NDVI values using spline interpolation
-def spline_interpolate_ndvi(dates, ndvi, method='pchip', smooth=None):
-     # Convert dates (possibly strings) to np.datetime64 or pd.Timestamp
-    if isinstance(dates[0], str):
-        dates = np.array(pd.to_datetime(dates))
-    else:
-        dates = np.array(dates)
-        if not np.issubdtype(dates.dtype, np.datetime64):
-            dates = np.array(pd.to_datetime(dates))
-
-    # Now subtraction works:
-    x_full = (dates - dates[0]).astype("timedelta64[D]").astype(float)
-
-   # Convert dates to numeric (days since first date)
-    dates = np.asarray(dates)
-    y = np.asarray(ndvi, dtype=float)
-
-    # Handle all-NaN or single-point case
-    mask = ~np.isnan(y)
-    if mask.sum() < 2:
-        return y
-
-    # Use real time axis
-    x_full = (dates - dates[0]).astype("timedelta64[D]").astype(float)
-    x = x_full[mask]
-    y_valid = y[mask]
-
+# Fit one method to the valid points of one or more rows sharing the same x and valid mask
+def _fit(x, y_valid, x_full, method, smooth):
     if method == "pchip":
         # Shape-preserving, monotone, safer for NDVI
-        f = PchipInterpolator(x, y_valid, extrapolate=False)
-        y_interp = f(x_full)
+        f = PchipInterpolator(x, y_valid, axis=-1, extrapolate=False)
+        return f(x_full)
     elif method == "cubic":
         # Similar to your original, but on real time axis and no extrapolation
-        from scipy.interpolate import interp1d
-        f = interp1d(x, y_valid, kind="cubic",
+        f = interp1d(x, y_valid, kind="cubic", axis=-1,
                      bounds_error=False, fill_value="extrapolate")
-        y_interp = f(x_full)
+        return f(x_full)
     elif method == "univariate":
         # Smoothing spline, good if NDVI is noisy
         if smooth is None:
             # heuristic: small smoothing factor
             smooth = len(x) * 1e-3
+        elif smooth in SMOOTHING_CRITERIA:
+            smooth = select_row_smoothing(x, y_valid, smooth)[0]
         f = UnivariateSpline(x, y_valid, s=smooth)
-        y_interp = f(x_full)
+        return f(x_full)
     else:
-        raise ValueError("method must be 'pchip', 'cubic', or 'univariate'")
-    
+        raise ValueError("method must be 'pchip', 'cubic', 'univariate' or 'whittaker'")
+
+# Automatic smoothing for method="univariate" (smooth="gcv" or smooth="loo").
+# A discrete penalized smoother on the observed x (second divided differences) is evaluated
+# for a whole grid of penalties from one eigendecomposition, so no candidate is refitted.
+# The chosen fit's residual sum of squares becomes UnivariateSpline's smoothing factor s.
+SMOOTHING_CRITERIA = ("gcv", "loo")
+LAMBDA_GRID = np.logspace(-2, 8, 81)
+
+def _divided_difference_penalty(x):
+    h = np.diff(x)
+    h0, h1 = h[:-1], h[1:]
+    n = len(x)
+    D = np.zeros((n - 2, n))
+    idx = np.arange(n - 2)
+    D[idx, idx] = 2 / (h0 * (h0 + h1))
+    D[idx, idx + 1] = -2 / (h0 * h1)
+    D[idx, idx + 2] = 2 / (h1 * (h0 + h1))
+    return D.T @ D
+
+# Returns (s, lam) for one series: UnivariateSpline smoothing factor and the selected penalty.
+# Acquisitions sharing a date (e.g. two overlapping granules) are averaged into one point
+# weighted by its count, so the divided differences never see a zero spacing.
+def select_row_smoothing(x, y, criterion="gcv", lambdas=LAMBDA_GRID):
+    if criterion not in SMOOTHING_CRITERIA:
+        raise ValueError("criterion must be 'gcv' or 'loo'")
+    x, inverse, counts = np.unique(np.asarray(x, dtype=float), return_inverse=True, return_counts=True)
+    y = np.asarray(y, dtype=float)
+    y_mean = np.bincount(inverse, y) / counts
+    within = float(((y - y_mean[inverse]) ** 2).sum())
+    n = len(x)
+    if n < 4:
+        return len(y) * 1e-3, np.nan
+    # Weighted smoother (W + lam P) f = W y in the scaled basis g = sqrt(W) f
+    root_w = np.sqrt(counts)
+    eigval, U = np.linalg.eigh(_divided_difference_penalty(x) / np.outer(root_w, root_w))
+    eigval = np.clip(eigval, 0, None)
+    shrink = 1.0 / (1.0 + np.outer(lambdas, eigval))     # (candidates, n)
+    fitted = ((shrink * (U.T @ (root_w * y_mean))) @ U.T) / root_w   # every candidate fit at once
+    resid = y_mean - fitted
+    rss = (counts * resid ** 2).sum(axis=1)
+    if criterion == "gcv":
+        trace = shrink.sum(axis=1)
+        score = n * rss / (n - trace) ** 2
+    else:
+        leverage = shrink @ (U ** 2).T                    # hat-matrix diagonals
+        score = (counts * (resid / (1 - leverage)) ** 2).mean(axis=1)
+    best = np.argmin(score)
+    return within + float(rss[best]), float(lambdas[best])
+
+# Chosen UnivariateSpline smoothing factor (and penalty) for every series of a batch
+def select_smoothing(dates, ndvi, criterion="gcv"):
+    x_full = days_since_start(dates)
+    y = np.atleast_2d(np.asarray(ndvi, dtype=float))
+    x_rows = np.broadcast_to(x_full, y.shape)
+    s = np.full(len(y), np.nan)
+    lam = np.full(len(y), np.nan)
+    for i in range(len(y)):
+        mask = ~np.isnan(y[i])
+        if mask.sum() >= 2:
+            s[i], lam[i] = select_row_smoothing(x_rows[i][mask], y[i][mask], criterion)
+    return s, lam
+
+# Upper banded form of lam * D'D, D the order-d difference matrix on n points (for solveh_banded)
+def whittaker_penalty(n, lam, d=2):
+    coef = np.diff(np.eye(d + 1), d, axis=0)[0]          # [1, -2, 1] for d=2
+    ab = np.zeros((d + 1, n))
+    rows = n - d
+    if rows > 0:
+        for j1 in range(d + 1):
+            for j2 in range(j1, d + 1):
+                ab[d - (j2 - j1), j2:j2 + rows] += lam * coef[j1] * coef[j2]
+    return ab
+
+# Weighted Whittaker smoother on a regular grid: solves (W + lam D'D) z = W y in O(n)
+def whittaker_smooth(y, w, lam=WHITTAKER_LAMBDA, d=2, penalty=None):
+    y = np.asarray(y, dtype=float)
+    w = np.where(np.isnan(y), 0.0, np.asarray(w, dtype=float))
+    ab = (whittaker_penalty(len(y), lam, d) if penalty is None else penalty).copy()
+    ab[d] += w
+    return solveh_banded(ab, w * np.nan_to_num(y), check_finite=False)
+
+# Whittaker gap-fill of one series: observations are placed on a daily grid,
+# weighted by quality (e.g. weights.assign_weights), smoothed and sampled back at the input dates
+def _whittaker_row(x_full, y, w, lam, penalties):
+    w = np.where(np.isnan(y), 0.0, w)
+    if np.count_nonzero(w) < 2:
+        return y
+
+    day = np.round(x_full).astype(int)
+    n = day.max() + 1
+    y_grid = np.zeros(n)
+    w_grid = np.zeros(n)
+    np.add.at(w_grid, day, w)
+    np.add.at(y_grid, day, w * np.nan_to_num(y))
+    y_grid = np.divide(y_grid, w_grid, out=np.full(n, np.nan), where=w_grid > 0)
+
+    if n not in penalties:
+        penalties[n] = whittaker_penalty(n, lam)
+    z = whittaker_smooth(y_grid, w_grid, lam, penalty=penalties[n])
+
+    y_interp = z[day]
+    observed = x_full[w > 0]
+    y_interp[(x_full < observed.min()) | (x_full > observed.max())] = np.nan
+    return y_interp
+
+def _interpolate_row(x_full, y, method, smooth):
+    # Handle all-NaN or single-point case
+    mask = ~np.isnan(y)
+    if mask.sum() < 2:
+        return y
+
+    x = x_full[mask]
+    y_interp = _fit(x, y[mask], x_full, method, smooth)
+
     # Optionally, keep NaNs outside the observed date range
-    x_min, x_max = x.min(), x.max()
-    outside = (x_full < x_min) | (x_full > x_max)
+    outside = (x_full < x.min()) | (x_full > x.max())
     y_interp[outside] = np.nan
+    return y_interp
+
+# Batched gap-filling of a (farms x dates) array on a shared date axis.
+# pchip/cubic rows with the same valid-point pattern are fitted together in one call.
+def _interpolate_shared_axis(x_full, y, method, smooth):
+    out = y.copy()
+    valid = ~np.isnan(y)
+    enough = valid.sum(axis=1) >= 2
+    if method == "univariate":
+        for i in np.flatnonzero(enough):
+            out[i] = _interpolate_row(x_full, y[i], method, smooth)
+        return out
+
+    patterns, group = np.unique(valid[enough], axis=0, return_inverse=True)
+    rows = np.flatnonzero(enough)
+    for g, mask in enumerate(patterns):
+        members = rows[group.ravel() == g]
+        x = x_full[mask]
+        y_interp = _fit(x, y[np.ix_(members, mask)], x_full, method, smooth)
+        y_interp[:, (x_full < x.min()) | (x_full > x.max())] = np.nan
+        out[members] = y_interp
+    return out
+
+#  fill missing NDVI values using spline interpolation
+#  ndvi may be one series or a (farms x dates) array; dates may be shared (1-D) or per row (2-D).
+#  Rows with fewer than two valid points are returned unchanged.
+#  method="whittaker" smooths and gap-fills in one pass; smooth is its lambda and
+#  weights (same shape as ndvi, e.g. weights.assign_weights) down-weight cloudy acquisitions.
+#  dates may also be an NDVISeries.
+def spline_interpolate_ndvi(dates, ndvi=None, method='pchip', smooth=None, weights=None):
+    # An NDVISeries carries its own datetime64 axis; ndvi defaults to its mean
+    if isinstance(dates, NDVISeries) and ndvi is None:
+        ndvi = dates.mean
+    if method not in METHODS:
+        raise ValueError("method must be 'pchip', 'cubic', 'univariate' or 'whittaker'")
+
+    # Convert dates to numeric (days since first date), once for the whole batch
+    x_full = days_since_start(dates)
+    y = np.asarray(ndvi, dtype=float)
+
+    if method == "whittaker":
+        lam = WHITTAKER_LAMBDA if smooth is None else smooth
+        w = np.broadcast_to(np.ones(y.shape) if weights is None else np.asarray(weights, dtype=float), y.shape)
+        penalties = {}
+        if y.ndim == 1:
+            return _whittaker_row(x_full, y.copy(), w, lam, penalties)
+        x_rows = np.broadcast_to(x_full, y.shape)
+        return np.array([_whittaker_row(x_rows[i], y[i].copy(), w[i], lam, penalties) for i in range(len(y))])
 
-    return y_interp
\ No newline at end of file
+    if y.ndim == 1:
+        return _interpolate_row(x_full, y.copy(), method, smooth)
+    if x_full.ndim == 1:
+        return _interpolate_shared_axis(x_full, y, method, smooth)
+    return np.array([_interpolate_row(x_full[i], y[i].copy(), method, smooth) for i in range(len(y))])
@@ -0,0 +1,149 @@
+# load_test.py
+# Concurrent load test of service.py. Keep-alive clients issue a mix of dashboard queries and
+# the script reports latency percentiles and throughput:
+#   python load_test.py                               synthetic store, service started in-process
+#   python load_test.py --store-root ndvi_store       existing store, service started in-process
+#   python load_test.py --url http://127.0.0.1:8765   an already running service
+import argparse
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import service
+import store
+
+
+# Seasonal NDVI statistics for n_farms farms on a 5-day revisit, ~15% cloudy dates without a mean
+def synthetic_store(root, n_farms=200, n_dates=73, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2023-12-01") + np.arange(n_dates) * np.timedelta64(5, "D")
+    t = np.linspace(0, 1, n_dates)
+    farm_ids = [str(i) for i in range(n_farms)]
+    for farm_id in farm_ids:
+        peak = rng.uniform(0.3, 0.7)
+        mean = 0.15 + peak * np.exp(-((t - rng.uniform(0.4, 0.6)) / 0.15) ** 2) + rng.normal(0, 0.02, n_dates)
+        total = np.full(n_dates, 400)
+        valid = (total * rng.uniform(0.3, 1.0, n_dates)).astype(int)
+        cloudy = rng.random(n_dates) < 0.15
+        valid[cloudy] = 0
+        mean[cloudy] = np.nan
+        series = ([str(d) for d in dates], mean, mean, np.full(n_dates, 0.05), mean - 0.1, mean + 0.1, valid, total)
+        store.write_farm_stats(root, farm_id, series)
+    return farm_ids
+
+# Request target of one simulated dashboard query
+def query(farm_ids, rng):
+    farm_id = farm_ids[rng.integers(len(farm_ids))]
+    kind = rng.random()
+    if kind < 0.5:
+        return f"/farms/{farm_id}/latest"
+    if kind < 0.7:
+        return f"/farms/{farm_id}/series"
+    if kind < 0.85:
+        return f"/farms/{farm_id}/series?start=2024-06-01&end=2024-10-22"
+    if kind < 0.95:
+        return f"/farms/{farm_id}/series?fill={('pchip', 'whittaker')[rng.integers(2)]}"
+    picked = rng.choice(len(farm_ids), size=min(10, len(farm_ids)), replace=False)
+    return "/latest?farms=" + ",".join(farm_ids[i] for i in sorted(picked))
+
+
+async def get(reader, writer, target):
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+async def fetch_json(host, port, target):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await get(reader, writer, target)
+    finally:
+        writer.close()
+    return status, json.loads(body)
+
+# Latencies (seconds) of n_requests queries issued by `concurrency` keep-alive clients, and the error count
+async def run_load(host, port, farm_ids, n_requests=5000, concurrency=32, seed=0):
+    rng = np.random.default_rng(seed)
+    targets = [query(farm_ids, rng) for _ in range(n_requests)]
+    latencies = []
+    errors = 0
+
+    async def client(mine):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for target in mine:
+                t0 = time.perf_counter()
+                status, _ = await get(reader, writer, target)
+                latencies.append(time.perf_counter() - t0)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client(targets[i::concurrency]) for i in range(concurrency)))
+    return np.array(latencies), errors
+
+# Service on its own event loop in a daemon thread: (service, port)
+def start_in_thread(store_root, cache_size=service.CACHE_SIZE):
+    ndvi_service = service.NDVIService(store_root, cache_size)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(ndvi_service.start("127.0.0.1", 0), loop).result()
+    return ndvi_service, server.sockets[0].getsockname()[1]
+
+
+def summarize(latencies, errors, seconds):
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+    return {"requests": len(latencies), "errors": errors, "throughput_rps": len(latencies) / seconds,
+            "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": latencies.max() * 1e3}
+
+def load_test(host, port, farm_ids, n_requests=5000, concurrency=32, warmup=True):
+    if warmup:
+        # one pass over every distinct query first, so the measured run sees a warm cache
+        asyncio.run(run_load(host, port, farm_ids, n_requests, concurrency))
+    t0 = time.perf_counter()
+    latencies, errors = asyncio.run(run_load(host, port, farm_ids, n_requests, concurrency))
+    return summarize(latencies, errors, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the NDVI query service")
+    parser.add_argument("--url", default=None, help="running service to test (default: start one in-process)")
+    parser.add_argument("--store-root", default=None, help="store to serve (default: a synthetic store)")
+    parser.add_argument("--farms", type=int, default=200, help="farms in the synthetic store")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cold", action="store_true", help="skip the warm-up pass (measure cache misses too)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ndvi_service = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port
+            farm_ids = asyncio.run(fetch_json(host, port, "/farms"))[1]["farms"]
+        else:
+            root = args.store_root or tmp
+            farm_ids = store.farm_ids(root) if args.store_root else synthetic_store(root, args.farms)
+            ndvi_service, port = start_in_thread(root)
+            host = "127.0.0.1"
+        print(f"{args.requests} requests, {args.concurrency} concurrent clients, {len(farm_ids)} farms")
+        result = load_test(host, port, farm_ids, args.requests, args.concurrency, warmup=not args.cold)
+        print(f"throughput {result['throughput_rps']:9.0f} req/s   errors {result['errors']}")
+        print(f"latency    p50 {result['p50_ms']:.2f} ms   p90 {result['p90_ms']:.2f} ms   "
+              f"p99 {result['p99_ms']:.2f} ms   max {result['max_ms']:.2f} ms")
+        if ndvi_service is not None:
+            print(f"cache      {ndvi_service.hits} hits, {ndvi_service.misses} misses")
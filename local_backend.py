@@ -0,0 +1,94 @@
+import numpy as np
+
+# Offline NumPy counterpart of cloud_mask.py, gee.add_ndvi and stats.extract_ndvi_stats.
+# Band stacks are (time, y, x) arrays; every date is reduced in one batched pass.
+
+QA60_CLOUD_BIT = 1 << 10
+QA60_CIRRUS_BIT = 1 << 11
+
+# Same rule as cloud_mask.mask_clouds_s2: QA60 bits 10/11 clear and, if present, CLDPRB below threshold
+def mask_clouds_s2(qa60, cldprb=None, cloud_threshold=30):
+    qa = np.nan_to_num(np.asarray(qa60, dtype=float)).astype(np.int64)
+    valid = ((qa & QA60_CLOUD_BIT) == 0) & ((qa & QA60_CIRRUS_BIT) == 0)
+    if cldprb is not None:
+        with np.errstate(invalid="ignore"):
+            valid &= np.asarray(cldprb, dtype=float) < cloud_threshold
+    return valid
+
+def add_ndvi(b4, b8):
+    b4 = np.asarray(b4, dtype=float)
+    b8 = np.asarray(b8, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ndvi = (b8 - b4) / (b8 + b4)
+    ndvi[~np.isfinite(ndvi)] = np.nan
+    return ndvi
+
+# Masked NDVI cube: NaN wherever a pixel is cloudy
+def mask_and_calculate_ndvi(b4, b8, qa60, cldprb=None, cloud_threshold=30):
+    ndvi = add_ndvi(b4, b8)
+    ndvi[~mask_clouds_s2(qa60, cldprb, cloud_threshold)] = np.nan
+    return ndvi
+
+def _date_strings(dates):
+    dates = np.asarray(dates)
+    if not np.issubdtype(dates.dtype, np.datetime64):
+        dates = np.array([np.datetime64(str(d)[:10]) for d in dates])
+    return tuple(str(d) for d in dates.astype("datetime64[D]"))
+
+def _empty_stats():
+    return [], np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([])
+
+# Per-date NDVI statistics over a (time, y, x) NDVI cube, returned as the 8-tuple of stats.extract_ndvi_stats
+def ndvi_cube_stats(dates, ndvi, region_mask=None):
+    ndvi = np.asarray(ndvi, dtype=float)
+    if region_mask is None:
+        region_mask = np.ones(ndvi.shape[1:], dtype=bool)
+    values = ndvi[:, region_mask]                     # (time, pixels in region)
+    total = int(region_mask.sum())
+
+    valid = (~np.isnan(values)).sum(axis=1)
+    keep = valid > 0
+    if not keep.any():
+        return _empty_stats()
+    values = values[keep]
+
+    means = np.nanmean(values, axis=1)
+    medians = np.nanmedian(values, axis=1)
+    stds = np.nanstd(values, axis=1)
+    perc_10, perc_90 = np.nanpercentile(values, [10, 90], axis=1)
+
+    dates_f = tuple(d for d, k in zip(_date_strings(dates), keep) if k)
+    pixels_f = valid[keep].astype(int)
+    total_pixels_f = np.full(len(dates_f), total, dtype=int)
+    return (dates_f, means, medians, stds, perc_10, perc_90, pixels_f, total_pixels_f)
+
+def extract_ndvi_stats(dates, b4, b8, qa60, cldprb=None, region_mask=None, cloud_threshold=30):
+    ndvi = mask_and_calculate_ndvi(b4, b8, qa60, cldprb, cloud_threshold)
+    return ndvi_cube_stats(dates, ndvi, region_mask)
+
+# Read a multi-band GeoTIFF (one band per date) as a (time, y, x) array
+def read_band_stack(path):
+    import rasterio
+    with rasterio.open(path) as src:
+        return src.read(), src.transform
+
+# Boolean (y, x) mask of the pixels whose centres fall inside a polygon given in the raster CRS
+def region_mask_from_coords(coords, shape, transform):
+    from rasterio.features import geometry_mask
+    ring = [list(p) for p in coords]
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    geom = {"type": "Polygon", "coordinates": [ring]}
+    return geometry_mask([geom], out_shape=shape, transform=transform, invert=True)
+
+# GeoTIFF entry point: paths maps band name (B4, B8, QA60, optional CLDPRB) to a stacked GeoTIFF
+def extract_ndvi_stats_from_geotiffs(dates, paths, region_coords=None, cloud_threshold=30):
+    b4, transform = read_band_stack(paths["B4"])
+    b8, _ = read_band_stack(paths["B8"])
+    qa60, _ = read_band_stack(paths["QA60"])
+    cldprb = read_band_stack(paths["CLDPRB"])[0] if paths.get("CLDPRB") else None
+
+    region_mask = None
+    if region_coords is not None:
+        region_mask = region_mask_from_coords(region_coords, b4.shape[1:], transform)
+    return extract_ndvi_stats(dates, b4, b8, qa60, cldprb, region_mask, cloud_threshold)
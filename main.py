@@ -1,9 +1,9 @@
-from scipy.ndimage import gaussian_filter1d
-import plot
-import stats
-import gee
-import interpolate
-import weights
+import instrument
+import pipeline
+
+# Optional instrumentation: python main.py --instrument run1 [--profile run1.prof] [--trace-memory]
+instrument_args = instrument.args_from_argv()
+instrument.start(instrument_args)
 
 #Define the region of interest 
 coords_meters = [
@@ -13,59 +13,52 @@ coords_meters = [
     [ 8915823.291206929832697, 3231663.280803931877017 ]
 ]  
 
-# Initialize GEE and load image collection
-print("Initializing Earth Engine...")
-gee.initialize_ee(project='brijesh-ndvi')
-
-#Define region and transform coordinates
-print("Transforming coordinates and creating region...")
-coords_lonlat_fixed = gee.transform_coords(coords_meters)
-region = gee.create_region(coords_lonlat_fixed)
-
-# Load Sentinel-2 image collection
-print("Loading Sentinel-2 collection...")
-ic = gee.load_s2_collection(region, '2023-12-01', '2024-12-01', cloud_pct=90)
-
-count_before = ic.size().getInfo()
-print(f"Number of images in collection before masking: {count_before}")
-
-# Masking and NDVI are done together in module
-ndvi_collection = gee.mask_and_calculate_ndvi(ic, cloud_threshold=30)
-ndvi_median = ndvi_collection.select('NDVI').median().clip(region)
-count = ndvi_collection.size().getInfo()
-print(f"Number of images in NDVI collection: {count}")
-
-image_list = ndvi_collection.toList(count)
-
-# Extract NDVI statistics
-dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = stats.extract_ndvi_stats(image_list, region, count)
-
-# Compute valid pixel fraction and assign weights
-fractions_f = weights.calculate_valid_fractions(pixels_f, total_pixels_f)
-weights_f = weights.assign_weights(fractions_f)
-
-# Handle missing data with spline and linear interpolation
-means_f_masked = interpolate.mask_dates_for_interpolation(
-    dates_f, 
-    means_f, 
-    "2024-06-01", "2024-10-22",
-    outside_to_nan=False
-)
-means_spline = interpolate.spline_interpolate_ndvi(
-    dates_f, 
-    means_f_masked,
-    method="univariate",
-    smooth=None    
-)
-
-
-# Gaussian smoothing (sigma=2 recommended; adjust for smoothness)
-sigma = 2
-means_gauss   = gaussian_filter1d(means_f, sigma=sigma)
-medians_gauss = gaussian_filter1d(medians_f, sigma=sigma)
-stds_gauss    = gaussian_filter1d(stds_f, sigma=sigma)
-p10_gauss     = gaussian_filter1d(perc_10_f, sigma=sigma)
-p90_gauss     = gaussian_filter1d(perc_90_f, sigma=sigma)
+# Farm id and columnar statistics store (Parquet, one partition per farm)
+farm_id = "1"
+store_root = "ndvi_store"
+
+# Statistics backend: "ee" runs on Earth Engine, "local" reduces downloaded band stacks with NumPy,
+# "cube" downloads the farm's pixels once into an on-disk cube (see cube.py) and reduces it locally
+backend = "ee"
+cube_root = "pixel_cubes"
+
+# Local backend inputs: one stacked GeoTIFF per band (one band per date, EPSG:3857) and a date list
+local_stack = {"B4": "stack/B4.tif", "B8": "stack/B8.tif", "QA60": "stack/QA60.tif", "CLDPRB": "stack/CLDPRB.tif"}
+local_dates_file = "stack/dates.txt"
+
+# Workflow parameters; every stage is memoized on the parameters it reads (see pipeline.py),
+# so changing e.g. sigma or the interpolation window only re-runs the stages downstream of it
+params = {
+    **pipeline.DEFAULT_PARAMS,
+    "project": "brijesh-ndvi",
+    "farm_id": farm_id,
+    "coords_meters": coords_meters,
+    "start_date": "2023-12-01",
+    "end_date": "2024-12-01",
+    "cloud_pct": 90,
+    "cloud_threshold": 30,
+    "local_stack": local_stack,
+    "local_dates_file": local_dates_file,
+    "cube_root": cube_root,
+    "store_root": store_root,
+    # Interpolation window and method for the spline gap-fill
+    "interp_start": "2024-06-01",
+    "interp_end": "2024-10-22",
+    "method": "univariate",
+    # Gaussian smoothing (sigma=2 recommended; adjust for smoothness)
+    "sigma": 2.0,
+    # Set plot_output_dir (e.g. "custom farm 1") to render PNGs headless instead of opening windows
+    "plot_output_dir": None,
+}
+
+pipe = pipeline.farm_pipeline(backend=backend)
+outputs = pipe.run(["store", "gapfill", "smoothing"], params)
+print(pipe.summary())
+
+dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = outputs["stats"]
+fractions_f, weights_f = outputs["weights"]
+means_spline, means_whittaker = outputs["gapfill"]
+means_gauss, medians_gauss, stds_gauss, p10_gauss, p90_gauss = outputs["smoothing"]
 
 # Pretty text table (aligned)
 header = "|   Date     |  Mean   | Median  |  Std    |  10%    |  90%    | Pixels  | Fraction | Weight |"
@@ -81,12 +74,6 @@ for d, mn, m, s, p1, p9, c, vf, w in zip(dates_f, means_f, medians_f, stds_f, pe
     print(f"| {d:<10} | {fmt(mn)} | {fmt(m)} | {fmt(s)} | {fmt(p1)} | {fmt(p9)} | {c:7d} | {fmt(vf)} | {w:6d} |")
 
 
-# Generate plots using the plot module
-plot.plot_mean_ndvi(dates_f, means_f, means_gauss)
-plot.plot_median_ndvi(dates_f, medians_f, medians_gauss)
-plot.plot_ndvi_stddev(dates_f, stds_f, stds_gauss)
-plot.plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss)
-plot.plot_valid_pixel_count(dates_f, pixels_f)
-plot.plot_valid_pixel_fraction(dates_f, fractions_f)
-plot.plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90_gauss, stds_gauss)
-plot.plot_mean_ndvi_with_spline(dates_f, means_f, means_spline, means_gauss)
+# Generate plots using the plot module (always re-rendered)
+pipe.run("plots", params)
+instrument.finish(instrument_args)
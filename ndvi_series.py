@@ -0,0 +1,107 @@
+import numpy as np
+
+# Compact array-backed NDVI series shared by stats, weights, interpolate and plot.
+# Dates are datetime64[D], statistics float32 and pixel counts int32; rows are filled in place
+# as results arrive (capacity grows geometrically), so no per-row Python objects are kept.
+
+STAT_FIELDS = ("mean", "median", "std", "p10", "p90")
+COUNT_FIELDS = ("valid_pixels", "total_pixels")
+# Date label stats.format_date gives acquisitions without a timestamp; stored as NaT
+UNKNOWN_DATE = "Unknown"
+
+
+def _to_day(date):
+    if isinstance(date, str):
+        return np.datetime64("NaT", "D") if date == UNKNOWN_DATE else np.datetime64(date[:10], "D")
+    return date
+
+# datetime64[D] array of dates given as strings or datetime64 (UNKNOWN_DATE -> NaT)
+def to_days(dates):
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype("datetime64[D]")
+    return np.array([_to_day(d) for d in dates], dtype="datetime64[D]")
+
+
+class NDVISeries:
+    __slots__ = ("farm_id", "_size", "_dates", "_mean", "_median", "_std", "_p10", "_p90",
+                 "_valid_pixels", "_total_pixels")
+
+    def __init__(self, capacity=64, farm_id=None):
+        self.farm_id = farm_id
+        self._size = 0
+        self._allocate(max(int(capacity), 1))
+
+    def _allocate(self, capacity):
+        old_size = self._size
+        old = {name: getattr(self, "_" + name, None) for name in ("dates", *STAT_FIELDS, *COUNT_FIELDS)}
+        self._dates = np.empty(capacity, dtype="datetime64[D]")
+        for name in STAT_FIELDS:
+            setattr(self, "_" + name, np.empty(capacity, dtype=np.float32))
+        for name in COUNT_FIELDS:
+            setattr(self, "_" + name, np.empty(capacity, dtype=np.int32))
+        for name, arr in old.items():
+            if arr is not None:
+                getattr(self, "_" + name)[:old_size] = arr[:old_size]
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        span = f"{self._dates[0]}..{self._dates[self._size - 1]}" if self._size else "empty"
+        return f"NDVISeries(farm_id={self.farm_id!r}, n={self._size}, {span})"
+
+    @property
+    def capacity(self):
+        return len(self._dates)
+
+    # Add one acquisition in place
+    def append(self, date, mean, median, std, p10, p90, valid_pixels, total_pixels):
+        if self._size == self.capacity:
+            self._allocate(2 * self.capacity)
+        i = self._size
+        self._dates[i] = _to_day(date)
+        self._mean[i], self._median[i], self._std[i] = mean, median, std
+        self._p10[i], self._p90[i] = p10, p90
+        self._valid_pixels[i], self._total_pixels[i] = valid_pixels, total_pixels
+        self._size += 1
+
+    # Release unused capacity once the series is complete
+    def trim(self):
+        if self.capacity > self._size:
+            self._allocate(self._size)
+        return self
+
+    @classmethod
+    def from_tuple(cls, stats_tuple, farm_id=None):
+        dates_f = stats_tuple[0]
+        series = cls(capacity=len(dates_f), farm_id=farm_id)
+        n = len(dates_f)
+        series._dates[:n] = to_days(dates_f)
+        for name, values in zip((*STAT_FIELDS, *COUNT_FIELDS), stats_tuple[1:]):
+            getattr(series, "_" + name)[:n] = values
+        series._size = n
+        return series
+
+    # The 8-tuple returned by stats.extract_ndvi_stats
+    def as_tuple(self):
+        return (
+            tuple(UNKNOWN_DATE if np.isnat(d) else str(d) for d in self.dates),
+            *(getattr(self, name).astype(float) for name in STAT_FIELDS),
+            *(getattr(self, name).astype(int) for name in COUNT_FIELDS),
+        )
+
+    def valid_fractions(self):
+        return self.valid_pixels / self.total_pixels
+
+
+def _view(name):
+    return property(lambda self: getattr(self, "_" + name)[:self._size])
+
+
+for _name in ("dates", *STAT_FIELDS, *COUNT_FIELDS):
+    setattr(NDVISeries, _name, _view(_name))
+
+
+# Date axis of an NDVISeries or anything date-like (passed through unchanged)
+def dates_of(obj):
+    return obj.dates if isinstance(obj, NDVISeries) else obj
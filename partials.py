@@ -0,0 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import instrument
+
+# Mergeable NDVI statistics. A partial holds, per acquisition, the sufficient statistics
+# (valid count, mean, sum of squared deviations, total pixels) and a fixed-bin NDVI histogram.
+# Partials of disjoint areas merge exactly (Chan et al. for mean/variance, histograms add), so
+# large fields can be reduced tile by tile and farm results rolled up into village or district
+# summaries without recomputing any pixels. Median/p10/p90 come from the histogram sketch.
+# Acquisitions are keyed on (date, scene id), so two scenes of the same day (farms in the overlap
+# of two MGRS granules) stay separate rows; without scene ids, the n-th scene of a date gets id n.
+
+HIST_MIN, HIST_MAX = -1.0, 1.0
+HIST_BINS = 500
+
+
+class StatsPartial:
+    __slots__ = ("dates", "ids", "count", "mean", "m2", "total", "hist")
+
+    def __init__(self, dates, count, mean, m2, total, hist, ids=None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.ids = _occurrence_ids(self.dates) if ids is None else np.asarray(ids, dtype=str)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.mean = np.asarray(mean, dtype=float)
+        self.m2 = np.asarray(m2, dtype=float)
+        self.total = np.asarray(total, dtype=np.int64)
+        self.hist = np.asarray(hist, dtype=np.int64).reshape(len(self.dates), -1)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def empty(cls, dates, bins=HIST_BINS, ids=None):
+        n = len(dates)
+        return cls(dates, np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n), np.zeros((n, bins)), ids)
+
+    # "date|id" per row; sorts by date first
+    def keys(self):
+        return np.char.add(np.char.add(self.dates.astype(str), "|"), self.ids)
+
+    # Partial of a (dates, pixels) array of NDVI values, NaN = masked
+    @classmethod
+    def from_values(cls, dates, values, total=None, bins=HIST_BINS, ids=None):
+        values = np.asarray(values, dtype=float).reshape(len(dates), -1)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.nansum(values, axis=1) / np.maximum(count, 1), 0.0)
+        m2 = np.nansum((values - mean[:, None]) ** 2, axis=1)
+        # One bincount over (row, bin) pairs for all dates at once
+        scaled = (np.nan_to_num(values) - HIST_MIN) / (HIST_MAX - HIST_MIN) * bins
+        k = np.clip(np.floor(scaled).astype(np.int64), 0, bins - 1)
+        rows = np.broadcast_to(np.arange(len(dates))[:, None], values.shape)
+        hist = np.bincount((rows * bins + k)[valid], minlength=len(dates) * bins)
+        if total is None:
+            total = values.shape[1]
+        return cls(dates, count, mean, m2, np.broadcast_to(total, (len(dates),)), hist, ids)
+
+    # Partial from Earth Engine sums (count, sum, sum of squares per date)
+    @classmethod
+    def from_sums(cls, dates, count, total_sum, sum_sq, total, hist, ids=None):
+        count = np.asarray(count, dtype=float)
+        total_sum = np.asarray(total_sum, dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total_sum / count, 0.0)
+        m2 = np.clip(np.asarray(sum_sq, dtype=float) - count * mean ** 2, 0, None)
+        return cls(dates, count, mean, m2, total, hist, ids)
+
+    # Exact merge of two partials of disjoint areas; acquisitions are aligned on the union of their keys
+    def merge(self, other):
+        keys = np.union1d(self.keys(), other.keys())
+        a, b = self._aligned(keys), other._aligned(keys)
+        count = a.count + b.count
+        delta = b.mean - a.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, a.mean + delta * b.count / np.maximum(count, 1), 0.0)
+            m2 = a.m2 + b.m2 + delta ** 2 * a.count * b.count / np.maximum(count, 1)
+        return StatsPartial(a.dates, count, mean, m2, a.total + b.total, a.hist + b.hist, a.ids)
+
+    def _aligned(self, keys):
+        own = self.keys()
+        if len(keys) == len(own) and np.array_equal(keys, own):
+            return self
+        dates, ids = zip(*(k.split("|", 1) for k in keys)) if len(keys) else ((), ())
+        out = StatsPartial.empty(dates, self.hist.shape[1], ids)
+        idx = np.searchsorted(keys, own)
+        out.count[idx], out.mean[idx], out.m2[idx] = self.count, self.mean, self.m2
+        out.total[idx], out.hist[idx] = self.total, self.hist
+        return out
+
+    # Quantiles (0-100) per date from the histogram, interpolated linearly inside a bin
+    def quantiles(self, q):
+        bins = self.hist.shape[1]
+        edges = np.linspace(HIST_MIN, HIST_MAX, bins + 1)
+        cum = np.cumsum(self.hist, axis=1)
+        n = cum[:, -1:].astype(float)
+        out = []
+        for p in np.atleast_1d(q):
+            target = p / 100.0 * n
+            k = np.minimum((cum < target).sum(axis=1, keepdims=True), bins - 1)
+            below = np.where(k > 0, np.take_along_axis(cum, np.maximum(k - 1, 0), 1), 0)
+            in_bin = np.take_along_axis(self.hist, k, 1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frac = np.where(in_bin > 0, (target - below) / in_bin, 0.0)
+            value = edges[k] + np.clip(frac, 0, 1) * (edges[1] - edges[0])
+            out.append(np.where(n > 0, value, np.nan)[:, 0])
+        return out
+
+    # The 8-tuple of stats.extract_ndvi_stats (dates without valid pixels dropped)
+    def finalize(self):
+        keep = self.count > 0
+        median, p10, p90 = (q[keep] for q in self.quantiles([50, 10, 90]))
+        std = np.sqrt(self.m2[keep] / self.count[keep])
+        return (tuple(str(d) for d in self.dates[keep]), self.mean[keep], median, std, p10, p90,
+                self.count[keep].astype(int), self.total[keep].astype(int))
+
+
+# Per-row occurrence number of each date ("0" for the first scene of a date, "1" for the second, ...)
+def _occurrence_ids(dates):
+    ids = np.zeros(len(dates), dtype=int)
+    values, counts = np.unique(dates, return_counts=True)
+    for date in values[counts > 1]:
+        rows = np.flatnonzero(dates == date)
+        ids[rows] = np.arange(len(rows))
+    return ids.astype(str)
+
+
+def merge_all(partials):
+    partials = list(partials)
+    result = partials[0]
+    for p in partials[1:]:
+        result = result.merge(p)
+    return result
+
+# Roll farm partials {farm_id: StatsPartial} up to {unit: StatsPartial} (village, district, ...)
+# given {farm_id: unit}; farms without a unit are left out
+def rollup(farm_partials, farm_units):
+    members = {}
+    for farm_id, partial in farm_partials.items():
+        if farm_id in farm_units:
+            members.setdefault(farm_units[farm_id], []).append(partial)
+    return {unit: merge_all(parts) for unit, parts in members.items()}
+
+# Partial of a local (time, y, x) NDVI cube (NaN = masked) over a boolean region mask,
+# e.g. the arrays of local_backend.extract_ndvi_stats
+def partial_from_cube(dates, ndvi, region_mask, bins=HIST_BINS):
+    values = np.asarray(ndvi)[:, np.asarray(region_mask, dtype=bool)]
+    return StatsPartial.from_values(dates, values, total=int(np.count_nonzero(region_mask)), bins=bins)
+
+
+# ------------------------------------------------------------ Earth Engine tiled reduction
+def _tile_rectangles(coords_lonlat, tile_size):
+    from shapely.geometry import Polygon, box
+    polygon = Polygon(coords_lonlat)
+    xmin, ymin, xmax, ymax = polygon.bounds
+    nx = max(int(np.ceil((xmax - xmin) / tile_size - 1e-9)), 1)
+    ny = max(int(np.ceil((ymax - ymin) / tile_size - 1e-9)), 1)
+    rects = []
+    for i in range(nx):
+        for j in range(ny):
+            x, y = xmin + i * tile_size, ymin + j * tile_size
+            rect = [x, y, min(x + tile_size, xmax), min(y + tile_size, ymax)]
+            if polygon.intersects(box(*rect)):
+                rects.append(rect)
+    return rects
+
+# Server-side partial sums of one tile for every image: one feature per image.
+# reduceRegion weights sum() and fixedHistogram() by the fractional coverage of edge pixels but
+# not count(), so every reducer is unweighted: whole-pixel sums and counts merge exactly.
+def tile_partials_collection(ndvi_collection, tile, scale=10, bins=HIST_BINS):
+    import ee
+    reducer = (ee.Reducer.count()
+               .combine(ee.Reducer.sum().unweighted(), '', True)
+               .combine(ee.Reducer.fixedHistogram(HIST_MIN, HIST_MAX, bins).unweighted(), '', True))
+    total = ee.Image.constant(1).clip(tile).reduceRegion(
+        reducer=ee.Reducer.count(), geometry=tile, scale=scale, maxPixels=int(1e9)).get('constant')
+
+    def reduce_image(img):
+        ndvi = img.select('NDVI').clip(tile)
+        sums = ndvi.reduceRegion(reducer=reducer, geometry=tile, scale=scale, maxPixels=int(1e9))
+        sum_sq = ndvi.pow(2).reduceRegion(
+            reducer=ee.Reducer.sum().unweighted(), geometry=tile, scale=scale, maxPixels=int(1e9)).get('NDVI')
+        return ee.Feature(None, sums).set({
+            'sum_sq': sum_sq,
+            'total_pixels': total,
+            'system:time_start': img.get('system:time_start'),
+            'system:index': img.get('system:index'),
+        })
+
+    return ee.FeatureCollection(ndvi_collection.map(reduce_image))
+
+def _partial_from_features(features, bins):
+    import stats
+    dates, ids, count, total_sum, sum_sq, total, hist = [], [], [], [], [], [], []
+    for f in features:
+        props = f['properties']
+        dates.append(stats.format_date(props.get('system:time_start')))
+        ids.append(props.get('system:index', f.get('id')))
+        count.append(props.get('NDVI_count') or 0)
+        total_sum.append(props.get('NDVI_sum') or 0.0)
+        sum_sq.append(props.get('sum_sq') or 0.0)
+        total.append(props.get('total_pixels') or 0)
+        h = props.get('NDVI_histogram')
+        hist.append([c for _, c in h] if h else [0] * bins)
+    return StatsPartial.from_sums(dates, count, total_sum, sum_sq, total, hist, ids)
+
+# Tiled reduction of a large field: the polygon is split into tile_size-degree sub-tiles,
+# every tile is reduced independently (one round trip each, in parallel) and the partials
+# are merged. Returns the merged StatsPartial; .finalize() gives the usual 8-tuple.
+def extract_partials_tiled(ndvi_collection, region, coords_lonlat, tile_size=0.01, scale=10,
+                           bins=HIST_BINS, max_workers=4):
+    import ee
+    import gee
+    tiles = [region.intersection(ee.Geometry.Rectangle(rect), 1)
+             for rect in _tile_rectangles(coords_lonlat, tile_size)]
+
+    def reduce_tile(tile):
+        features = gee.get_info(tile_partials_collection(ndvi_collection, tile, scale, bins))['features']
+        return _partial_from_features(features, bins)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return merge_all(pool.map(instrument.bind(reduce_tile), tiles))
@@ -0,0 +1,95 @@
+import numpy as np
+
+# Growth stage codes for a single crop cycle (mutually exclusive)
+EMPTY, BARE, GROWTH, PEAK, SENESCENCE = 0, 1, 2, 3, 4
+STAGE_NAMES = ("empty field/water", "bare/low cover", "rapid growth", "peak", "senescence/maturity")
+STAGE_COLORS = ("#b3c6e0", "#cccccc", "#3ac96a", "#005902", "#f5c542")
+
+# Season metrics, one row per farm
+SEASON_DTYPE = np.dtype([
+    ("sos", "datetime64[D]"),            # start of season (up-crossing of the amplitude threshold)
+    ("eos", "datetime64[D]"),            # end of season (down-crossing after the peak)
+    ("peak_date", "datetime64[D]"),
+    ("peak_value", "f4"),
+    ("greenup_rate", "f4"),              # NDVI per day, threshold -> peak
+    ("senescence_rate", "f4"),           # NDVI per day, peak -> threshold (positive = decline)
+    ("season_length", "f4"),             # days
+])
+
+# Stage code for every value of one series or a (farms x dates) array, same rules as the
+# original plot.get_stage_colors loop: NDVI level plus the sign of the change from the previous date
+def classify_stages(ndvi):
+    ndvi = np.asarray(ndvi, dtype=float)
+    ndvi_diff = np.diff(ndvi, axis=-1, prepend=ndvi[..., :1])
+    with np.errstate(invalid="ignore"):
+        conditions = [
+            ndvi < 0.1,
+            (0.1 <= ndvi) & (ndvi < 0.3),
+            (0.3 <= ndvi) & (ndvi < 0.75) & (ndvi_diff >= 0),
+            (0.75 <= ndvi) & (ndvi <= 1.0),
+            (0.3 < ndvi) & (ndvi < 0.75) & (ndvi_diff < 0),
+        ]
+    # fallback: bare/low
+    return np.select(conditions, [EMPTY, BARE, GROWTH, PEAK, SENESCENCE], default=BARE).astype(np.int8)
+
+def stage_colors(stages):
+    return np.asarray(STAGE_COLORS)[stages]
+
+# Linear interpolation of the day at which y crosses thr between index i-1 and i
+def _crossing_day(x, y, i, thr):
+    i0 = np.clip(i - 1, 0, None)
+    x0, x1 = np.take_along_axis(x, i0, -1), np.take_along_axis(x, i, -1)
+    y0, y1 = np.take_along_axis(y, i0, -1), np.take_along_axis(y, i, -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(y1 != y0, (thr - y0) / (y1 - y0), 0.0)
+    return np.where(i > 0, x0 + np.clip(frac, 0, 1) * (x1 - x0), x1)
+
+# Season metrics for one series or a (farms x dates) array of (preferably gap-filled) NDVI.
+# Start/end of season are where NDVI crosses base + amplitude_fraction * (peak - base)
+# around the main peak. Rows without valid data get NaT/NaN.
+def season_metrics(dates, ndvi, amplitude_fraction=0.5):
+    # imported here so that plot (which imports this module) does not pull in scipy and pandas
+    from interpolate import to_datetime64
+    dates = to_datetime64(dates).astype("datetime64[D]")
+    y = np.atleast_2d(np.asarray(ndvi, dtype=float))
+    x = np.broadcast_to((dates - dates[..., :1]).astype(float), y.shape)
+    origin = np.broadcast_to(dates[..., :1], (len(y), 1))
+    idx = np.arange(y.shape[1])
+
+    has_data = ~np.isnan(y).all(axis=1)
+    peak = np.argmax(np.where(np.isnan(y), -np.inf, y), axis=1)[:, None]
+    peak_value = np.take_along_axis(y, peak, 1)
+    base = np.nanmin(np.where(has_data[:, None], y, 0.0), axis=1, keepdims=True)
+    thr = base + amplitude_fraction * (peak_value - base)
+
+    with np.errstate(invalid="ignore"):
+        below = y < thr
+    sos = (np.where(below & (idx < peak), idx, -1).max(axis=1, keepdims=True) + 1)
+    eos = (np.where(below & (idx > peak), idx, y.shape[1]).min(axis=1, keepdims=True) - 1)
+    sos_day = _crossing_day(x, y, sos, thr)
+    eos_day = _crossing_day(x, y, np.clip(eos + 1, None, y.shape[1] - 1), thr)
+    eos_day = np.where(eos == y.shape[1] - 1, np.take_along_axis(x, eos, 1), eos_day)
+    peak_day = np.take_along_axis(x, peak, 1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        greenup = np.where(peak_day > sos_day, (peak_value - thr) / (peak_day - sos_day), np.nan)
+        senescence = np.where(eos_day > peak_day, (peak_value - thr) / (eos_day - peak_day), np.nan)
+
+    def to_date(day):
+        return origin + np.round(day).astype("timedelta64[D]")
+
+    out = np.zeros(len(y), dtype=SEASON_DTYPE)
+    out["sos"] = to_date(sos_day)[:, 0]
+    out["eos"] = to_date(eos_day)[:, 0]
+    out["peak_date"] = to_date(peak_day)[:, 0]
+    out["peak_value"] = peak_value[:, 0]
+    out["greenup_rate"] = greenup[:, 0]
+    out["senescence_rate"] = senescence[:, 0]
+    out["season_length"] = (eos_day - sos_day)[:, 0]
+
+    empty = ~has_data
+    for name in ("sos", "eos", "peak_date"):
+        out[name][empty] = np.datetime64("NaT")
+    for name in ("peak_value", "greenup_rate", "senescence_rate", "season_length"):
+        out[name][empty] = np.nan
+    return out
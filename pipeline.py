@@ -0,0 +1,360 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+
+import instrument
+
+# Memoized stage graph for the single-farm workflow of main.py.
+# Every stage declares the stages it depends on and the parameters it reads. Its key is a hash
+# of its name, source code, those parameter values and the keys of its dependencies, so keys are
+# known before anything runs: a stage whose key is already memoized (in memory, or on disk for
+# persisted stages) is loaded without running, or even building, its upstream stages. Changing
+# a parameter therefore recomputes only the stages downstream of it.
+# Stages whose output depends on data the parameters do not pin down (new scenes in a date
+# window, input files rewritten in place) declare a version(params, *version_deps outputs)
+# that is mixed into their key. Versions computed from upstream stages are checked once per
+# Pipeline and recorded; an offline Pipeline reuses the recorded version instead of running
+# those stages (e.g. cli.py commands working on fetched data).
+
+CACHE_DIR = ".pipeline_cache"
+
+
+class Stage:
+    __slots__ = ("name", "fn", "deps", "params", "persist", "memo", "version", "version_deps")
+
+    def __init__(self, name, fn, deps=(), params=(), persist=True, memo=True, version=None, version_deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.params = tuple(params)
+        self.persist = persist      # pickle the output to the cache directory
+        self.memo = memo            # False: always run (e.g. interactive plots)
+        self.version = version      # version(params, *version_deps outputs): JSON-able data version
+        self.version_deps = tuple(version_deps)
+
+
+def _source_hash(fn):
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        source = fn.__code__.co_code.hex()
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+class Pipeline:
+    def __init__(self, cache_dir=CACHE_DIR, offline=False):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.stages = {}
+        self._memory = {}
+        self._versions = {}     # (stage, params key) -> version checked by this Pipeline
+        self.log = []       # (stage, "run" | "memory" | "disk", seconds) of the last run()
+
+    # Decorator registering fn(params, *dependency outputs) as a stage
+    def stage(self, name, deps=(), params=(), persist=True, memo=True, version=None, version_deps=()):
+        def register(fn):
+            self.stages[name] = Stage(name, fn, deps, params, persist, memo, version, version_deps)
+            return fn
+        return register
+
+    def key(self, name, params, _keys=None):
+        keys = {} if _keys is None else _keys
+        if name not in keys:
+            stage = self.stages[name]
+            h = hashlib.sha1(name.encode())
+            h.update(_source_hash(stage.fn).encode())
+            h.update(json.dumps({p: params.get(p) for p in stage.params}, sort_keys=True, default=str).encode())
+            for dep in stage.deps:
+                h.update(self.key(dep, params, keys).encode())
+            if stage.version is not None:
+                h.update(self._version(stage, params, h.hexdigest(), keys).encode())
+            keys[name] = h.hexdigest()
+        return keys[name]
+
+    def _version_path(self, name, base):
+        return os.path.join(self.cache_dir, f"{name}-{base[:16]}.version")
+
+    # JSON of a stage's data version. Versions of upstream data are checked once per Pipeline
+    # (offline: taken from the last check, "null" if there was none) and recorded on disk.
+    def _version(self, stage, params, base, keys):
+        if not stage.version_deps:
+            return json.dumps(stage.version(params), sort_keys=True, default=str)
+        cached = (stage.name, base)
+        if cached in self._versions:
+            return self._versions[cached]
+        path = self._version_path(stage.name, base) if self.cache_dir else None
+        if self.offline:
+            if path and os.path.exists(path):
+                with open(path) as f:
+                    self._versions[cached] = f.read()
+                return self._versions[cached]
+            return "null"
+        inputs = [self._evaluate(dep, params, keys, {}) for dep in stage.version_deps]
+        version = json.dumps(stage.version(params, *inputs), sort_keys=True, default=str)
+        self._versions[cached] = version
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                f.write(version)
+            os.replace(path + ".tmp", path)
+        return version
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key[:16]}.pkl")
+
+    # Where a memoized output would be loaded from: "memory", "disk" or None
+    def _cached(self, name, key):
+        if key in self._memory:
+            return "memory"
+        if self.stages[name].persist and self.cache_dir and os.path.exists(self._path(name, key)):
+            return "disk"
+        return None
+
+    def _load(self, name, key):
+        source = self._cached(name, key)
+        if source == "memory":
+            return True, self._memory[key], source
+        if source == "disk":
+            with open(self._path(name, key), "rb") as f:
+                value = pickle.load(f)
+            self._memory[key] = value
+            return True, value, source
+        return False, None, None
+
+    def _store(self, name, key, value):
+        self._memory[key] = value
+        if self.stages[name].persist and self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(name, key) + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(name, key))
+
+    def _evaluate(self, name, params, keys, results):
+        if name in results:
+            return results[name]
+        stage = self.stages[name]
+        key = self.key(name, params, keys)
+        t0 = time.perf_counter()
+        if stage.memo:
+            found, value, source = self._load(name, key)
+            if found:
+                self.log.append((name, source, time.perf_counter() - t0))
+                results[name] = value
+                return value
+        inputs = [self._evaluate(dep, params, keys, results) for dep in stage.deps]
+        t0 = time.perf_counter()
+        with instrument.stage(name):
+            value = stage.fn(params, *inputs)
+        self.log.append((name, "run", time.perf_counter() - t0))
+        if stage.memo:
+            self._store(name, key, value)
+        results[name] = value
+        return value
+
+    # Outputs {stage: value} of the target stage(s); only stages whose key is not memoized run
+    def run(self, targets, params):
+        targets = [targets] if isinstance(targets, str) else list(targets)
+        self.log = []
+        keys, results = {}, {}
+        for target in targets:
+            self._evaluate(target, params, keys, results)
+        return results
+
+    def _plan(self, name, params, keys, steps):
+        if name in steps:
+            return
+        stage = self.stages[name]
+        key = self.key(name, params, keys)
+        source = self._cached(name, key) if stage.memo else None
+        if source is None:
+            for dep in stage.deps:
+                self._plan(dep, params, keys, steps)
+        steps[name] = source or "run"
+
+    # {stage: "run" | "memory" | "disk"} that run() would execute or load, without running anything
+    def plan(self, targets, params):
+        targets = [targets] if isinstance(targets, str) else list(targets)
+        keys, steps = {}, {}
+        for target in targets:
+            self._plan(target, params, keys, steps)
+        return steps
+
+    def summary(self):
+        return "\n".join(f"{name:<12} {how:<7} {seconds * 1e3:9.1f} ms" for name, how, seconds in self.log)
+
+    # Drop memoized outputs from memory and disk: of all stages, of one stage, or with params only
+    # the output of one stage for those parameters (other farms and settings keep theirs)
+    def clear(self, name=None, params=None):
+        if params is not None:
+            key = self.key(name, params)
+            self._memory.pop(key, None)
+            if self.cache_dir and os.path.exists(self._path(name, key)):
+                os.remove(self._path(name, key))
+            return
+        self._memory.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for file in os.listdir(self.cache_dir):
+                if name is None or file.startswith(f"{name}-"):
+                    os.remove(os.path.join(self.cache_dir, file))
+
+
+# ------------------------------------------------------------------ single-farm workflow
+DEFAULT_PARAMS = {
+    "project": "brijesh-ndvi",
+    "farm_id": "1",
+    "coords_meters": None,          # farm polygon in EPSG:3857
+    "start_date": "2023-12-01",
+    "end_date": "2024-12-01",
+    "cloud_pct": 90,
+    "cloud_threshold": 30,
+    "prescreen": True,
+    "stats_cache": "ndvi_stats_cache.sqlite",
+    "local_stack": None,
+    "local_dates_file": None,
+    "cube_root": "pixel_cubes",
+    "store_root": "ndvi_store",
+    "interp_start": "2024-06-01",
+    "interp_end": "2024-10-22",
+    "method": "univariate",
+    "sigma": 2.0,
+    "plot_output_dir": None,
+}
+
+# Scene ids of the date window's collection: the data version of Earth Engine statistics
+def _scene_ids(p, ic):
+    import gee
+    return gee.get_info(ic.aggregate_array("system:index"))
+
+# (path, size, mtime) of the local backend's input files: the data version of local statistics
+def _file_versions(p):
+    versions = []
+    for path in sorted(p["local_stack"].values()) + [p["local_dates_file"]]:
+        try:
+            st = os.stat(path)
+            versions.append((path, st.st_size, st.st_mtime_ns))
+        except OSError:
+            versions.append((path, None, None))
+    return versions
+
+# Stage graph of main.py: region -> collection -> mask -> stats -> weights -> store / gapfill /
+# smoothing -> plots. Earth Engine objects are lazy and only memoized in memory; statistics and
+# everything downstream are also persisted. The statistics key includes the collection's scene
+# ids (one round trip), so newly acquired scenes are picked up, through the incremental
+# statistics cache; offline=True reuses the last checked scene list, so a re-run with new
+# gap-fill or smoothing settings never initializes Earth Engine.
+def farm_pipeline(backend="ee", cache_dir=CACHE_DIR, offline=False):
+    pipe = Pipeline(cache_dir, offline)
+
+    @pipe.stage("region", params=("project", "coords_meters"), persist=False)
+    def region_stage(p):
+        import gee
+        gee.initialize_ee(project=p["project"])
+        coords_lonlat = gee.transform_coords(p["coords_meters"])
+        return coords_lonlat, gee.create_region(coords_lonlat)
+
+    @pipe.stage("collection", deps=("region",), params=("start_date", "end_date", "cloud_pct"), persist=False)
+    def collection_stage(p, region):
+        import gee
+        ic = gee.load_s2_collection(region[1], p["start_date"], p["end_date"], cloud_pct=p["cloud_pct"])
+        print(f"Number of images in collection before masking: {gee.get_info(ic.size())}")
+        return ic
+
+    @pipe.stage("mask", deps=("region", "collection"), params=("cloud_threshold", "prescreen"), persist=False)
+    def mask_stage(p, region, ic):
+        import gee
+        ndvi_collection = gee.mask_and_calculate_ndvi(ic, cloud_threshold=p["cloud_threshold"])
+        if p["prescreen"]:
+            screen = gee.screen_summary(ndvi_collection, region[1])
+            print(f"Pre-screening kept {screen['kept']} of {screen['scenes']} scenes "
+                  f"(valid fraction > {gee.SCREEN_MIN_FRACTION - gee.SCREEN_MARGIN:.2f} at {gee.SCREEN_SCALE} m)")
+            ndvi_collection = gee.prescreen_collection(ndvi_collection, region[1])
+        return ndvi_collection
+
+    if backend == "local":
+        @pipe.stage("stats", params=("local_stack", "local_dates_file", "coords_meters", "cloud_threshold"),
+                    version=_file_versions)
+        def stats_stage(p):
+            import local_backend
+            with open(p["local_dates_file"]) as f:
+                local_dates = [line.strip() for line in f if line.strip()]
+            return local_backend.extract_ndvi_stats_from_geotiffs(
+                local_dates, p["local_stack"], region_coords=p["coords_meters"], cloud_threshold=p["cloud_threshold"])
+
+    elif backend == "cube":
+        @pipe.stage("stats", deps=("region", "collection"), params=("cube_root", "farm_id", "cloud_threshold"),
+                    version=_scene_ids, version_deps=("collection",))
+        def stats_stage(p, region, ic):
+            import cube
+            grid = cube.grid_for_region(region[0], scale=10)
+            farm_cube = cube.download_cube(p["cube_root"], p["farm_id"], cube.ee_downloader(ic, region[1], grid),
+                                           grid=grid)
+            return farm_cube.stats(cloud_threshold=p["cloud_threshold"])
+
+    else:
+        # Acquisitions already in the on-disk statistics cache are not fetched again
+        @pipe.stage("stats", deps=("region", "mask"), params=("cloud_threshold", "cloud_pct", "stats_cache"),
+                    version=_scene_ids, version_deps=("collection",))
+        def stats_stage(p, region, ndvi_collection):
+            import stats_cache
+            cache = stats_cache.StatsCache(p["stats_cache"])
+            region_key = stats_cache.region_hash(region[0])
+            cache.invalidate_stale(region_key, cloud_threshold=p["cloud_threshold"], cloud_pct=p["cloud_pct"], scale=10)
+            try:
+                return stats_cache.extract_ndvi_stats_cached(
+                    cache, ndvi_collection, region[1], region_key,
+                    cloud_threshold=p["cloud_threshold"], cloud_pct=p["cloud_pct"], scale=10)
+            finally:
+                cache.close()
+
+    @pipe.stage("weights", deps=("stats",))
+    def weights_stage(p, series):
+        import weights
+        fractions = weights.calculate_valid_fractions(series[6], series[7])
+        return fractions, weights.assign_weights(fractions)
+
+    @pipe.stage("store", deps=("stats", "weights"), params=("store_root", "farm_id"))
+    def store_stage(p, series, fractions_weights):
+        import store
+        if p["store_root"]:
+            store.write_farm_stats(p["store_root"], p["farm_id"], series, *fractions_weights)
+        return p["store_root"]
+
+    @pipe.stage("gapfill", deps=("stats", "weights"), params=("interp_start", "interp_end", "method"))
+    def gapfill_stage(p, series, fractions_weights):
+        import interpolate
+        dates_f, means_f = series[0], series[1]
+        masked = interpolate.mask_dates_for_interpolation(
+            dates_f, means_f, p["interp_start"], p["interp_end"], outside_to_nan=False)
+        spline = interpolate.spline_interpolate_ndvi(dates_f, masked, method=p["method"], smooth=None)
+        whittaker = interpolate.spline_interpolate_ndvi(
+            dates_f, masked, method="whittaker", weights=fractions_weights[1])
+        return spline, whittaker
+
+    @pipe.stage("smoothing", deps=("stats",), params=("sigma",))
+    def smoothing_stage(p, series):
+        from scipy.ndimage import gaussian_filter1d
+        return tuple(gaussian_filter1d(values, sigma=p["sigma"]) for values in series[1:6])
+
+    @pipe.stage("plots", deps=("stats", "weights", "gapfill", "smoothing"), params=("plot_output_dir",),
+                persist=False, memo=False)
+    def plots_stage(p, series, fractions_weights, gapfill, smoothed):
+        import plot
+        dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, _ = series
+        means_gauss, medians_gauss, stds_gauss, p10_gauss, p90_gauss = smoothed
+        plot.configure(output_dir=p["plot_output_dir"], formats=("png",))
+        plot.plot_mean_ndvi(dates_f, means_f, means_gauss)
+        plot.plot_median_ndvi(dates_f, medians_f, medians_gauss)
+        plot.plot_ndvi_stddev(dates_f, stds_f, stds_gauss)
+        plot.plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss)
+        plot.plot_valid_pixel_count(dates_f, pixels_f)
+        plot.plot_valid_pixel_fraction(dates_f, fractions_weights[0])
+        plot.plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90_gauss, stds_gauss)
+        plot.plot_mean_ndvi_with_spline(dates_f, means_f, gapfill[0], means_gauss)
+        plot.plot_mean_ndvi_with_spline(dates_f, means_f, gapfill[1], means_gauss, filename="whittaker")
+        return p["plot_output_dir"]
+
+    return pipe
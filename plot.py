@@ -1,39 +1,100 @@
-import matplotlib.pyplot as plt
+import os
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+import phenology
+from ndvi_series import dates_of
+
+# Output settings. With no output directory every plot opens a window (plt.show()).
+# With an output directory plots are rendered headless (Agg) to files, reusing one figure
+# and axes for all plot types, and optionally appended to a multi-page PDF. The backend in use
+# before switching to Agg is restored by configure() without an output directory.
+_output = {"dir": None, "formats": ("png",), "pdf": None, "previous_backend": None}
+_canvas = {"fig": None, "ax": None}
+
+def configure(output_dir=None, formats=("png",), pdf=None):
+    _output["dir"] = output_dir
+    _output["formats"] = tuple(formats)
+    _output["pdf"] = pdf
+    if output_dir is not None:
+        if _output["previous_backend"] is None:
+            _output["previous_backend"] = plt.get_backend()
+        plt.switch_backend("agg")
+    elif _output["previous_backend"] is not None:
+        # Switching closes every figure, the shared canvas included
+        plt.switch_backend(_output["previous_backend"])
+        _output["previous_backend"] = None
+        _canvas["fig"], _canvas["ax"] = None, None
+
+def _new_axes(figsize):
+    if _output["dir"] is None:
+        plt.figure(figsize=figsize)
+        return plt.gca()
+    fig, ax = _canvas["fig"], _canvas["ax"]
+    if fig is None:
+        fig = plt.figure(figsize=figsize)
+        ax = fig.add_subplot()
+        _canvas["fig"], _canvas["ax"] = fig, ax
+    else:
+        fig.set_size_inches(figsize)
+        ax.cla()
+    plt.figure(fig.number)
+    plt.sca(ax)
+    return ax
 
-# NDVI stage definitions for single crop cycle (mutually exclusive)
+def _finish(name, filename=None):
+    if _output["dir"] is None:
+        plt.show()
+        return
+    fig = _canvas["fig"]
+    os.makedirs(_output["dir"], exist_ok=True)
+    for fmt in _output["formats"]:
+        fig.savefig(os.path.join(_output["dir"], f"{filename or name}.{fmt}"))
+    if _output["pdf"] is not None:
+        _output["pdf"].savefig(fig)
+
+def close():
+    if _canvas["fig"] is not None:
+        plt.close(_canvas["fig"])
+    _canvas["fig"] = _canvas["ax"] = None
+
+# NDVI stage definitions for single crop cycle (mutually exclusive), see phenology.classify_stages
 def get_stage_colors(ndvi):
-    ndvi = np.array(ndvi)
-    ndvi_diff = np.diff(ndvi, prepend=ndvi[0])
-    colors = []
-    for i, val in enumerate(ndvi):
-        if val < 0.1:
-            colors.append("#b3c6e0")    # empty field/water (light blue)
-        elif 0.1 <= val < 0.3:
-            colors.append("#cccccc")    # bare/low cover (gray)
-        elif 0.3 <= val < 0.75 and ndvi_diff[i] >= 0:
-            colors.append("#3ac96a")    # rapid growth (bright green)
-        elif 0.75 <= val <= 1.0:
-            colors.append("#005902")    # peak (dark green)
-        elif 0.3 < val < 0.75 and ndvi_diff[i] < 0:
-            colors.append("#f5c542")    # senescence/maturity (yellow)
-        else:
-            colors.append("#cccccc")    # fallback: bare/low
-    return colors
+    return [phenology.STAGE_COLORS[c] for c in phenology.classify_stages(ndvi)]
+
+# Plot functions take dates_f as strings, datetime64 or an NDVISeries (its datetime64 axis)
+
+# Stage-aware shading under a curve as one collection (one quad per date segment,
+# coloured by the stage of the segment's end date)
+def shade_stages(ax, dates_f, values, stages=None, alpha=0.38):
+    values = np.asarray(values, dtype=float)
+    if stages is None:
+        stages = phenology.classify_stages(values)
+    if len(values) < 2:
+        return None
+    x = np.asarray(ax.xaxis.convert_units(list(dates_f) if isinstance(dates_f, tuple) else dates_f), dtype=float)
+    x0, x1, y0, y1 = x[:-1], x[1:], values[:-1], values[1:]
+    zeros = np.zeros_like(x0)
+    verts = np.stack([np.stack([x0, zeros], -1), np.stack([x1, zeros], -1),
+                      np.stack([x1, y1], -1), np.stack([x0, y0], -1)], axis=1)
+    keep = ~np.isnan(verts).any(axis=(1, 2))
+    colors = phenology.stage_colors(np.asarray(stages)[1:][keep])
+    collection = PolyCollection(verts[keep], facecolors=colors, edgecolors=colors, alpha=alpha)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
 
 
 # Plotting functions for NDVI statistics
 # plotting mean NDVI with stage-aware shading
-def plot_mean_ndvi(dates_f, means_f, means_gauss):
-    plt.figure(figsize=(12,6))
-    ax = plt.gca()
+def plot_mean_ndvi(dates_f, means_f, means_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    ax = _new_axes((12,6))
     plt.plot(dates_f, means_f, label="Raw Mean NDVI", marker='o')
     plt.plot(dates_f, means_gauss, label="Smoothed Mean NDVI", color="orange", linewidth=2)
     # Stage-aware shading
-    stages = get_stage_colors(means_gauss)
-    for i in range(1, len(dates_f)):
-        ax.fill_between(dates_f[i-1:i+1], 0, means_gauss[i-1:i+1], color=stages[i], alpha=0.38)
+    stages = phenology.classify_stages(means_gauss)
+    shade_stages(ax, dates_f, means_gauss, stages)
     plt.legend()
     plt.grid(True)
     plt.title("Mean NDVI (Growth Stages Highlighted)")
@@ -41,17 +102,16 @@ def plot_mean_ndvi(dates_f, means_f, means_gauss):
     plt.xlabel("Date")
     plt.ylabel("Mean NDVI")
     plt.tight_layout()
-    plt.show()
+    _finish("mean", filename)
 
 # plotting median NDVI with stage-aware shading
-def plot_median_ndvi(dates_f, medians_f, medians_gauss):
-    plt.figure(figsize=(12,6))
-    ax = plt.gca()
+def plot_median_ndvi(dates_f, medians_f, medians_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    ax = _new_axes((12,6))
     plt.plot(dates_f, medians_f, label="Raw Median NDVI", marker='o', color="green")
     plt.plot(dates_f, medians_gauss, label="Smoothed Median NDVI", color="blue", linewidth=2)
-    stages = get_stage_colors(medians_gauss)
-    for i in range(1, len(dates_f)):
-        ax.fill_between(dates_f[i-1:i+1], 0, medians_gauss[i-1:i+1], color=stages[i], alpha=0.38)
+    stages = phenology.classify_stages(medians_gauss)
+    shade_stages(ax, dates_f, medians_gauss, stages)
     plt.title("Median NDVI Over Time (Growth Stages Highlighted)")
     plt.xlabel("Date")
     plt.ylabel("Median NDVI")
@@ -59,11 +119,12 @@ def plot_median_ndvi(dates_f, medians_f, medians_gauss):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    _finish("median", filename)
 
 # Plotting NDVI standard deviation
-def plot_ndvi_stddev(dates_f, stds_f, stds_gauss):
-    plt.figure(figsize=(12,6))
+def plot_ndvi_stddev(dates_f, stds_f, stds_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    _new_axes((12,6))
     plt.plot(dates_f, stds_f, label="Raw NDVI StdDev", marker='o', color="red")
     plt.plot(dates_f, stds_gauss, label="Smoothed NDVI StdDev", color="orange", linewidth=2)
     plt.title("NDVI Standard Deviation Over Time")
@@ -73,11 +134,12 @@ def plot_ndvi_stddev(dates_f, stds_f, stds_gauss):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    _finish("STDV", filename)
 
 # Plotting NDVI percentiles
-def plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss):
-    plt.figure(figsize=(12,6))
+def plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    _new_axes((12,6))
     plt.plot(dates_f, perc_10_f, label="Raw NDVI 10th Percentile", marker='o', color="purple")
     plt.plot(dates_f, p10_gauss, label="Smoothed 10th Percentile", color="magenta", linewidth=2)
     plt.plot(dates_f, perc_90_f, label="Raw NDVI 90th Percentile", marker='o', color="orange")
@@ -89,11 +151,12 @@ def plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    _finish("perc", filename)
 
 # Plotting valid pixel count
-def plot_valid_pixel_count(dates_f, pixels_f):
-    plt.figure(figsize=(12,6))
+def plot_valid_pixel_count(dates_f, pixels_f, filename=None):
+    dates_f = dates_of(dates_f)
+    _new_axes((12,6))
     plt.plot(dates_f, pixels_f, label="Valid Pixels", marker='o', color="blue")
     plt.title("Valid NDVI Pixel Count Over Time")
     plt.xlabel("Date")
@@ -102,11 +165,12 @@ def plot_valid_pixel_count(dates_f, pixels_f):
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    _finish("pix", filename)
 
 # Plotting valid pixel fraction
-def plot_valid_pixel_fraction(dates_f, fractions_f):
-    plt.figure(figsize=(10,6))
+def plot_valid_pixel_fraction(dates_f, fractions_f, filename=None):
+    dates_f = dates_of(dates_f)
+    _new_axes((10,6))
     plt.plot(dates_f, fractions_f, marker='o', linestyle='-', color='tab:blue')
     plt.xlabel('Date')
     plt.ylabel('Valid Pixel Fraction')
@@ -114,11 +178,12 @@ def plot_valid_pixel_fraction(dates_f, fractions_f):
     plt.xticks(rotation=45)
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish("fraction", filename)
 
 # Plotting all NDVI statistics together
-def plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90_gauss, stds_gauss):
-    plt.figure(figsize=(16,8))
+def plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90_gauss, stds_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    _new_axes((16,8))
     plt.plot(dates_f, means_gauss, label="Mean NDVI (Smoothed)", marker='o')
     plt.plot(dates_f, medians_gauss, label="Median NDVI (Smoothed)", marker='o')
     plt.plot(dates_f, p10_gauss, label="10th Percentile (Smoothed)", linestyle="--")
@@ -131,18 +196,17 @@ def plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish("all_stat", filename)
 
 # Plotting mean NDVI with spline interpolation
-def plot_mean_ndvi_with_spline(dates_f, means_f, means_spline, means_gauss):
-    plt.figure(figsize=(12,6))
-    ax = plt.gca()
+def plot_mean_ndvi_with_spline(dates_f, means_f, means_spline, means_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    ax = _new_axes((12,6))
     plt.plot(dates_f, means_f, label="Raw Mean NDVI", marker='o', color="blue")
     plt.plot(dates_f, means_gauss, label="Smoothed Mean NDVI", color="orange", linewidth=2)
     plt.plot(dates_f, means_spline, label="Spline Interpolated NDVI", color="magenta", linestyle="--", linewidth=2)
-    stages = get_stage_colors(means_gauss)
-    for i in range(1, len(dates_f)):
-        ax.fill_between(dates_f[i-1:i+1], 0, means_gauss[i-1:i+1], color=stages[i], alpha=0.38)
+    stages = phenology.classify_stages(means_gauss)
+    shade_stages(ax, dates_f, means_gauss, stages)
     plt.legend()
     plt.grid(True)
     plt.title("Mean NDVI (Raw, Smoothed, Spline Interpolated)")
@@ -150,18 +214,17 @@ def plot_mean_ndvi_with_spline(dates_f, means_f, means_spline, means_gauss):
     plt.xlabel("Date")
     plt.ylabel("Mean NDVI")
     plt.tight_layout()
-    plt.show()
+    _finish("spline", filename)
 
 #plotting mean ndvi with linear interpolation
-def plot_mean_ndvi_with_linear(dates_f, means_f, means_linear, means_gauss):
-    plt.figure(figsize=(12,6))
-    ax = plt.gca()
+def plot_mean_ndvi_with_linear(dates_f, means_f, means_linear, means_gauss, filename=None):
+    dates_f = dates_of(dates_f)
+    ax = _new_axes((12,6))
     plt.plot(dates_f, means_f, label="Raw Mean NDVI", marker='o', color="blue")
     plt.plot(dates_f, means_gauss, label="Smoothed Mean NDVI", color="orange", linewidth=2)
     plt.plot(dates_f, means_linear, label="Linear Interpolated NDVI", color="green", linestyle=":", linewidth=2)
-    stages = get_stage_colors(means_gauss)
-    for i in range(1, len(dates_f)):
-        ax.fill_between(dates_f[i-1:i+1], 0, means_gauss[i-1:i+1], color=stages[i], alpha=0.38)
+    stages = phenology.classify_stages(means_gauss)
+    shade_stages(ax, dates_f, means_gauss, stages)
     plt.legend()
     plt.grid(True)
     plt.title("Mean NDVI (Raw, Smoothed, Linear Interpolated)")
@@ -169,4 +232,4 @@ def plot_mean_ndvi_with_linear(dates_f, means_f, means_linear, means_gauss):
     plt.xlabel("Date")
     plt.ylabel("Mean NDVI")
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    _finish("linear", filename)
\ No newline at end of file
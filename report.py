@@ -0,0 +1,115 @@
+import os
+import glob
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Per-farm report stage: the figure set of the 'custom farm N' folders
+# (mean, median, STDV, perc, pix, all_stat) plus one multi-page PDF, rendered in a process pool.
+
+HASH_FILE = ".report_hash"
+SIGMA = 2
+
+# Content hash of a farm's inputs (the 8-tuple of stats.extract_ndvi_stats) and render settings
+def series_hash(series, formats=("png",), sigma=SIGMA):
+    h = hashlib.sha256()
+    h.update("|".join(str(d) for d in series[0]).encode())
+    for arr in series[1:]:
+        h.update(np.ascontiguousarray(arr, dtype=float).tobytes())
+    h.update(repr((tuple(formats), sigma)).encode())
+    return h.hexdigest()
+
+def is_up_to_date(out_dir, digest):
+    path = os.path.join(out_dir, HASH_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return f.read().strip() == digest
+
+# Render one farm's figures and PDF (runs inside a worker process)
+def render_farm(farm_id, series, out_dir, formats=("png",), sigma=SIGMA):
+    from scipy.ndimage import gaussian_filter1d
+    from matplotlib.backends.backend_pdf import PdfPages
+    import plot
+    import weights
+
+    dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = series
+    dates_f = tuple(dates_f)
+    fractions_f = weights.calculate_valid_fractions(pixels_f, total_pixels_f)
+    means_gauss = gaussian_filter1d(means_f, sigma=sigma)
+    medians_gauss = gaussian_filter1d(medians_f, sigma=sigma)
+    stds_gauss = gaussian_filter1d(stds_f, sigma=sigma)
+    p10_gauss = gaussian_filter1d(perc_10_f, sigma=sigma)
+    p90_gauss = gaussian_filter1d(perc_90_f, sigma=sigma)
+
+    os.makedirs(out_dir, exist_ok=True)
+    pdf_path = os.path.join(out_dir, f"custom farm {farm_id}.pdf")
+    with PdfPages(pdf_path) as pdf:
+        plot.configure(output_dir=out_dir, formats=formats, pdf=pdf)
+        try:
+            plot.plot_mean_ndvi(dates_f, means_f, means_gauss)
+            plot.plot_median_ndvi(dates_f, medians_f, medians_gauss)
+            plot.plot_ndvi_stddev(dates_f, stds_f, stds_gauss)
+            plot.plot_ndvi_percentiles(dates_f, perc_10_f, p10_gauss, perc_90_f, p90_gauss)
+            plot.plot_valid_pixel_count(dates_f, pixels_f)
+            plot.plot_valid_pixel_fraction(dates_f, fractions_f)
+            plot.plot_all_ndvi_statistics(dates_f, means_gauss, medians_gauss, p10_gauss, p90_gauss, stds_gauss)
+        finally:
+            plot.close()
+            plot.configure()
+    return pdf_path
+
+def _render_and_stamp(farm_id, series, out_dir, formats, sigma, digest):
+    pdf_path = render_farm(farm_id, series, out_dir, formats, sigma)
+    with open(os.path.join(out_dir, HASH_FILE), "w") as f:
+        f.write(digest)
+    return pdf_path
+
+# Render reports for many farms ({farm_id: 8-tuple}); farms whose inputs are unchanged since
+# the last render are skipped. Returns ({farm_id: pdf path}, [skipped farm ids]).
+def generate_reports(farm_series, output_root=".", max_workers=None, formats=("png",), sigma=SIGMA, force=False):
+    rendered, skipped, jobs = {}, [], {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for farm_id, series in farm_series.items():
+            out_dir = os.path.join(output_root, f"custom farm {farm_id}")
+            digest = series_hash(series, formats, sigma)
+            if not force and is_up_to_date(out_dir, digest):
+                skipped.append(farm_id)
+                continue
+            jobs[farm_id] = pool.submit(_render_and_stamp, farm_id, series, out_dir, formats, sigma, digest)
+        for farm_id, job in jobs.items():
+            rendered[farm_id] = job.result()
+    return rendered, skipped
+
+# 8-tuple from the stats.csv written by batch.py
+def load_farm_series(out_dir):
+    import pandas as pd
+    table = pd.read_csv(os.path.join(out_dir, "stats.csv"))
+    return (
+        tuple(table["date"].astype(str)),
+        table["mean"].to_numpy(float),
+        table["median"].to_numpy(float),
+        table["std"].to_numpy(float),
+        table["p10"].to_numpy(float),
+        table["p90"].to_numpy(float),
+        table["valid_pixels"].to_numpy(int),
+        table["total_pixels"].to_numpy(int),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render per-farm NDVI reports from batch.py output")
+    parser.add_argument("--output-root", default=".")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--formats", nargs="+", default=["png"])
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    farm_series = {}
+    for path in sorted(glob.glob(os.path.join(args.output_root, "custom farm *", "stats.csv"))):
+        farm_dir = os.path.dirname(path)
+        farm_series[os.path.basename(farm_dir)[len("custom farm "):]] = load_farm_series(farm_dir)
+    rendered, skipped = generate_reports(farm_series, args.output_root, args.workers, tuple(args.formats), force=args.force)
+    print(f"Rendered {len(rendered)} farm reports, {len(skipped)} unchanged")
@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import collections
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import interpolate
+import phenology
+import store
+
+# Local read-only HTTP/JSON query service over the columnar statistics store (store.py):
+#   python service.py --store-root ndvi_store --port 8765
+#   GET /farms                                   farm ids in the store
+#   GET /farms/<id>/series?start=&end=&fill=     per-date statistics, weights and growth stages;
+#                                                fill=pchip|cubic|univariate|whittaker adds a gap-filled mean
+#   GET /farms/<id>/latest                       latest valid acquisition of one farm
+#   GET /latest?farms=1,2,3                      latest valid acquisition of several (default: all) farms
+# A farm's partition is read once into NumPy arrays and read again only when its file changes.
+# Gap-fills and growth stages are computed over the farm's whole series (once per file version)
+# and then sliced, so the start/end of a query never changes the answer for a date.
+# Responses are kept in an LRU cache keyed on the request and the versions of the farm files
+# it reads, so repeated queries touch neither Parquet nor the interpolation. Misses are computed
+# in a worker thread, keeping the event loop free for cache hits.
+
+CACHE_SIZE = 4096
+COLUMNS = ("mean", "median", "std", "p10", "p90", "valid_pixels", "total_pixels", "fraction", "weight")
+INT_COLUMNS = ("valid_pixels", "total_pixels", "weight")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def _floats(values):
+    return [round(float(v), 5) if np.isfinite(v) else None for v in values]
+
+# Growth stage name per date, classified over the valid dates only (None where NDVI is missing)
+def _stages(values):
+    valid = np.isfinite(values)
+    names = [None] * len(values)
+    for i, code in zip(np.flatnonzero(valid), phenology.classify_stages(values[valid])):
+        names[i] = phenology.STAGE_NAMES[code]
+    return names
+
+def _window(dates, start=None, end=None):
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+    hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+    return slice(lo, hi)
+
+
+class NDVIService:
+    def __init__(self, store_root, cache_size=CACHE_SIZE):
+        self.store_root = store_root
+        self.cache_size = cache_size
+        self._farms = {}                                # farm_id -> (version, {column: array})
+        self._responses = collections.OrderedDict()     # (target, versions) -> JSON body
+        self.hits = 0
+        self.misses = 0
+
+    # {column: array} of one farm, re-read when its partition changed
+    def farm(self, farm_id):
+        version = store.farm_version(self.store_root, farm_id)
+        if version is None:
+            raise KeyError(f"unknown farm {farm_id}")
+        cached = self._farms.get(farm_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        table = store.read_farm_table(self.store_root, farm_id)
+        arrays = {"dates": table.column("date").to_numpy().astype("datetime64[D]")}
+        for name in COLUMNS:
+            arrays[name] = table.column(name).to_numpy(zero_copy_only=False).astype(float)
+        self._farms[farm_id] = (version, arrays)
+        return arrays
+
+    # (mean, stage names) over a farm's whole series, gap-filled with method fill if given;
+    # kept with the farm's arrays, so they are recomputed only when its file changes
+    def _full_series(self, arrays, fill=None):
+        key = ("derived", fill)
+        if key not in arrays:
+            mean = arrays["mean"]
+            if fill and len(mean):
+                weights = arrays["weight"] if fill == "whittaker" else None
+                mean = interpolate.spline_interpolate_ndvi(arrays["dates"], mean, method=fill, weights=weights)
+            arrays[key] = (mean, _stages(mean))
+        return arrays[key]
+
+    def series(self, farm_id, start=None, end=None, fill=None):
+        arrays = self.farm(farm_id)
+        window = _window(arrays["dates"], start, end)
+        dates = arrays["dates"][window]
+        out = {"farm_id": farm_id, "dates": [str(d) for d in dates]}
+        for name in COLUMNS:
+            values = arrays[name][window]
+            out[name] = [int(v) for v in values] if name in INT_COLUMNS else _floats(values)
+        mean, stages = self._full_series(arrays, fill)
+        if fill:
+            out["fill"] = fill
+            out["filled"] = _floats(mean[window])
+        out["stage"] = stages[window]
+        return out
+
+    def latest(self, farm_id):
+        arrays = self.farm(farm_id)
+        valid = np.flatnonzero(np.isfinite(arrays["mean"]))
+        if not len(valid):
+            return {"farm_id": farm_id, "date": None}
+        i = valid[-1]
+        return {
+            "farm_id": farm_id,
+            "date": str(arrays["dates"][i]),
+            "mean": round(float(arrays["mean"][i]), 5),
+            "median": round(float(arrays["median"][i]), 5),
+            "fraction": round(float(arrays["fraction"][i]), 5),
+            "weight": int(arrays["weight"][i]),
+            "stage": self._full_series(arrays)[1][i],
+        }
+
+    # (farm ids read, function computing the response) of a request target; ValueError if malformed
+    def _route(self, path, query):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["farms"]:
+            return (), lambda: {"farms": store.farm_ids(self.store_root)}
+        if parts == ["latest"]:
+            farm_ids = query["farms"][0].split(",") if "farms" in query else store.farm_ids(self.store_root)
+            return tuple(farm_ids), lambda: {"farms": [self.latest(f) for f in farm_ids]}
+        if len(parts) == 3 and parts[0] == "farms" and parts[2] == "latest":
+            return (parts[1],), lambda: self.latest(parts[1])
+        if len(parts) == 3 and parts[0] == "farms" and parts[2] == "series":
+            start, end, fill = (query.get(k, [None])[0] for k in ("start", "end", "fill"))
+            for date in (start, end):
+                if date is not None:
+                    np.datetime64(date, "D")
+            if fill is not None and fill not in interpolate.METHODS:
+                raise ValueError(f"fill must be one of {', '.join(interpolate.METHODS)}")
+            return (parts[1],), lambda: self.series(parts[1], start, end, fill)
+        raise KeyError(f"no route for {path}")
+
+    # (status, JSON body) of one GET request, from the LRU cache when the farm files did not change
+    async def respond(self, target):
+        url = urlsplit(target)
+        try:
+            farm_ids, compute = self._route(url.path, parse_qs(url.query))
+        except KeyError as exc:
+            return 404, {"error": str(exc.args[0])}
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        versions = tuple(store.farm_version(self.store_root, f) for f in farm_ids)
+        if None in versions:
+            return 404, {"error": f"unknown farm {farm_ids[versions.index(None)]}"}
+        # farm listings are a directory scan, cheaper than keeping them consistent in the cache
+        key = (target, versions) if farm_ids else None
+        body = self._responses.get(key)
+        if body is not None:
+            self._responses.move_to_end(key)
+            self.hits += 1
+            return 200, body
+        self.misses += 1
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: json.dumps(compute()).encode())
+        except KeyError as exc:
+            return 404, {"error": str(exc.args[0])}
+        if key is None:
+            return 200, body
+        self._responses[key] = body
+        if len(self._responses) > self.cache_size:
+            self._responses.popitem(last=False)
+        return 200, body
+
+    # HTTP/1.1 with keep-alive; GET only
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, body, keep_alive = 400, {"error": "malformed request line"}, False
+                else:
+                    method, target, version = parts
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    if method != "GET":
+                        status, body = 405, {"error": "only GET is supported"}
+                    else:
+                        status, body = await self.respond(target)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode() + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(store_root, host="127.0.0.1", port=8765, cache_size=CACHE_SIZE):
+    server = await NDVIService(store_root, cache_size).start(host, port)
+    print(f"Serving {store_root} on http://{host}:{server.sockets[0].getsockname()[1]}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON query service over the NDVI statistics store")
+    parser.add_argument("--store-root", default="ndvi_store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="responses kept in the LRU cache")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.store_root, args.host, args.port, args.cache_size))
+    except KeyboardInterrupt:
+        pass
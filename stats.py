@@ -1,8 +1,47 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import ee
+import gee
+import instrument
+from ndvi_series import NDVISeries
 from tqdm import tqdm
 from datetime import datetime, timezone
 
+# Combined reducer shared by the per-image and batched extraction paths
+def ndvi_reducer():
+    return (
+        ee.Reducer.median()
+        .combine(ee.Reducer.mean(), '', True)
+        .combine(ee.Reducer.stdDev(), '', True)
+        .combine(ee.Reducer.percentile([10, 90]), '', True)
+        .combine(ee.Reducer.count(), '', True)
+    )
+
+def format_date(tstamp):
+    return datetime.fromtimestamp(tstamp/1000, tz=timezone.utc).strftime('%Y-%m-%d') if tstamp else "Unknown"
+
+# A record is usable only if every statistic came back (fully masked scenes return None)
+def is_complete(record):
+    return all(v is not None for v in record[1:])
+
+# Drop incomplete records and convert the columns to arrays (the 8-tuple returned by the extractors)
+def records_to_arrays(records):
+    ndvi_data = [record for record in records if is_complete(record)]
+
+    if ndvi_data:
+        dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = zip(*ndvi_data)
+        means_f        = np.array(means_f, dtype=float)
+        medians_f      = np.array(medians_f, dtype=float)
+        stds_f         = np.array(stds_f, dtype=float)            
+        perc_10_f      = np.array(perc_10_f, dtype=float)
+        perc_90_f      = np.array(perc_90_f, dtype=float)
+        pixels_f       = np.array(pixels_f, dtype=int)
+        total_pixels_f = np.array(total_pixels_f, dtype=int)
+        return (dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f)
+    else:
+        return [], np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([])
+
 def extract_ndvi_stats(image_list, region, count):
     # Prepare lists to hold statistics
     dates = []
@@ -20,21 +59,17 @@ def extract_ndvi_stats(image_list, region, count):
 
         # Calculate NDVI statistics for valid (unmasked) pixels
         stats = img.select('NDVI').clip(region).reduceRegion(
-            reducer=ee.Reducer.median()
-                .combine(ee.Reducer.mean(), '', True)
-                .combine(ee.Reducer.stdDev(), '', True)
-                .combine(ee.Reducer.percentile([10, 90]), '', True)
-                .combine(ee.Reducer.count(), '', True),
+            reducer=ndvi_reducer(),
             geometry=region,
             scale=10,
             maxPixels=int(1e9)
         )
-        mean   = stats.get('NDVI_mean').getInfo()
-        median = stats.get('NDVI_median').getInfo()
-        std    = stats.get('NDVI_stdDev').getInfo()
-        p10    = stats.get('NDVI_p10').getInfo()
-        p90    = stats.get('NDVI_p90').getInfo()
-        count_valid = stats.get('NDVI_count').getInfo()
+        mean   = gee.get_info(stats.get('NDVI_mean'))
+        median = gee.get_info(stats.get('NDVI_median'))
+        std    = gee.get_info(stats.get('NDVI_stdDev'))
+        p10    = gee.get_info(stats.get('NDVI_p10'))
+        p90    = gee.get_info(stats.get('NDVI_p90'))
+        count_valid = gee.get_info(stats.get('NDVI_count'))
 
         # Calculate total number of pixels in region (no masking)
         total_stats = ee.Image.constant(1).clip(region).reduceRegion(
@@ -43,11 +78,11 @@ def extract_ndvi_stats(image_list, region, count):
             scale=10,
             maxPixels=int(1e9)
         )
-        count_total = total_stats.get('constant').getInfo()
+        count_total = gee.get_info(total_stats.get('constant'))
 
         # Extract timestamp for date
-        tstamp = img.get('system:time_start').getInfo()
-        date_str = datetime.fromtimestamp(tstamp/1000, tz=timezone.utc).strftime('%Y-%m-%d') if tstamp else "Unknown"
+        tstamp = gee.get_info(img.get('system:time_start'))
+        date_str = format_date(tstamp)
 
         dates.append(date_str)
         means.append(mean)
@@ -59,21 +94,83 @@ def extract_ndvi_stats(image_list, region, count):
         total_pixels.append(count_total)
 
     # Clean and align arrays
-    ndvi_data = [
-        (d, mn, md, sd, p1, p9, vp, tp)
-        for d, mn, md, sd, p1, p9, vp, tp in zip(dates, means, medians, stds, perc_10, perc_90, valid_pixels, total_pixels)
-        if (mn is not None and md is not None and sd is not None and p1 is not None and p9 is not None and vp is not None and tp is not None)
-    ]
+    return records_to_arrays(zip(dates, means, medians, stds, perc_10, perc_90, valid_pixels, total_pixels))
 
-    if ndvi_data:
-        dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = zip(*ndvi_data)
-        means_f        = np.array(means_f, dtype=float)
-        medians_f      = np.array(medians_f, dtype=float)
-        stds_f         = np.array(stds_f, dtype=float)            
-        perc_10_f      = np.array(perc_10_f, dtype=float)
-        perc_90_f      = np.array(perc_90_f, dtype=float)
-        pixels_f       = np.array(pixels_f, dtype=int)
-        total_pixels_f = np.array(total_pixels_f, dtype=int)
-        return (dates_f, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f)
-    else:
-        return [], np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([]), np.array([])
+# Server-side statistics for every image of the collection as a single FeatureCollection.
+# The total (unmasked) pixel count of the region is computed once and attached to every feature.
+def ndvi_stats_collection(ndvi_collection, region, scale=10):
+    total_pixels = ee.Image.constant(1).clip(region).reduceRegion(
+        reducer=ee.Reducer.count(),
+        geometry=region,
+        scale=scale,
+        maxPixels=int(1e9)
+    ).get('constant')
+
+    def reduce_image(img):
+        stats = img.select('NDVI').clip(region).reduceRegion(
+            reducer=ndvi_reducer(),
+            geometry=region,
+            scale=scale,
+            maxPixels=int(1e9)
+        )
+        return ee.Feature(None, stats).set({
+            'total_pixels': total_pixels,
+            'system:time_start': img.get('system:time_start'),
+            'system:index': img.get('system:index'),
+        })
+
+    return ee.FeatureCollection(ndvi_collection.map(reduce_image))
+
+# Turn the properties of one feature from ndvi_stats_collection into a record
+def feature_to_record(props):
+    return (
+        format_date(props.get('system:time_start')),
+        props.get('NDVI_mean'),
+        props.get('NDVI_median'),
+        props.get('NDVI_stdDev'),
+        props.get('NDVI_p10'),
+        props.get('NDVI_p90'),
+        props.get('NDVI_count'),
+        props.get('total_pixels'),
+    )
+
+# Same result as extract_ndvi_stats, fetched in a single getInfo() round trip
+def extract_ndvi_stats_batched(ndvi_collection, region, scale=10):
+    features = gee.get_info(ndvi_stats_collection(ndvi_collection, region, scale))['features']
+    return records_to_arrays(feature_to_record(f['properties']) for f in features)
+
+# Batched extraction straight into an NDVISeries, filled in place as features are parsed
+def extract_ndvi_series(ndvi_collection, region, scale=10, farm_id=None):
+    features = gee.get_info(ndvi_stats_collection(ndvi_collection, region, scale))['features']
+    series = NDVISeries(capacity=len(features), farm_id=farm_id)
+    for f in features:
+        record = feature_to_record(f['properties'])
+        if is_complete(record):
+            series.append(*record)
+    return series
+
+# Streaming extraction: yields (system:index, record) per acquisition as chunks arrive.
+# Chunks of chunk_size features are fetched ahead on a small thread pool (prefetch chunks in
+# flight), so only a bounded number of records is ever held in memory.
+def iter_ndvi_stats(ndvi_collection, region, scale=10, chunk_size=25, prefetch=2, complete_only=True):
+    fc = ndvi_stats_collection(ndvi_collection, region, scale)
+    total = gee.get_info(ndvi_collection.size())
+
+    def fetch(offset):
+        return gee.get_info(fc.toList(chunk_size, offset))
+    fetch_bound = instrument.bind(fetch)
+
+    offsets = iter(range(0, total, chunk_size))
+    with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as pool:
+        pending = deque(pool.submit(fetch_bound, o) for _, o in zip(range(max(prefetch, 1)), offsets))
+        while pending:
+            features = pending.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(pool.submit(fetch_bound, offset))
+            for f in features:
+                props = f['properties']
+                record = feature_to_record(props)
+                if complete_only and not is_complete(record):
+                    continue
+                yield props.get('system:index', f.get('id')), record
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import ee
+import gee
+import stats
+
+# Persistent per-acquisition cache of stats.extract_ndvi_stats output.
+# Rows are keyed by image system:index, region geometry hash, cloud_threshold, cloud_pct and scale;
+# past Sentinel-2 acquisitions never change, so only new scenes need to be fetched.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ndvi_stats (
+    image_index     TEXT NOT NULL,
+    region_hash     TEXT NOT NULL,
+    cloud_threshold REAL NOT NULL,
+    cloud_pct       REAL NOT NULL,
+    scale           REAL NOT NULL,
+    date            TEXT,
+    mean            REAL,
+    median          REAL,
+    std             REAL,
+    p10             REAL,
+    p90             REAL,
+    valid_pixels    INTEGER,
+    total_pixels    INTEGER,
+    last_access     REAL NOT NULL,
+    PRIMARY KEY (image_index, region_hash, cloud_threshold, cloud_pct, scale)
+);
+CREATE INDEX IF NOT EXISTS ndvi_stats_access ON ndvi_stats (last_access);
+"""
+
+RECORD_COLUMNS = "date, mean, median, std, p10, p90, valid_pixels, total_pixels"
+
+# Stable hash of a region polygon (lon/lat vertices rounded to ~1 cm)
+def region_hash(coords_lonlat):
+    rounded = [[round(float(x), 7), round(float(y), 7)] for x, y in coords_lonlat]
+    return hashlib.sha1(json.dumps(rounded).encode()).hexdigest()
+
+
+class StatsCache:
+    def __init__(self, path="ndvi_stats_cache.sqlite", max_entries=500000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ndvi_stats").fetchone()[0]
+
+    # Cached records {image_index: record} for the given images and parameters
+    def get(self, image_ids, region_key, cloud_threshold, cloud_pct, scale=10):
+        found = {}
+        now = time.time()
+        ids = list(image_ids)
+        with self._lock, self._conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                params = [region_key, cloud_threshold, cloud_pct, scale, *chunk]
+                rows = self._conn.execute(
+                    f"SELECT image_index, {RECORD_COLUMNS} FROM ndvi_stats "
+                    f"WHERE region_hash = ? AND cloud_threshold = ? AND cloud_pct = ? AND scale = ? "
+                    f"AND image_index IN ({marks})", params).fetchall()
+                for row in rows:
+                    found[row[0]] = tuple(row[1:])
+                self._conn.execute(
+                    f"UPDATE ndvi_stats SET last_access = ? WHERE region_hash = ? AND cloud_threshold = ? "
+                    f"AND cloud_pct = ? AND scale = ? AND image_index IN ({marks})", [now, *params])
+        return found
+
+    # Store records {image_index: record}; scenes with no valid pixels are cached too
+    def put(self, records, region_key, cloud_threshold, cloud_pct, scale=10):
+        now = time.time()
+        rows = [(image_id, region_key, cloud_threshold, cloud_pct, scale, *record, now)
+                for image_id, record in records.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO ndvi_stats (image_index, region_hash, cloud_threshold, cloud_pct, scale, "
+                f"{RECORD_COLUMNS}, last_access) VALUES ({','.join('?' * 14)})", rows)
+        self.evict()
+
+    # Size-based eviction: drop least recently used rows beyond max_entries
+    def evict(self):
+        with self._lock, self._conn:
+            excess = self._conn.execute("SELECT COUNT(*) FROM ndvi_stats").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM ndvi_stats WHERE rowid IN "
+                    "(SELECT rowid FROM ndvi_stats ORDER BY last_access LIMIT ?)", (excess,))
+            return max(excess, 0)
+
+    # Explicit invalidation when masking parameters change: drop this region's rows computed with other parameters
+    def invalidate_stale(self, region_key, cloud_threshold, cloud_pct, scale=10):
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM ndvi_stats WHERE region_hash = ? AND NOT "
+                "(cloud_threshold = ? AND cloud_pct = ? AND scale = ?)",
+                (region_key, cloud_threshold, cloud_pct, scale))
+            return cur.rowcount
+
+    def clear(self, region_key=None):
+        with self._lock, self._conn:
+            if region_key is None:
+                self._conn.execute("DELETE FROM ndvi_stats")
+            else:
+                self._conn.execute("DELETE FROM ndvi_stats WHERE region_hash = ?", (region_key,))
+
+
+# Incremental stats.extract_ndvi_stats_batched: one round trip for the image ids,
+# plus one batched round trip for the scenes that are not cached yet
+def extract_ndvi_stats_cached(cache, ndvi_collection, region, region_key, cloud_threshold, cloud_pct, scale=10):
+    image_ids = gee.get_info(ndvi_collection.aggregate_array('system:index'))
+    records = cache.get(image_ids, region_key, cloud_threshold, cloud_pct, scale)
+
+    missing = [i for i in image_ids if i not in records]
+    if missing:
+        new_collection = ndvi_collection.filter(ee.Filter.inList('system:index', missing))
+        features = gee.get_info(stats.ndvi_stats_collection(new_collection, region, scale))['features']
+        fetched = {f['properties'].get('system:index', f.get('id')): stats.feature_to_record(f['properties'])
+                   for f in features}
+        cache.put(fetched, region_key, cloud_threshold, cloud_pct, scale)
+        records.update(fetched)
+
+    return stats.records_to_arrays(records[i] for i in image_ids if i in records)
+
+# Pass-through for a stats.iter_ndvi_stats(..., complete_only=False) stream that stores
+# every chunk_size records in the cache as they go by
+def cache_stream(cache, stream, region_key, cloud_threshold, cloud_pct, scale=10, chunk_size=100):
+    pending = {}
+    for image_id, record in stream:
+        pending[image_id] = record
+        if len(pending) >= chunk_size:
+            cache.put(pending, region_key, cloud_threshold, cloud_pct, scale)
+            pending = {}
+        yield image_id, record
+    if pending:
+        cache.put(pending, region_key, cloud_threshold, cloud_pct, scale)
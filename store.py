@@ -0,0 +1,164 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Columnar store of per-farm, per-date NDVI statistics.
+# A Parquet dataset partitioned by farm (root/farm_id=<id>/stats.parquet), rows sorted by date,
+# so reading one farm or one date window only touches the matching files and row groups.
+
+SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("mean", pa.float32()),
+    ("median", pa.float32()),
+    ("std", pa.float32()),
+    ("p10", pa.float32()),
+    ("p90", pa.float32()),
+    ("valid_pixels", pa.int32()),
+    ("total_pixels", pa.int32()),
+    ("fraction", pa.float32()),
+    ("weight", pa.int8()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("farm_id", pa.string())]), flavor="hive")
+ROW_GROUP_SIZE = 128
+
+def _farm_dir(root, farm_id):
+    return os.path.join(root, f"farm_id={farm_id}")
+
+# Rows are keyed by date, so acquisitions without a timestamp ("Unknown" dates) are not stored
+def _to_table(series, fractions=None, weights=None):
+    from ndvi_series import dates_of, to_days
+    if fractions is not None:
+        fractions = np.asarray(fractions)
+    if weights is not None:
+        weights = np.asarray(weights)
+    dates = to_days(dates_of(series[0]))
+    known = ~np.isnat(dates)
+    if not known.all():
+        series = [dates] + [np.asarray(c)[known] for c in series[1:]]
+        dates = dates[known]
+        fractions = None if fractions is None else fractions[known]
+        weights = None if weights is None else weights[known]
+    _, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f = series
+    n = len(dates)
+    if fractions is None:
+        fractions = np.asarray(pixels_f, dtype=float) / np.asarray(total_pixels_f, dtype=float) if n else []
+    if weights is None:
+        import weights as weights_module
+        weights = weights_module.assign_weights(fractions)
+    columns = [dates, means_f, medians_f, stds_f, perc_10_f, perc_90_f, pixels_f, total_pixels_f, fractions, weights]
+    return pa.table([pa.array(np.asarray(c).astype(f.type.to_pandas_dtype()) if n else [], type=f.type)
+                     for c, f in zip(columns, SCHEMA)], schema=SCHEMA)
+
+# Write (or extend) one farm's statistics; rows for dates already stored are replaced
+def write_farm_stats(root, farm_id, series, fractions=None, weights=None):
+    table = _to_table(series, fractions, weights)
+    farm_dir = _farm_dir(root, farm_id)
+    path = os.path.join(farm_dir, "stats.parquet")
+    if os.path.exists(path):
+        old = pq.read_table(path, schema=SCHEMA)
+        new_dates = table.column("date")
+        keep = pc.invert(pc.is_in(old.column("date"), value_set=new_dates))
+        table = pa.concat_tables([old.filter(keep), table])
+    table = table.sort_by("date")
+    os.makedirs(farm_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp, path)
+    return path
+
+# Write a stats.iter_ndvi_stats stream to one farm's partition, one row group per chunk,
+# so memory stays bounded by chunk_size. Incomplete records are skipped; previously stored
+# dates that the stream did not cover are kept.
+def write_farm_stream(root, farm_id, stream, chunk_size=ROW_GROUP_SIZE):
+    import stats
+    farm_dir = _farm_dir(root, farm_id)
+    path = os.path.join(farm_dir, "stats.parquet")
+    tmp = path + ".tmp"
+    os.makedirs(farm_dir, exist_ok=True)
+
+    rows = 0
+    with pq.ParquetWriter(tmp, SCHEMA, compression="zstd") as writer:
+        chunk = []
+        for _, record in stream:
+            if stats.is_complete(record):
+                chunk.append(record)
+            if len(chunk) == chunk_size:
+                writer.write_table(_to_table(tuple(zip(*chunk))))
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_table(_to_table(tuple(zip(*chunk))))
+            rows += len(chunk)
+
+    if os.path.exists(path):
+        new = pq.read_table(tmp, schema=SCHEMA)
+        old = pq.read_table(path, schema=SCHEMA)
+        keep = pc.invert(pc.is_in(old.column("date"), value_set=new.column("date")))
+        merged = pa.concat_tables([old.filter(keep), new]).sort_by("date")
+        pq.write_table(merged, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp, path)
+    return rows
+
+def dataset(root):
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING,
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+def _filter(farm_ids=None, start=None, end=None):
+    expr = None
+    if farm_ids is not None:
+        ids = [str(farm_ids)] if np.isscalar(farm_ids) else [str(f) for f in farm_ids]
+        expr = ds.field("farm_id").isin(ids)
+    if start is not None:
+        cond = ds.field("date") >= pa.scalar(np.datetime64(start, "D").astype(object), type=pa.date32())
+        expr = cond if expr is None else expr & cond
+    if end is not None:
+        cond = ds.field("date") <= pa.scalar(np.datetime64(end, "D").astype(object), type=pa.date32())
+        expr = cond if expr is None else expr & cond
+    return expr
+
+# Arrow table for the selected farms and date window, read with predicate pushdown
+def read_table(root, farm_ids=None, start=None, end=None, columns=None):
+    if not os.path.isdir(root):
+        return pa.table({}, schema=SCHEMA.append(pa.field("farm_id", pa.string())))
+    cols = None if columns is None else ["farm_id", "date", *[c for c in columns if c not in ("farm_id", "date")]]
+    return dataset(root).to_table(columns=cols, filter=_filter(farm_ids, start, end))
+
+# Same selection as a DataFrame with datetime64 dates, sorted by farm and date
+def read_stats(root, farm_ids=None, start=None, end=None, columns=None):
+    frame = read_table(root, farm_ids, start, end, columns).to_pandas(date_as_object=False)
+    return frame.sort_values(["farm_id", "date"], ignore_index=True)
+
+# One farm back as the 8-tuple of stats.extract_ndvi_stats
+def read_farm_series(root, farm_id, start=None, end=None):
+    frame = read_stats(root, farm_id, start, end)
+    return (
+        tuple(str(d) for d in frame["date"].to_numpy().astype("datetime64[D]")),
+        frame["mean"].to_numpy(float),
+        frame["median"].to_numpy(float),
+        frame["std"].to_numpy(float),
+        frame["p10"].to_numpy(float),
+        frame["p90"].to_numpy(float),
+        frame["valid_pixels"].to_numpy(int),
+        frame["total_pixels"].to_numpy(int),
+    )
+
+# One farm's partition as an Arrow table, read directly without dataset discovery
+def read_farm_table(root, farm_id):
+    return pq.read_table(os.path.join(_farm_dir(root, farm_id), "stats.parquet"), schema=SCHEMA)
+
+# (mtime_ns, size) of one farm's partition, None if the farm is not stored; changes on every write
+def farm_version(root, farm_id):
+    try:
+        st = os.stat(os.path.join(_farm_dir(root, farm_id), "stats.parquet"))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def farm_ids(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(root) if name.startswith("farm_id="))
@@ -1,4 +1,11 @@
 # test.py
+# Manual smoke test. Runs against live Earth Engine, or offline against fake_ee with --fake.
+import sys
+
+if "--fake" in sys.argv:
+    import fake_ee
+    fake_ee.install()
+
 import ee
 import gee
 from cloud_mask import mask_clouds_s2
@@ -59,11 +66,11 @@ def test_ndvi_valid_fraction(ic, region, cloud_threshold=30, max_images=5):
     use_count = min(count, max_images)
     image_list = ndvi_collection.toList(use_count)
 
-    dates_f, means_f, medians_f, stds_f, p10_f, p90_f, pixels_f = stats.extract_ndvi_stats(image_list, region, use_count, show_progress=False)
+    dates_f, means_f, medians_f, stds_f, p10_f, p90_f, pixels_f, total_pixels_f = stats.extract_ndvi_stats(image_list, region, use_count)
 
     for i in range(len(dates_f)):
-        vp = pixels_f[i]
-        print(f"{i:02d} Date {dates_f[i]}: valid={vp}")
+        vp, tp = pixels_f[i], total_pixels_f[i]
+        print(f"{i:02d} Date {dates_f[i]}: valid={vp} total={tp} fraction={vp / tp:.4f}")
 
 
 # 4. Master runner
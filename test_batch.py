@@ -0,0 +1,129 @@
+# test_batch.py
+import threading
+import time
+import pandas as pd
+import fake_ee
+import gee
+import batch
+from test_stats import COORDS, T0, DAY_MS
+
+
+class SlowRequest:
+    # One Earth Engine request with fixed latency; tracks how many run at once
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def getInfo(self):
+        with SlowRequest.lock:
+            SlowRequest.active += 1
+            SlowRequest.peak = max(SlowRequest.peak, SlowRequest.active)
+        time.sleep(0.005)
+        with SlowRequest.lock:
+            SlowRequest.active -= 1
+        return 1
+
+
+def slow_pipeline(farm_id, coords, crs, out_dir, params):
+    return gee.get_info(SlowRequest())
+
+
+def timed_batch(farms, workers, inflight):
+    gee.set_max_inflight(inflight)
+    try:
+        t0 = time.perf_counter()
+        results, errors = batch.run_batch(farms, max_workers=workers, pipeline=slow_pipeline)
+        assert len(results) == len(farms) and not errors
+        return time.perf_counter() - t0
+    finally:
+        gee.set_max_inflight(8)
+
+
+def test_throughput_scales_with_workers():
+    farms = [(i, COORDS, "EPSG:4326") for i in range(1, 132)]
+    serial = timed_batch(farms, workers=1, inflight=1)
+    parallel = timed_batch(farms, workers=8, inflight=8)
+    assert serial / parallel > 4
+
+
+def test_inflight_cap_is_global():
+    SlowRequest.peak = 0
+    farms = [(i, COORDS, "EPSG:4326") for i in range(40)]
+    timed_batch(farms, workers=16, inflight=3)
+    assert SlowRequest.peak <= 3
+
+
+def test_quota_errors_are_retried():
+    class Flaky:
+        attempts = 0
+
+        def getInfo(self):
+            Flaky.attempts += 1
+            if Flaky.attempts < 3:
+                raise fake_ee.EEException("Quota exceeded: too many concurrent aggregations")
+            return "ok"
+
+    assert gee.get_info(Flaky(), backoff=0.001) == "ok"
+    assert Flaky.attempts == 3
+
+
+def test_farm_pipeline_writes_output_dir(tmp_path):
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3 + 0.02 * i, cloud_fraction=0.1, seed=i)
+              for i in range(20)]
+    fake_ee.register_collection('COPERNICUS/S2_SR_HARMONIZED', scenes)
+    results, errors = batch.run_batch([(7, COORDS[:-1], "EPSG:4326")], output_root=str(tmp_path))
+    assert not errors and results[7]["images"] == 20
+    table = pd.read_csv(tmp_path / "custom farm 7" / "stats.csv")
+    assert len(table) == 20 and (table["weight"] == 5).all()
+
+
+def test_tile_groups_share_one_query_per_group():
+    import numpy as np
+    import stats
+    import tiles
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3 + 0.02 * i, cloud_fraction=0.3, seed=i)
+              for i in range(8)]
+    fake_ee.register_collection('COPERNICUS/S2_SR_HARMONIZED', scenes)
+
+    farms = {}
+    for c, (lon0, lat0) in enumerate([(77.0, 28.0), (78.2, 28.0), (77.0, 29.3)]):
+        for k in range(6):
+            x, y = lon0 + 0.01 * k, lat0 + 0.005 * (k % 2)
+            farms[c * 10 + k] = [[x, y], [x, y + 0.002], [x + 0.003, y + 0.002], [x + 0.003, y], [x, y]]
+
+    fake_ee.reset()
+    results, groups = tiles.extract_stats_by_tile(farms, "2023-12-01", "2024-12-01")
+    assert len(groups) == 3 and fake_ee.calls == 3
+    assert sorted(results) == sorted(farms)
+
+    for farm_id in (0, 15, 23):
+        region = gee.create_region(farms[farm_id])
+        ic = gee.mask_and_calculate_ndvi(gee.load_s2_collection(region, "2023-12-01", "2024-12-01"))
+        expected = stats.extract_ndvi_stats_batched(ic, region)
+        assert results[farm_id][0] == expected[0]
+        for got, want in zip(results[farm_id][1:], expected[1:]):
+            np.testing.assert_allclose(got, want)
+
+    # 6 farms x 8 scenes = 48 features per group: pages of 20 take 3 requests per group
+    fake_ee.reset()
+    paged, _ = tiles.extract_stats_by_tile(farms, "2023-12-01", "2024-12-01", page_size=20)
+    assert fake_ee.calls == 3 * 3
+    for farm_id in farms:
+        assert paged[farm_id][0] == results[farm_id][0]
+        np.testing.assert_allclose(paged[farm_id][1], results[farm_id][1])
+
+
+def test_bulk_transform_matches_single_and_closes_rings():
+    import geopandas as gpd
+    import numpy as np
+    from shapely.geometry import Polygon
+    from benchmark import synthetic_farm_rings
+    rings = synthetic_farm_rings(n_farms=20, n_vertices=30)
+    bulk = gee.transform_coords_bulk(rings)
+    assert all(r[0] == r[-1] and len(r) == 31 for r in bulk)
+    for ring, out in zip(rings, bulk):
+        assert gee.transform_coords(ring.tolist()) == out
+    assert gee.get_transformer("EPSG:3857", "EPSG:4326") is gee.get_transformer("EPSG:3857", "EPSG:4326")
+
+    gdf = gpd.GeoDataFrame(geometry=[Polygon(r) for r in rings], crs="EPSG:3857")
+    np.testing.assert_allclose(np.array(gee.transform_geodataframe(gdf)), np.array(bulk))
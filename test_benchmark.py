@@ -0,0 +1,19 @@
+import benchmark
+
+
+def test_suite_records_and_comparison(tmp_path, capsys):
+    results = tmp_path / "results.jsonl"
+    records = benchmark.run_suite(latency=0.0, n_scenes=12, n_farms=20, plot_farms=1, repeat=1)
+    stages = {r["stage"]: r for r in records}
+    assert list(stages) == ["stats.batched", "stats.stream", "weights", "gapfill.pchip", "gapfill.whittaker", "plot"]
+    assert stages["stats.batched"]["round_trips"] == 1
+    assert stages["gapfill.pchip"]["round_trips"] == 0
+    assert all(r["wall_s"] > 0 and r["peak_mib"] > 0 for r in records)
+
+    benchmark.save_results(records, results, latency=0.0)
+    benchmark.save_results(records, results, latency=0.0)
+    saved = benchmark.load_results(results)
+    assert len(saved) == 2 * len(records) and saved[0]["latency_s"] == 0.0
+
+    benchmark.print_comparison(records, saved)
+    assert "+0.0%" in capsys.readouterr().out
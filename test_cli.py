@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from pyproj import Transformer
+
+import cli
+import fake_ee
+import pipeline
+from test_stats import COORDS, T0, DAY_MS
+
+HEAVY = ("ee", "pyproj", "scipy", "matplotlib", "pyarrow", "pandas")
+
+
+def farm_args(tmp_path, farm_id="7", shift=0.0):
+    to_meters = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    coords = tmp_path / f"farm{farm_id}.json"
+    coords.write_text(json.dumps([list(to_meters.transform(lon + shift, lat)) for lon, lat in COORDS[:-1]]))
+    return ["--coords", str(coords), "--farm-id", farm_id, "--cache-dir", str(tmp_path / "memo"),
+            "--stats-cache", str(tmp_path / "cache.sqlite"), "--store-root", str(tmp_path / "store")]
+
+
+def test_fetch_then_cached_commands_skip_earth_engine(tmp_path, capsys):
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.2 + 0.05 * i, cloud_fraction=0.2, seed=i)
+        for i in range(12)
+    ])
+    common = farm_args(tmp_path)
+    with pytest.raises(SystemExit, match="cache-only"):
+        cli.main(["report", *common, "--cache-only"])
+
+    fake_ee.reset()
+    outputs = cli.main(["fetch", *common])
+    assert len(outputs["stats"][0]) == 12 and fake_ee.calls > 0
+    assert os.path.isdir(tmp_path / "store")
+
+    fake_ee.reset()
+    cli.main(["gap-fill", *common, "--cache-only", "--output", str(tmp_path / "gapfill.csv")])
+    assert fake_ee.calls == 0
+    with open(tmp_path / "gapfill.csv") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["date", "mean", "univariate", "whittaker"] and len(rows) == 13
+
+    capsys.readouterr()
+    cli.main(["smooth", *common, "--sigma", "3", "--dry-run"])
+    assert capsys.readouterr().out.split() == ["stats", "disk", "smoothing", "run"]
+
+
+def test_refresh_drops_only_this_farm_and_keys_match_main(tmp_path):
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3, cloud_fraction=0.1, seed=i) for i in range(6)
+    ])
+    farm7, farm8 = farm_args(tmp_path), farm_args(tmp_path, "8", shift=0.01)
+    cli.main(["fetch", *farm7])
+    cli.main(["fetch", *farm8])
+    cli.main(["fetch", *farm7, "--refresh"])
+    fake_ee.reset()
+    cli.main(["report", *farm8, "--cache-only"])
+    assert fake_ee.calls == 0
+
+    # --sigma 2 and main.py's default share the smoothing memo key
+    args = cli.build_parser().parse_args(["smooth", *farm7, "--sigma", "2"])
+    params = cli.params_from_args(args)
+    pipe = pipeline.farm_pipeline(cache_dir=None)
+    assert pipe.key("smoothing", params) == pipe.key("smoothing", {**params, "sigma": pipeline.DEFAULT_PARAMS["sigma"]})
+
+
+def test_cached_report_cold_start_imports_nothing_heavy(tmp_path):
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3, cloud_fraction=0.1, seed=i) for i in range(6)
+    ])
+    common = farm_args(tmp_path)
+    cli.main(["fetch", *common])
+
+    # Fresh interpreter without the fake: loading the memoized statistics must not import ee
+    script = ("import json, sys, cli; cli.main(json.loads(sys.argv[1])); "
+              f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    out = subprocess.run([sys.executable, "-c", script, json.dumps(["report", *common, "--cache-only"])],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(cli.__file__)),
+                         check=True).stdout
+    assert json.loads(out.splitlines()[-1]) == []
+    assert len(out.splitlines()) == 1 + 6 + 1
@@ -0,0 +1,107 @@
+import numpy as np
+
+import climatology
+import store
+
+
+def seasonal(dates, peak):
+    doy = climatology.doy_bins(dates, 1)
+    return 0.2 + peak * np.exp(-((doy - 200) / 40.0) ** 2)
+
+
+def observations(n_farms=3, years=(2021, 2022, 2023), seed=0):
+    rng = np.random.default_rng(seed)
+    dates = np.concatenate([np.datetime64(f"{y}-01-01") + np.arange(0, 365, 5) for y in years])
+    farm_ids, obs_dates, ndvi, weights = [], [], [], []
+    for f in range(n_farms):
+        values = seasonal(dates, 0.2 * (f + 1)) + rng.normal(0, 0.02, len(dates))
+        w = rng.integers(1, 6, len(dates))
+        cloudy = rng.random(len(dates)) < 0.2
+        values[cloudy] = np.nan
+        w[cloudy] = 0
+        farm_ids += [f"farm{f}"] * len(dates)
+        obs_dates.append(dates)
+        ndvi.append(values)
+        weights.append(w)
+    return np.array(farm_ids), np.concatenate(obs_dates), np.concatenate(ndvi), np.concatenate(weights)
+
+
+# Distinct years in which a farm has a weighted acquisition in a DOY bin
+def observed_years(farm_ids, dates, weights, farm_id, b):
+    rows = (farm_ids == farm_id) & (weights > 0) & (climatology.doy_bins(dates) == b)
+    return len(np.unique(dates[rows].astype("datetime64[Y]")))
+
+
+def test_build_save_and_vectorized_scores(tmp_path):
+    obs = observations()
+    clim = climatology.Climatology.build(*obs)
+    assert list(clim.farm_ids) == ["farm0", "farm1", "farm2"]
+    assert clim.mean.shape == (3, climatology.n_bins()) and clim.percentiles.shape[-1] == len(climatology.PERCENTILES)
+
+    peak_bin = climatology.doy_bins(np.datetime64("2024-07-18"))
+    np.testing.assert_allclose(clim.mean[:, peak_bin], [0.4, 0.6, 0.8], atol=0.03)
+    assert clim.years[:, peak_bin].tolist() == [observed_years(obs[0], obs[1], obs[3], f, peak_bin)
+                                                for f in clim.farm_ids]
+    assert clim.years.max() == 3
+    assert (clim.percentiles[:, :, 0] <= clim.percentiles[:, :, -1]).all()
+
+    loaded = climatology.Climatology.load(clim.save(str(tmp_path / "clim.npz")))
+    np.testing.assert_array_equal(loaded.percentiles, clim.percentiles)
+
+    # One new scene date, every farm (plus one without history) scored in one call
+    farm_ids = ["farm2", "farm0", "farm1", "new"]
+    median = loaded.percentiles[[2, 0, 1], peak_bin, climatology.PERCENTILES.index(50)]
+    values = np.array([median[0], median[1] - 0.3, median[2], 0.5])
+    z, rank = loaded.score(farm_ids, np.datetime64("2024-07-18"), values)
+    np.testing.assert_allclose(rank[[0, 2]], 50)
+    assert abs(z[0]) < 0.5 and z[1] < -3 and rank[1] == 0
+    assert np.isnan(z[3]) and np.isnan(rank[3])
+
+
+def test_from_store_and_score_date(tmp_path):
+    root = str(tmp_path / "store")
+    farm_ids, dates, ndvi, weights = observations(n_farms=2, years=(2022, 2023))
+    for farm_id in ("farm0", "farm1"):
+        rows = farm_ids == farm_id
+        n = rows.sum()
+        valid = np.where(np.isnan(ndvi[rows]), 0, 90)
+        store.write_farm_stats(root, farm_id, ([str(d) for d in dates[rows]], ndvi[rows], ndvi[rows],
+                                               np.zeros(n), ndvi[rows], ndvi[rows], valid, np.full(n, 100)))
+    clim = climatology.Climatology.from_store(root, end="2022-12-31")
+    assert (clim.years.max(axis=1) == 1).all()
+
+    scored_ids, values, z, rank = climatology.score_store_date(clim, root, "2023-07-20")
+    assert sorted(scored_ids) == ["farm0", "farm1"]
+    finite = np.isfinite(values)
+    assert np.isfinite(z[finite]).all() and ((rank[finite] >= 0) & (rank[finite] <= 100)).all()
+
+
+def test_missing_year_is_neither_filled_nor_counted():
+    farm_ids, dates, ndvi, weights = observations(n_farms=2)
+    skipped = (farm_ids == "farm0") & (dates.astype("datetime64[Y]") == np.datetime64("2022", "Y"))
+    farm_ids, dates, ndvi, weights = farm_ids[~skipped], dates[~skipped], ndvi[~skipped], weights[~skipped]
+
+    rows = np.unique(farm_ids, return_inverse=True)[1]
+    daily, filled, observed = climatology.daily_filled(rows, dates, ndvi, weights, 2)
+    in_2022 = (daily >= np.datetime64("2022-02-01")) & (daily < np.datetime64("2022-12-01"))
+    assert np.isnan(filled[0, in_2022]).all() and np.isfinite(filled[1, in_2022]).all()
+    assert not observed[0, in_2022].any()
+
+    clim = climatology.Climatology.build(farm_ids, dates, ndvi, weights)
+    peak_bin = climatology.doy_bins(np.datetime64("2024-07-18"))
+    assert clim.years[0].max() == 2 and clim.years[1].max() == 3
+    assert clim.years[0, peak_bin] == observed_years(farm_ids, dates, weights, "farm0", peak_bin)
+    np.testing.assert_allclose(clim.mean[:, peak_bin], [0.4, 0.6], atol=0.03)
+
+
+def test_empty_input_gives_empty_climatology(tmp_path):
+    root = str(tmp_path / "store")
+    farm_ids, dates, ndvi, weights = observations(n_farms=1, years=(2022,))
+    store.write_farm_stats(root, "farm0", ([str(d) for d in dates], ndvi, ndvi, ndvi * 0, ndvi, ndvi,
+                                           np.where(np.isnan(ndvi), 0, 90), np.full(len(ndvi), 100)))
+    clim = climatology.Climatology.from_store(root, start="2030-01-01")
+    assert len(clim.farm_ids) == 0 and clim.mean.shape == (0, climatology.n_bins())
+
+    loaded = climatology.Climatology.load(clim.save(str(tmp_path / "empty.npz")))
+    z, rank = loaded.score(["farm0", "farm1"], np.datetime64("2024-07-18"), [0.5, 0.6])
+    assert np.isnan(z).all() and np.isnan(rank).all()
@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+
+import cube
+import fake_ee
+import gee
+import stats
+from test_stats import COORDS, T0, DAY_MS
+
+
+def raw_collection(n=12):
+    scenes = [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.2 + 0.05 * i,
+                                cloud_fraction=1.0 if i == 3 else 0.2, seed=i)
+        for i in range(n)
+    ]
+    return fake_ee.ImageCollection(scenes), gee.create_region(COORDS)
+
+
+def test_ee_cube_matches_remote_stats_and_is_fetched_once(tmp_path):
+    ic, region = raw_collection()
+    grid = cube.grid_for_region(COORDS, pixel_size=fake_ee.PIXEL_DEG)
+    downloader = cube.ee_downloader(ic, region, grid)
+
+    fake_ee.reset()
+    farm_cube = cube.download_cube(tmp_path, "f1", downloader, chunk_size=5, grid=grid)
+    assert fake_ee.calls == 1 + 1 + 12  # scene list, region mask, one download per scene
+    assert farm_cube.shape == (12, *farm_cube.region_mask.shape)
+    assert sorted(p.name for p in (tmp_path / "f1" / "B4").iterdir()) == ["000000.npz", "000005.npz", "000010.npz"]
+
+    remote = stats.extract_ndvi_stats_batched(gee.mask_and_calculate_ndvi(ic, cloud_threshold=30), region)
+    local = farm_cube.stats(cloud_threshold=30)
+    assert local[0] == remote[0]
+    # Bands are stored as float32 (exact for Sentinel-2 integer reflectances, not for the fake's)
+    for got, want in zip(local[1:6], remote[1:6]):
+        np.testing.assert_allclose(got, want, atol=1e-4)
+    np.testing.assert_array_equal(local[6], remote[6])
+    np.testing.assert_array_equal(local[7], remote[7])
+
+    # Re-running reuses the stored cube; other statistics and mask variants need no requests
+    fake_ee.reset()
+    again = cube.download_cube(tmp_path, "f1", downloader, grid=grid)
+    strict = again.stats(cloud_threshold=10)
+    pixels = again.pixel_series()
+    p25 = np.nanpercentile(pixels[:, 0], 25)
+    assert fake_ee.calls == 1
+    assert isinstance(again.band("B4"), np.memmap)
+    assert (strict[6] <= local[6][np.isin(local[0], strict[0])]).all()
+    assert pixels.shape == (farm_cube.region_mask.sum(), 12) and local[4][0] < p25 < local[2][0]
+
+
+def test_file_downloader_stand_in(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    rng = np.random.default_rng(0)
+    scenes = [{"id": f"s{i}", "date": f"2024-01-{1 + 5 * i:02d}"} for i in range(4)]
+    (source / "scenes.json").write_text(json.dumps(scenes))
+    mask = np.zeros((6, 8), dtype=bool)
+    mask[1:5, 2:7] = True
+    np.save(source / "mask.npy", mask)
+    bands = {}
+    for s in scenes:
+        b8 = rng.uniform(2000, 4000, (6, 8))
+        bands[s["id"]] = {"B4": b8 * 0.4, "B8": b8, "QA60": np.where(rng.random((6, 8)) < 0.2, 1024.0, 0.0)}
+        np.savez(source / f"{s['id']}.npz", **bands[s["id"]])
+
+    farm_cube = cube.download_cube(tmp_path / "cubes", 7, cube.file_downloader(source), chunk_size=3)
+    assert farm_cube.meta["bands"] == ["B4", "B8", "QA60"]
+    np.testing.assert_array_equal(farm_cube.band("QA60")[2], bands["s2"]["QA60"])
+    result = cube.PixelCube.open(tmp_path / "cubes", 7).stats()
+    assert result[0] == tuple(s["date"] for s in scenes)
+    np.testing.assert_allclose(result[1], (1 - 0.4) / (1 + 0.4), rtol=1e-6)
+    assert (result[7] == mask.sum()).all()
+
+
+def test_ee_downloader_without_cldprb_on_utm_grid(tmp_path):
+    # Sentinel-2 SR scenes carry no CLDPRB band: the cube holds B4/B8/QA60 and masks with QA60 only
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.5, cloud_fraction=0.2, seed=i, cldprb=False)
+              for i in range(3)]
+    ic, region = fake_ee.ImageCollection(scenes), gee.create_region(COORDS)
+    grid = cube.grid_for_region(COORDS, scale=10)
+    assert grid["crsCode"] == "EPSG:32643" and grid["affineTransform"]["scaleX"] == 10
+    assert grid["affineTransform"]["translateX"] % 10 == 0 and grid["affineTransform"]["translateY"] % 10 == 0
+
+    farm_cube = cube.download_cube(tmp_path, "f2", cube.ee_downloader(ic, region, grid), grid=grid)
+    assert farm_cube.meta["bands"] == ["B4", "B8", "QA60"]
+    # ~390 m x 330 m farm on 10 m pixels
+    assert 1100 < farm_cube.region_mask.sum() < 1400
+    result = farm_cube.stats()
+    np.testing.assert_allclose(result[1], 0.5, atol=0.02)
+    assert (result[7] == farm_cube.region_mask.sum()).all() and (result[6] < result[7]).all()
+
+
+def test_cube_is_downloaded_again_for_another_grid_or_bands(tmp_path):
+    ic, region = raw_collection(n=3)
+    old_grid = cube.grid_for_region(COORDS, pixel_size=fake_ee.PIXEL_DEG)
+    cube.download_cube(tmp_path, "f3", cube.ee_downloader(ic, region, old_grid), grid=old_grid)
+
+    # A cube from before the switch to the UTM grid is not served for the UTM grid
+    grid = cube.grid_for_region(COORDS, scale=10)
+    fake_ee.reset()
+    utm = cube.download_cube(tmp_path, "f3", cube.ee_downloader(ic, region, grid), grid=grid)
+    assert fake_ee.calls == 1 + 1 + 3 and utm.meta["grid"]["crsCode"] == "EPSG:32643"
+
+    fake_ee.reset()
+    cube.download_cube(tmp_path, "f3", cube.ee_downloader(ic, region, grid), grid=grid)
+    assert fake_ee.calls == 1
+
+    bands = ["B4", "B8", "QA60"]
+    fake_ee.reset()
+    fewer = cube.download_cube(tmp_path, "f3", cube.ee_downloader(ic, region, grid, bands), bands=bands, grid=grid)
+    assert fake_ee.calls == 1 + 1 + 3 and fewer.meta["bands"] == bands
@@ -0,0 +1,83 @@
+import csv
+import json
+
+import fake_ee
+import gee
+import instrument
+import interpolate
+import stats
+import weights
+from test_stats import COORDS, T0, DAY_MS
+
+
+def test_disabled_is_free():
+    original = gee.get_info
+    assert not instrument.enabled()
+    assert instrument.stage("stats") is instrument.farm("f1")
+    assert gee.get_info is original and gee._request.__module__ == "gee"
+
+
+def test_records_stages_farms_and_round_trips(tmp_path):
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3 + 0.04 * i, cloud_fraction=0.2, seed=i)
+              for i in range(10)]
+    originals = (gee.get_info, gee.mask_clouds_s2, stats.extract_ndvi_stats_batched)
+    instrument.reset()
+    instrument.enable(profile_path=str(tmp_path / "run.prof"), trace_memory=True)
+    try:
+        with instrument.farm("f1"):
+            region = gee.create_region(COORDS)
+            ndvi_collection = gee.mask_and_calculate_ndvi(fake_ee.ImageCollection(scenes))
+            with instrument.stage("stats"):
+                series = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+                list(stats.iter_ndvi_stats(ndvi_collection, region, chunk_size=4))
+            fractions = weights.calculate_valid_fractions(series[6], series[7])
+            interpolate.spline_interpolate_ndvi(series[0], series[1], method="whittaker",
+                                                weights=weights.assign_weights(fractions))
+    finally:
+        instrument.disable()
+    assert (gee.get_info, gee.mask_clouds_s2, stats.extract_ndvi_stats_batched) == originals
+
+    summary = instrument.report()
+    timings = {(t["kind"], t["name"]): t for t in summary["timings"]}
+    assert timings[("function", "cloud_mask.mask_clouds_s2")]["calls"] == 10
+    assert timings[("function", "stats.iter_ndvi_stats")]["calls"] == 1
+    assert timings[("stage", "stats")]["farm"] == "f1"
+    assert ("function", "interpolate.spline_interpolate_ndvi") in timings
+    assert ("farm", "total") in timings
+    # 1 batched + 1 size + 3 chunks for the stream
+    assert summary["round_trips"]["count"] == 5 and summary["round_trips"]["bytes"] > 0
+    assert summary["round_trips_per_farm"]["f1"]["count"] == 5
+    assert summary["memory"]["traced_peak_mib"] > 0
+
+    args = instrument.args_from_argv(["--instrument", str(tmp_path / "run")])
+    instrument.write_json(args.instrument + ".json", summary)
+    instrument.write_csv(args.instrument + ".csv", summary)
+    assert json.loads((tmp_path / "run.json").read_text())["round_trips"]["count"] == 5
+    with open(tmp_path / "run.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[-1]["name"] == "round_trip" and rows[-1]["calls"] == "5"
+    assert (tmp_path / "run.prof").stat().st_size > 0
+    instrument.reset()
+
+
+def test_round_trips_time_each_attempt_inside_the_slot():
+    class Flaky:
+        attempts = 0
+
+        def getInfo(self):
+            Flaky.attempts += 1
+            if Flaky.attempts < 3:
+                raise fake_ee.EEException("Quota exceeded: too many concurrent aggregations")
+            return "ok"
+
+    instrument.reset()
+    instrument.enable()
+    try:
+        assert gee.get_info(Flaky(), backoff=0.05) == "ok"
+    finally:
+        instrument.disable()
+    trips = instrument.report()["round_trips"]
+    # Three attempts, two of them failed; the >= 75 ms of backoff sleeps are not latency
+    assert trips["count"] == 3 and trips["failed"] == 2
+    assert trips["total_s"] < 0.05
+    instrument.reset()
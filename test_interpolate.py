@@ -0,0 +1,83 @@
+# test_interpolate.py
+import numpy as np
+import pytest
+import interpolate
+from benchmark import synthetic_series
+
+
+@pytest.mark.parametrize("method", ["pchip", "cubic", "univariate"])
+def test_batch_matches_per_series(method):
+    dates, ndvi = synthetic_series(n_farms=25)
+    date_strings = [str(d) for d in dates]
+    ndvi[4, 1:] = np.nan  # fewer than two valid points: passes through unchanged
+
+    masked = interpolate.mask_dates_for_interpolation(dates, ndvi, "2024-06-01", "2024-10-22")
+    batched = interpolate.spline_interpolate_ndvi(dates, masked, method=method)
+    per_row = interpolate.spline_interpolate_ndvi(np.tile(dates, (25, 1)), masked, method=method)
+
+    for i, row in enumerate(ndvi):
+        single = interpolate.mask_dates_for_interpolation(date_strings, row, "2024-06-01", "2024-10-22")
+        np.testing.assert_array_equal(single, masked[i])
+        expected = interpolate.spline_interpolate_ndvi(date_strings, single, method=method)
+        np.testing.assert_allclose(batched[i], expected, equal_nan=True)
+        np.testing.assert_allclose(per_row[i], expected, equal_nan=True)
+    np.testing.assert_array_equal(batched[4], masked[4])
+
+
+def test_outside_to_nan_keeps_only_window():
+    dates, ndvi = synthetic_series(n_farms=3)
+    masked = interpolate.mask_dates_for_interpolation(dates, ndvi, "2024-06-01", "2024-10-22", outside_to_nan=True)
+    outside = (dates < np.datetime64("2024-06-01")) | (dates > np.datetime64("2024-10-22"))
+    assert np.isnan(masked[:, outside]).all()
+
+
+def test_whittaker_matches_dense_solve():
+    n = 60
+    y = np.sin(np.arange(n) / 8.0)
+    w = np.ones(n)
+    w[10:20] = 0
+    D = np.diff(np.eye(n), 2, axis=0)
+    expected = np.linalg.solve(np.diag(w) + 100 * D.T @ D, w * y)
+    np.testing.assert_allclose(interpolate.whittaker_smooth(y, w, 100), expected, atol=1e-10)
+
+
+def test_whittaker_gap_fill_uses_weights():
+    dates, ndvi = synthetic_series(n_farms=4)
+    ndvi[:, 30] = 0.05          # cloud-contaminated drop
+    w = np.full(ndvi.shape, 5.0)
+    w[:, 30] = 0.0
+    filled = interpolate.spline_interpolate_ndvi(dates, ndvi, method="whittaker", weights=w)
+    unweighted = interpolate.spline_interpolate_ndvi(dates, ndvi, method="whittaker")
+
+    inside = ~np.isnan(filled)
+    assert inside[:, 1:-1].all()
+    assert (filled[:, 30] > unweighted[:, 30]).all()
+    np.testing.assert_allclose(filled[2], interpolate.spline_interpolate_ndvi(dates, ndvi[2], method="whittaker", weights=w[2]),
+                               equal_nan=True)
+
+
+@pytest.mark.parametrize("criterion", ["gcv", "loo"])
+def test_automatic_smoothing_tracks_noise_level(criterion):
+    dates, ndvi = synthetic_series(n_farms=20)       # noise sd 0.03
+    s, lam = interpolate.select_smoothing(dates, ndvi, criterion)
+    n_valid = (~np.isnan(ndvi)).sum(axis=1)
+    ratio = s / (n_valid * 0.03 ** 2)
+    assert s.shape == (20,) and np.isfinite(lam).all()
+    assert 0.5 < np.median(ratio) < 1.2
+
+    filled = interpolate.spline_interpolate_ndvi(dates, ndvi, method="univariate", smooth=criterion)
+    assert np.nanstd(filled - ndvi) < 0.04
+
+
+@pytest.mark.parametrize("criterion", ["gcv", "loo"])
+def test_automatic_smoothing_with_same_day_acquisitions(criterion):
+    dates = np.array(["2024-01-01", "2024-01-06", "2024-01-06", "2024-01-11", "2024-01-16",
+                      "2024-01-21", "2024-01-21", "2024-01-26", "2024-01-31"], dtype="datetime64[D]")
+    ndvi = np.array([0.30, 0.34, 0.36, 0.41, 0.45, 0.50, 0.48, 0.55, 0.58])
+    with np.errstate(divide="raise", invalid="raise"):
+        s, lam = interpolate.select_smoothing(dates, ndvi, criterion)
+    # The spread within a shared day is irreducible and counted in the smoothing factor
+    assert np.isfinite(lam).all() and s[0] >= (0.36 - 0.34) ** 2 / 2 + (0.50 - 0.48) ** 2 / 2
+
+    filled = interpolate.spline_interpolate_ndvi(dates, ndvi, method="univariate", smooth=criterion)
+    assert np.isfinite(filled).all()
@@ -0,0 +1,39 @@
+# test_local_backend.py
+import numpy as np
+import fake_ee
+import local_backend
+import stats
+from test_stats import make_collection, COORDS, T0, DAY_MS
+
+
+def stack_scenes(n=12):
+    # Same synthetic scenes as test_stats.make_collection, sampled as (time, y, x) band stacks
+    region = fake_ee.Geometry.Polygon(COORDS)
+    bands = {"B4": [], "B8": [], "QA60": [], "CLDPRB": []}
+    dates = []
+    for i in range(n):
+        scene = fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.2 + 0.05 * i,
+                                        cloud_fraction=1.0 if i == 3 else 0.2, seed=i)
+        arrays, inside = scene.sample(region)
+        for name in bands:
+            bands[name].append(arrays[name])
+        dates.append(stats.format_date(T0 + 5 * i * DAY_MS))
+    return dates, {k: np.stack(v) for k, v in bands.items()}, inside
+
+
+def test_local_matches_earth_engine_path():
+    dates, bands, inside = stack_scenes()
+    local = local_backend.extract_ndvi_stats(dates, bands["B4"], bands["B8"], bands["QA60"],
+                                             bands["CLDPRB"], region_mask=inside, cloud_threshold=30)
+    ndvi_collection, region = make_collection()
+    remote = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+    assert local[0] == remote[0]
+    for got, want in zip(local[1:], remote[1:]):
+        np.testing.assert_allclose(got, want)
+
+
+def test_mask_without_cldprb_uses_qa60_only():
+    qa60 = np.array([[[0, 1024], [2048, 0]]])
+    valid = local_backend.mask_clouds_s2(qa60)
+    assert valid.tolist() == [[[True, False], [False, True]]]
@@ -0,0 +1,90 @@
+import numpy as np
+
+import fake_ee
+import partials
+import stats
+from test_stats import COORDS, make_collection
+
+BIN = (partials.HIST_MAX - partials.HIST_MIN) / partials.HIST_BINS
+
+
+def test_tiled_reduction_matches_whole_region():
+    ndvi_collection, region = make_collection()
+    expected = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+    fake_ee.reset()
+    merged = partials.extract_partials_tiled(ndvi_collection, region, COORDS, tile_size=0.0015)
+    assert fake_ee.calls == 6  # 3 x 2 tiles, one round trip each
+    result = merged.finalize()
+
+    assert result[0] == expected[0]
+    np.testing.assert_array_equal(result[6], expected[6])
+    np.testing.assert_array_equal(result[7], expected[7])
+    np.testing.assert_allclose(result[1], expected[1], rtol=1e-9)
+    np.testing.assert_allclose(result[3], expected[3], rtol=1e-6)
+    for got, want in zip(result[2:6:2], expected[2:6:2]):  # median, p10
+        np.testing.assert_allclose(got, want, atol=2 * BIN)
+    np.testing.assert_allclose(result[5], expected[5], atol=2 * BIN)
+
+
+def test_merge_is_exact_and_rolls_up_farms():
+    rng = np.random.default_rng(0)
+    dates = np.array(["2024-01-01", "2024-01-06", "2024-01-11"], dtype="datetime64[D]")
+    values = rng.normal(0.5, 0.15, (3, 4000))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    values[1] = np.nan  # fully masked date
+
+    whole = partials.StatsPartial.from_values(dates, values)
+    parts = [partials.StatsPartial.from_values(dates, values[:, i:i + 1000]) for i in range(0, 4000, 1000)]
+    merged = partials.merge_all(parts)
+    np.testing.assert_array_equal(merged.count, whole.count)
+    np.testing.assert_array_equal(merged.hist, whole.hist)
+    np.testing.assert_allclose(merged.mean, whole.mean)
+    np.testing.assert_allclose(merged.m2, whole.m2)
+
+    result = merged.finalize()
+    assert result[0] == ("2024-01-01", "2024-01-11")
+    kept = values[[0, 2]]
+    np.testing.assert_allclose(result[3], np.nanstd(kept, axis=1))
+    np.testing.assert_allclose(result[2], np.nanmedian(kept, axis=1), atol=BIN)
+    np.testing.assert_allclose(result[4], np.nanpercentile(kept, 10, axis=1), atol=BIN)
+
+    # Farms with different acquisition dates roll up on the union of dates
+    other = partials.StatsPartial.from_values(np.array(["2024-01-03"], dtype="datetime64[D]"), values[:1, :500])
+    units = partials.rollup({"a": parts[0], "b": parts[1], "c": other, "d": parts[2]},
+                            {"a": "village1", "b": "village1", "c": "village1"})
+    village = units["village1"]
+    assert list(units) == ["village1"] and len(village) == 4
+    assert village.total.tolist() == [2000, 500, 2000, 2000]
+
+
+def test_same_day_acquisitions_stay_separate():
+    # Two scenes of one day (overlap of two MGRS granules) are two rows, in every tile
+    dates = np.array(["2024-01-01", "2024-01-06", "2024-01-06"], dtype="datetime64[D]")
+    values = np.random.default_rng(2).normal(0.5, 0.1, (3, 200))
+    tile = partials.StatsPartial.from_values(dates, values)
+    merged = tile.merge(partials.StatsPartial.from_values(dates, values))
+    assert len(merged) == 3 and merged.count.tolist() == [400, 400, 400]
+    np.testing.assert_allclose(merged.mean, values.mean(axis=1))
+
+    by_scene = partials.StatsPartial.from_values(dates, values, ids=["a", "b", "c"])
+    other = partials.StatsPartial.from_values(dates[1:], values[1:], ids=["c", "d"])
+    assert by_scene.merge(other).count.tolist() == [200, 200, 400, 200]
+
+
+def test_partial_from_local_cube():
+    import local_backend
+    rng = np.random.default_rng(1)
+    ndvi = rng.uniform(-0.2, 0.9, (4, 30, 40))
+    ndvi[rng.random(ndvi.shape) < 0.2] = np.nan
+    mask = np.zeros((30, 40), dtype=bool)
+    mask[5:25, 8:30] = True
+    dates = ["2024-01-01", "2024-01-06", "2024-01-11", "2024-01-16"]
+
+    expected = local_backend.ndvi_cube_stats(dates, ndvi, mask)
+    result = partials.partial_from_cube(dates, ndvi, mask).finalize()
+    assert result[0] == expected[0]
+    np.testing.assert_allclose(result[1], expected[1])
+    np.testing.assert_allclose(result[3], expected[3])
+    np.testing.assert_array_equal(result[7], expected[7])
+    np.testing.assert_allclose(result[2], expected[2], atol=BIN)
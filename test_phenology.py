@@ -0,0 +1,47 @@
+# test_phenology.py
+import numpy as np
+import phenology
+
+
+def legacy_stage_colors(ndvi):
+    # The original per-element loop from plot.get_stage_colors
+    ndvi_diff = np.diff(ndvi, prepend=ndvi[0])
+    colors = []
+    for i, val in enumerate(ndvi):
+        if val < 0.1:
+            colors.append("#b3c6e0")
+        elif 0.1 <= val < 0.3:
+            colors.append("#cccccc")
+        elif 0.3 <= val < 0.75 and ndvi_diff[i] >= 0:
+            colors.append("#3ac96a")
+        elif 0.75 <= val <= 1.0:
+            colors.append("#005902")
+        elif 0.3 < val < 0.75 and ndvi_diff[i] < 0:
+            colors.append("#f5c542")
+        else:
+            colors.append("#cccccc")
+    return colors
+
+
+def test_classify_matches_legacy_loop():
+    rng = np.random.default_rng(0)
+    ndvi = np.round(rng.uniform(-0.2, 1.1, (6, 80)), 2)
+    ndvi[0, 5] = np.nan
+    ndvi[1, :4] = [0.1, 0.3, 0.75, 0.3]
+    stages = phenology.classify_stages(ndvi)
+    for row, codes in zip(ndvi, stages):
+        assert list(phenology.stage_colors(codes)) == legacy_stage_colors(row)
+
+
+def test_season_metrics_of_gaussian_season():
+    dates = np.datetime64("2024-01-01") + np.arange(100) * np.timedelta64(3, "D")
+    t = np.arange(100)
+    ndvi = np.vstack([0.2 + 0.6 * np.exp(-((t - 50) / 15.0) ** 2), np.full(100, np.nan)])
+    metrics = phenology.season_metrics(dates, ndvi)
+
+    half_width = 3 * 15 * np.sqrt(np.log(2))
+    assert metrics["peak_date"][0] == np.datetime64("2024-01-01") + np.timedelta64(150, "D")
+    np.testing.assert_allclose(metrics["peak_value"][0], 0.8, atol=1e-6)
+    np.testing.assert_allclose(metrics["season_length"][0], 2 * half_width, rtol=0.01)
+    np.testing.assert_allclose(metrics["greenup_rate"][0], metrics["senescence_rate"][0], rtol=0.01)
+    assert np.isnat(metrics["sos"][1]) and np.isnan(metrics["peak_value"][1])
@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+from pyproj import Transformer
+
+import fake_ee
+import pipeline
+from test_stats import COORDS, T0, DAY_MS
+
+
+def farm_params(tmp_path, **overrides):
+    to_meters = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    coords_meters = [list(to_meters.transform(lon, lat)) for lon, lat in COORDS[:-1]]
+    return {
+        **pipeline.DEFAULT_PARAMS,
+        "coords_meters": coords_meters,
+        "stats_cache": str(tmp_path / "cache.sqlite"),
+        "store_root": str(tmp_path / "store"),
+        **overrides,
+    }
+
+
+def ran(pipe):
+    return [name for name, how, _ in pipe.log if how == "run"]
+
+
+def test_parameter_change_recomputes_only_downstream(tmp_path):
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.2 + 0.05 * i, cloud_fraction=0.2, seed=i)
+        for i in range(12)
+    ])
+    cache_dir = tmp_path / "memo"
+    targets = ["store", "gapfill", "smoothing"]
+    params = farm_params(tmp_path)
+
+    first = pipeline.farm_pipeline(cache_dir=cache_dir)
+    out = first.run(targets, params)
+    assert ran(first) == ["region", "collection", "mask", "stats", "weights", "store", "gapfill", "smoothing"]
+    assert len(out["stats"][0]) == 12
+
+    # New offline process (fresh pipeline, same cache directory): nothing reaches Earth Engine
+    fake_ee.reset()
+    t0 = time.perf_counter()
+    pipe = pipeline.farm_pipeline(cache_dir=cache_dir, offline=True)
+    again = pipe.run(targets, {**params, "sigma": 3})
+    assert time.perf_counter() - t0 < 1.0
+    assert fake_ee.calls == 0 and ran(pipe) == ["smoothing"]
+    np.testing.assert_array_equal(again["gapfill"][0], out["gapfill"][0])
+    assert not np.allclose(again["smoothing"][0], out["smoothing"][0])
+
+    pipe.run(targets, {**params, "sigma": 3, "interp_start": "2024-07-01", "method": "pchip"})
+    assert ran(pipe) == ["gapfill"]
+
+    pipe.run(targets, {**params, "cloud_threshold": 50})
+    assert ran(pipe) == ["region", "collection", "mask", "stats", "weights", "store", "gapfill", "smoothing"]
+    pipe.run(targets, {**params, "cloud_threshold": 50})
+    assert ran(pipe) == []
+
+
+def test_new_scenes_change_the_statistics_key(tmp_path):
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3, cloud_fraction=0.1, seed=i) for i in range(8)]
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", scenes)
+    cache_dir = tmp_path / "memo"
+    params = farm_params(tmp_path)
+    pipeline.farm_pipeline(cache_dir=cache_dir).run("gapfill", params)
+
+    # Same scene list: loaded from disk after one scene-list round trip
+    pipe = pipeline.farm_pipeline(cache_dir=cache_dir)
+    assert pipe.plan("gapfill", params) == {"gapfill": "disk"}
+
+    # A newly acquired scene in the same fixed date window is picked up, offline runs keep the last list
+    fake_ee.register_collection("COPERNICUS/S2_SR_HARMONIZED", scenes + [
+        fake_ee.synthetic_scene(T0 + 40 * DAY_MS, ndvi=0.3, cloud_fraction=0.1, seed=8)])
+    assert len(pipeline.farm_pipeline(cache_dir=cache_dir, offline=True).run("stats", params)["stats"][0]) == 8
+    pipe = pipeline.farm_pipeline(cache_dir=cache_dir)
+    assert len(pipe.run("gapfill", params)["stats"][0]) == 9 and "stats" in ran(pipe)
+    assert len(pipeline.farm_pipeline(cache_dir=cache_dir, offline=True).run("stats", params)["stats"][0]) == 9
+
+
+def test_local_statistics_follow_rewritten_files(tmp_path):
+    pipe = pipeline.Pipeline(cache_dir=tmp_path / "memo")
+    source = tmp_path / "dates.txt"
+    source.write_text("2024-01-01\n")
+
+    @pipe.stage("stats", params=("local_stack", "local_dates_file"), version=pipeline._file_versions)
+    def stats(p):
+        return open(p["local_dates_file"]).read().split()
+
+    params = {"local_stack": {}, "local_dates_file": str(source)}
+    assert pipe.run("stats", params)["stats"] == ["2024-01-01"]
+    source.write_text("2024-01-01\n2024-01-06\n")
+    assert pipe.run("stats", params)["stats"] == ["2024-01-01", "2024-01-06"]
+
+
+def test_memory_only_stage_and_clear(tmp_path):
+    calls = []
+    pipe = pipeline.Pipeline(cache_dir=tmp_path)
+
+    @pipe.stage("source", params=("a",), persist=False)
+    def source(p):
+        calls.append("source")
+        return p["a"]
+
+    @pipe.stage("double", deps=("source",))
+    def double(p, value):
+        calls.append("double")
+        return 2 * value
+
+    assert pipe.run("double", {"a": 2})["double"] == 4
+    assert pipe.run("double", {"a": 2, "unused": 1})["double"] == 4
+    assert calls == ["source", "double"]
+
+    pipe.clear("double")
+    assert pipe.run("double", {"a": 2})["double"] == 4
+    assert calls == ["source", "double", "source", "double"]
@@ -0,0 +1,74 @@
+# test_plot.py
+import numpy as np
+import pytest
+from matplotlib.collections import PolyCollection
+import plot
+from benchmark import synthetic_series
+
+
+def render_all(dates_f, values):
+    plot.plot_mean_ndvi(dates_f, values, values)
+    plot.plot_median_ndvi(dates_f, values, values)
+    plot.plot_ndvi_stddev(dates_f, values, values)
+    plot.plot_ndvi_percentiles(dates_f, values, values, values, values)
+    plot.plot_valid_pixel_count(dates_f, np.arange(len(values)))
+    plot.plot_valid_pixel_fraction(dates_f, values)
+    plot.plot_all_ndvi_statistics(dates_f, values, values, values, values, values)
+    plot.plot_mean_ndvi_with_spline(dates_f, values, values, values)
+    plot.plot_mean_ndvi_with_linear(dates_f, values, values, values)
+
+
+@pytest.mark.parametrize("as_strings", [True, False])
+def test_headless_render_reuses_one_figure(tmp_path, as_strings):
+    dates, ndvi = synthetic_series(n_farms=1)
+    values = np.nan_to_num(ndvi[0], nan=0.3)
+    dates_f = tuple(str(d) for d in dates) if as_strings else dates
+
+    plot.configure(output_dir=str(tmp_path), formats=("png",))
+    try:
+        render_all(dates_f, values)
+        ax = plot._canvas["ax"]
+        plot.plot_mean_ndvi(dates_f, values, values)
+        shading = [c for c in ax.collections if isinstance(c, PolyCollection)]
+        assert len(shading) == 1 and len(shading[0].get_paths()) == len(values) - 1
+        assert plot._canvas["fig"] is ax.figure
+    finally:
+        plot.close()
+        plot.configure()
+
+    names = {p.stem for p in tmp_path.iterdir()}
+    assert {"mean", "median", "STDV", "perc", "pix", "fraction", "all_stat", "spline", "linear"} <= names
+
+
+def test_headless_output_restores_previous_backend(tmp_path):
+    import matplotlib.pyplot as plt
+    original = plt.get_backend()
+    plt.switch_backend("svg")
+    try:
+        plot.configure(output_dir=str(tmp_path))
+        plot.configure(output_dir=str(tmp_path / "again"))
+        assert plt.get_backend().lower() == "agg"
+        plot.configure()
+        assert plt.get_backend().lower() == "svg" and plot._canvas["fig"] is None
+    finally:
+        plt.switch_backend(original)
+
+
+def test_reports_render_in_pool_and_skip_unchanged(tmp_path):
+    import report
+    dates, ndvi = synthetic_series(n_farms=2, n_dates=20)
+    farm_series = {}
+    for farm_id, row in zip((1, 2), np.nan_to_num(ndvi, nan=0.3)):
+        pixels = np.full(len(row), 90)
+        farm_series[farm_id] = (tuple(str(d) for d in dates), row, row, row * 0.1, row - 0.1, row + 0.1,
+                                pixels, np.full(len(row), 100))
+
+    rendered, skipped = report.generate_reports(farm_series, str(tmp_path), max_workers=2)
+    assert sorted(rendered) == [1, 2] and skipped == []
+    farm_dir = tmp_path / "custom farm 1"
+    assert {"mean.png", "median.png", "STDV.png", "perc.png", "pix.png", "all_stat.png",
+            "custom farm 1.pdf"} <= {p.name for p in farm_dir.iterdir()}
+
+    farm_series[2] = farm_series[2][:1] + (farm_series[2][1] + 0.01,) + farm_series[2][2:]
+    rendered, skipped = report.generate_reports(farm_series, str(tmp_path), max_workers=2)
+    assert list(rendered) == [2] and skipped == [1]
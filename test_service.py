@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import numpy as np
+
+import load_test
+import service
+import store
+
+DATES = [str(np.datetime64("2024-06-01") + np.timedelta64(5 * i, "D")) for i in range(8)]
+
+
+def write_farm(root, farm_id, mean):
+    mean = np.asarray(mean, dtype=float)
+    valid = np.where(np.isnan(mean), 0, 90)
+    store.write_farm_stats(root, farm_id, (DATES, mean, mean, mean * 0, mean - 0.1, mean + 0.1, valid, np.full(8, 100)))
+
+
+def respond(ndvi_service, target):
+    status, body = asyncio.run(ndvi_service.respond(target))
+    return status, json.loads(body) if isinstance(body, bytes) else body
+
+
+def test_queries_cache_and_invalidation(tmp_path):
+    root = str(tmp_path)
+    write_farm(root, "a", [0.2, 0.35, np.nan, 0.6, 0.8, 0.7, 0.5, np.nan])
+    write_farm(root, "b", [0.1] * 8)
+    ndvi_service = service.NDVIService(root)
+
+    assert respond(ndvi_service, "/farms") == (200, {"farms": ["a", "b"]})
+    status, series = respond(ndvi_service, "/farms/a/series?start=2024-06-06&end=2024-06-21")
+    assert status == 200 and series["dates"] == DATES[1:5]
+    assert series["mean"] == [0.35, None, 0.6, 0.8] and series["weight"] == [5, 0, 5, 5]
+    assert series["stage"] == ["rapid growth", None, "rapid growth", "peak"]
+
+    status, filled = respond(ndvi_service, "/farms/a/series?fill=whittaker")
+    # interior gaps are filled, dates after the last observation are not extrapolated
+    assert status == 200 and filled["filled"][2] is not None and filled["filled"][-1] is None
+    assert filled["stage"][-2] == "senescence/maturity"
+
+    status, latest = respond(ndvi_service, "/latest?farms=a,b")
+    assert [f["date"] for f in latest["farms"]] == [DATES[6], DATES[7]]
+    assert latest["farms"][0]["mean"] == 0.5 and latest["farms"][0]["stage"] == "senescence/maturity"
+
+    hits = ndvi_service.hits
+    respond(ndvi_service, "/latest?farms=a,b")
+    assert ndvi_service.hits == hits + 1
+
+    # Rewriting a farm changes its file version: the cached response is not served again
+    write_farm(root, "b", [0.1] * 7 + [0.4])
+    assert respond(ndvi_service, "/latest?farms=a,b")[1]["farms"][1]["mean"] == 0.4
+
+    assert respond(ndvi_service, "/farms/zz/latest")[0] == 404
+    assert respond(ndvi_service, "/nothing")[0] == 404
+    assert respond(ndvi_service, "/farms/a/series?fill=spline")[0] == 400
+    assert respond(ndvi_service, "/farms/a/series?start=June")[0] == 400
+
+
+def test_windowed_series_matches_full_series(tmp_path):
+    root = str(tmp_path)
+    write_farm(root, "a", [0.2, 0.5, 0.8, np.nan, 0.6, 0.5, 0.45, 0.4])
+    ndvi_service = service.NDVIService(root)
+    for fill in ("", "&fill=whittaker"):
+        full = respond(ndvi_service, f"/farms/a/series?start=2024-06-01{fill}")[1]
+        windowed = respond(ndvi_service, f"/farms/a/series?start=2024-06-21&end=2024-07-01{fill}")[1]
+        assert windowed["stage"] == full["stage"][4:7] and windowed["stage"][0] == "senescence/maturity"
+        assert windowed.get("filled") == (full["filled"][4:7] if fill else None)
+    full = respond(ndvi_service, "/farms/a/series")[1]
+    assert respond(ndvi_service, "/farms/a/latest")[1]["stage"] == full["stage"][-1]
+
+
+def test_http_load(tmp_path):
+    farm_ids = load_test.synthetic_store(str(tmp_path), n_farms=20, n_dates=30)
+    ndvi_service, port = load_test.start_in_thread(str(tmp_path))
+    status, body = asyncio.run(load_test.fetch_json("127.0.0.1", port, "/farms/3/latest"))
+    assert status == 200 and body["farm_id"] == "3"
+
+    result = load_test.load_test("127.0.0.1", port, farm_ids, n_requests=400, concurrency=8)
+    assert result["requests"] == 400 and result["errors"] == 0
+    assert result["p50_ms"] <= result["p99_ms"]
+    assert ndvi_service.hits > ndvi_service.misses
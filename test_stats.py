@@ -0,0 +1,139 @@
+# test_stats.py
+import numpy as np
+import fake_ee
+import gee
+import stats
+
+COORDS = [[77.0, 28.0], [77.0, 28.003], [77.004, 28.003], [77.004, 28.0], [77.0, 28.0]]
+DAY_MS = 86400 * 1000
+T0 = 1701388800000  # 2023-12-01
+
+
+def make_collection(n=12):
+    scenes = [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.2 + 0.05 * i,
+                                cloud_fraction=1.0 if i == 3 else 0.2, seed=i)
+        for i in range(n)
+    ]
+    region = gee.create_region(COORDS)
+    ic = fake_ee.ImageCollection(scenes)
+    return gee.mask_and_calculate_ndvi(ic, cloud_threshold=30), region
+
+
+def test_batched_matches_per_image():
+    ndvi_collection, region = make_collection()
+    count = ndvi_collection.size().getInfo()
+    expected = stats.extract_ndvi_stats(ndvi_collection.toList(count), region, count)
+    result = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+    assert len(result) == 8
+    assert result[0] == expected[0]
+    assert "2023-12-16" not in result[0]  # fully clouded scene is dropped
+    for got, want in zip(result[1:], expected[1:]):
+        np.testing.assert_allclose(got, want)
+    assert result[6].dtype == int and result[7].dtype == int
+
+
+def test_batched_is_single_round_trip():
+    ndvi_collection, region = make_collection()
+    count = 12
+
+    fake_ee.reset()
+    stats.extract_ndvi_stats(ndvi_collection.toList(count), region, count)
+    assert fake_ee.calls == 8 * count
+
+    fake_ee.reset()
+    stats.extract_ndvi_stats_batched(ndvi_collection, region)
+    assert fake_ee.calls == 1
+
+
+def test_batched_empty_collection():
+    _, region = make_collection()
+    result = stats.extract_ndvi_stats_batched(fake_ee.ImageCollection([]), region)
+    assert result[0] == [] and result[1].size == 0
+
+
+def test_extract_ndvi_series_is_compact_and_matches_tuple():
+    import interpolate
+    import weights
+    from ndvi_series import NDVISeries
+    ndvi_collection, region = make_collection()
+    expected = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+    series = stats.extract_ndvi_series(ndvi_collection, region, farm_id="f1")
+
+    assert series.dates.dtype == "datetime64[D]" and series.mean.dtype == np.float32
+    assert series.valid_pixels.dtype == np.int32
+    got = series.as_tuple()
+    assert got[0] == expected[0]
+    for a, b in zip(got[1:], expected[1:]):
+        np.testing.assert_allclose(a, b, rtol=1e-6)
+
+    np.testing.assert_array_equal(weights.assign_weights(series),
+                                  weights.assign_weights(weights.calculate_valid_fractions(expected[6], expected[7])))
+    np.testing.assert_allclose(interpolate.spline_interpolate_ndvi(series),
+                               interpolate.spline_interpolate_ndvi(expected[0], series.mean), equal_nan=True)
+
+    grown = NDVISeries(capacity=1)
+    for record in zip(*expected):
+        grown.append(*record)
+    assert len(grown) == len(expected[0]) and grown.trim().capacity == len(grown)
+
+    # Features without system:time_start are kept with an unknown date, as the tuple path does
+    grown.append(stats.format_date(None), 0.4, 0.4, 0.1, 0.3, 0.5, 90, 100)
+    assert np.isnat(grown.dates[-1]) and grown.as_tuple()[0][-1] == "Unknown"
+    assert np.isnat(NDVISeries.from_tuple(grown.as_tuple()).dates[-1])
+
+
+def test_streaming_yields_chunks_and_feeds_consumers(tmp_path):
+    import store
+    import stats_cache
+    import weights
+    ndvi_collection, region = make_collection(40)
+    expected = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+    fake_ee.reset()
+    stream = stats.iter_ndvi_stats(ndvi_collection, region, chunk_size=8, prefetch=2)
+    first = next(stream)
+    assert first[1][0] == "2023-12-01"
+    rest = list(stream)
+    assert fake_ee.calls == 1 + 5
+    assert tuple(r[0] for _, r in [first, *rest]) == expected[0]
+
+    cache = stats_cache.StatsCache(str(tmp_path / "cache.sqlite"))
+    key = stats_cache.region_hash(COORDS)
+    stream = stats.iter_ndvi_stats(ndvi_collection, region, chunk_size=8, complete_only=False)
+    stream = stats_cache.cache_stream(cache, stream, key, 30, 90, chunk_size=16)
+    weighted = list(weights.with_weights(stream))
+    assert len(cache) == 40 and len(weighted) == 40
+    np.testing.assert_array_equal([w for _, record, _, w in weighted if stats.is_complete(record)],
+                                  weights.assign_weights(weights.calculate_valid_fractions(expected[6], expected[7])))
+
+    rows = store.write_farm_stream(str(tmp_path / "store"), "f", stats.iter_ndvi_stats(ndvi_collection, region), chunk_size=10)
+    assert rows == len(expected[0])
+    np.testing.assert_allclose(store.read_farm_series(str(tmp_path / "store"), "f")[1], expected[1], rtol=1e-6)
+
+
+def test_prescreen_drops_low_valid_scenes_in_same_round_trip():
+    import weights
+    scenes = [
+        fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.5, cloud_fraction=(0.0, 0.85, 0.4, 1.0)[i % 4], seed=i)
+        for i in range(12)
+    ]
+    region = gee.create_region(COORDS)
+    ndvi_collection = gee.mask_and_calculate_ndvi(fake_ee.ImageCollection(scenes), cloud_threshold=30)
+    full = stats.extract_ndvi_stats_batched(ndvi_collection, region)
+
+    fake_ee.reset()
+    screened = stats.extract_ndvi_stats_batched(gee.prescreen_collection(ndvi_collection, region), region)
+    assert fake_ee.calls == 1
+
+    fractions = weights.calculate_valid_fractions(full[6], full[7])
+    kept = [d for d, f in zip(full[0], fractions) if f >= 0.35]
+    assert list(screened[0]) == kept and len(kept) == 6
+    assert (weights.assign_weights(weights.calculate_valid_fractions(screened[6], screened[7])) > 0).all()
+
+    summary = gee.screen_summary(ndvi_collection, region)
+    assert summary == {"scenes": 12, "kept": 6, "dropped": 6}
+    # The threshold itself is excluded, as weight 0 is at exactly SCREEN_MIN_FRACTION
+    assert fractions[0] == 1.0
+    assert gee.screen_summary(ndvi_collection, region, min_fraction=1.0, margin=0)["kept"] == 0
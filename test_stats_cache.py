@@ -0,0 +1,48 @@
+# test_stats_cache.py
+import numpy as np
+import fake_ee
+import gee
+import stats
+import stats_cache
+from test_stats import COORDS, T0, DAY_MS
+
+PARAMS = dict(cloud_threshold=30, cloud_pct=90, scale=10)
+
+
+def collection(n):
+    scenes = [fake_ee.synthetic_scene(T0 + 5 * i * DAY_MS, ndvi=0.3 + 0.02 * i,
+                                      cloud_fraction=1.0 if i == 2 else 0.1, seed=i, index=f"S2_{i:03d}")
+              for i in range(n)]
+    return gee.mask_and_calculate_ndvi(fake_ee.ImageCollection(scenes), cloud_threshold=30)
+
+
+def test_rerun_only_fetches_new_scenes(tmp_path):
+    cache = stats_cache.StatsCache(str(tmp_path / "cache.sqlite"))
+    region = gee.create_region(COORDS)
+    key = stats_cache.region_hash(COORDS)
+
+    first = stats_cache.extract_ndvi_stats_cached(cache, collection(10), region, key, **PARAMS)
+    np.testing.assert_allclose(first[1], stats.extract_ndvi_stats_batched(collection(10), region)[1])
+    assert len(cache) == 10  # the fully clouded scene is cached as well
+
+    fake_ee.reset()
+    again = stats_cache.extract_ndvi_stats_cached(cache, collection(10), region, key, **PARAMS)
+    assert fake_ee.calls == 1 and again[0] == first[0]
+
+    fake_ee.reset()
+    grown = stats_cache.extract_ndvi_stats_cached(cache, collection(12), region, key, **PARAMS)
+    assert fake_ee.calls == 2 and len(grown[0]) == 11 and len(cache) == 12
+
+
+def test_eviction_and_invalidation(tmp_path):
+    cache = stats_cache.StatsCache(str(tmp_path / "cache.sqlite"), max_entries=5)
+    record = ("2024-01-01", 0.5, 0.5, 0.1, 0.4, 0.6, 10, 12)
+    cache.put({f"a{i}": record for i in range(4)}, "r", 30, 90, 10)
+    cache.get(["a0"], "r", 30, 90, 10)
+    cache.put({f"b{i}": record for i in range(3)}, "r", 40, 90, 10)
+    assert len(cache) == 5
+    assert "a0" in cache.get(["a0", "a1", "a2"], "r", 30, 90, 10)
+
+    assert cache.invalidate_stale("r", 40, 90, 10) > 0
+    assert set(cache.get([f"b{i}" for i in range(3)], "r", 40, 90, 10)) == {"b0", "b1", "b2"}
+    assert len(cache) == 3
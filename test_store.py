@@ -0,0 +1,52 @@
+# test_store.py
+import numpy as np
+import store
+import weights
+
+
+def farm_series(start, n, level):
+    dates = tuple(str(np.datetime64(start) + np.timedelta64(5 * i, "D")) for i in range(n))
+    values = np.linspace(level, level + 0.3, n)
+    return (dates, values, values, values * 0.1, values - 0.1, values + 0.1,
+            np.arange(n) + 50, np.full(n, 100))
+
+
+def test_write_and_read_back(tmp_path):
+    root = str(tmp_path / "store")
+    for farm_id in range(1, 6):
+        store.write_farm_stats(root, farm_id, farm_series("2023-12-01", 40, 0.1 * farm_id))
+    series = farm_series("2023-12-01", 40, 0.3)
+
+    back = store.read_farm_series(root, 3)
+    assert back[0] == series[0]
+    for got, want in zip(back[1:], series[1:]):
+        np.testing.assert_allclose(got, want, rtol=1e-6)
+
+    frame = store.read_stats(root, farm_ids=[2, 4], start="2024-01-01", end="2024-01-31")
+    assert set(frame["farm_id"]) == {"2", "4"}
+    assert np.issubdtype(frame["date"].dtype, np.datetime64)
+    assert frame["date"].min() >= np.datetime64("2024-01-01") and frame["date"].max() <= np.datetime64("2024-01-31")
+    np.testing.assert_array_equal(frame["weight"][:2], weights.assign_weights(frame["fraction"][:2]))
+    assert store.farm_ids(root) == ["1", "2", "3", "4", "5"]
+    # NumPy integer ids (e.g. from a GeoDataFrame column) select one farm like plain ints
+    assert store.read_farm_series(root, np.int64(3))[0] == series[0]
+
+
+def test_rewrite_replaces_overlapping_dates(tmp_path):
+    root = str(tmp_path / "store")
+    store.write_farm_stats(root, "a", farm_series("2024-01-01", 10, 0.2))
+    store.write_farm_stats(root, "a", farm_series("2024-01-26", 10, 0.5))
+    frame = store.read_stats(root, "a")
+    assert len(frame) == 15 and frame["date"].is_monotonic_increasing
+    np.testing.assert_allclose(frame["mean"].iloc[5], 0.5, rtol=1e-6)
+
+
+def test_scenes_without_timestamp_are_skipped(tmp_path):
+    root = str(tmp_path / "store")
+    series = farm_series("2024-01-01", 4, 0.2)
+    unknown = (series[0][:2] + ("Unknown",) + series[0][3:], *series[1:])
+    fractions = np.asarray(series[6]) / np.asarray(series[7])
+    store.write_farm_stats(root, "a", unknown, fractions, weights.assign_weights(fractions))
+    back = store.read_farm_series(root, "a")
+    assert back[0] == series[0][:2] + series[0][3:]
+    np.testing.assert_allclose(back[1], np.delete(series[1], 2), rtol=1e-6)
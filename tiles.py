@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+from shapely.geometry import Polygon, box
+from shapely.strtree import STRtree
+
+import gee
+import stats
+
+# Tile-grouped scheduling: neighbouring farms share Sentinel-2 scenes, so farms are grouped
+# by proximity (an STRtree over all farm polygons) and every group runs one collection query,
+# one masked-NDVI map and one reduceRegions over all member farms, fetched in one round trip (or a few pages).
+# Cost grows with the number of groups (distinct tiles), not the number of farms.
+
+# Sentinel-2 MGRS tiles are 110 km squares; groups are kept well inside one tile
+GROUP_SIZE_DEG = 0.5
+# Earth Engine refuses to return collections of more than 5000 elements in one request, so the
+# farms x scenes features of a group are fetched in pages of at most this many
+PAGE_SIZE = 5000
+
+# Group farms {farm_id: lon/lat ring} into lists of ids whose joint bounding box is at most
+# group_size degrees on each side
+def group_farms(farms, group_size=GROUP_SIZE_DEG):
+    ids = list(farms)
+    polygons = [Polygon(farms[i]) for i in ids]
+    tree = STRtree(polygons)
+    order = sorted(range(len(ids)), key=lambda k: (polygons[k].bounds[0], polygons[k].bounds[1]))
+    assigned = set()
+    groups = []
+    for k in order:
+        if k in assigned:
+            continue
+        xmin, ymin = polygons[k].bounds[:2]
+        window = box(xmin, ymin, xmin + group_size, ymin + group_size)
+        members = [int(m) for m in tree.query(window, predicate="contains") if int(m) not in assigned]
+        if k not in members:
+            members.append(k)
+        assigned.update(members)
+        groups.append([ids[m] for m in sorted(members)])
+    return groups
+
+def group_bounds(farms, member_ids):
+    xs = [p[0] for i in member_ids for p in farms[i]]
+    ys = [p[1] for i in member_ids for p in farms[i]]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+# Server-side statistics of every member farm for every image of the group's collection
+def group_stats_collection(farms, member_ids, start_date, end_date, cloud_pct=90, cloud_threshold=30, scale=10):
+    footprint = ee.Geometry.Rectangle(group_bounds(farms, member_ids))
+    ic = gee.load_s2_collection(footprint, start_date, end_date, cloud_pct=cloud_pct)
+    ndvi_collection = gee.mask_and_calculate_ndvi(ic, cloud_threshold=cloud_threshold)
+
+    farm_fc = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Polygon(farms[i]), {'farm_id': str(i)}) for i in member_ids
+    ])
+    # Total (unmasked) pixel count of each farm, computed once per group
+    farm_fc = ee.Image.constant(1).reduceRegions(
+        collection=farm_fc, reducer=ee.Reducer.count(), scale=scale
+    ).map(lambda f: f.set('total_pixels', f.get('count')))
+
+    def reduce_image(img):
+        return img.select('NDVI').reduceRegions(
+            collection=farm_fc, reducer=stats.ndvi_reducer(), scale=scale
+        ).map(lambda f: f.set({
+            'system:time_start': img.get('system:time_start'),
+            'system:index': img.get('system:index'),
+        }))
+
+    return ee.FeatureCollection(ndvi_collection.map(reduce_image)).flatten()
+
+# reduceRegions on a single band names outputs without the band prefix
+def _group_feature_record(props):
+    renamed = {f"NDVI_{k}": props.get(k) for k in ("mean", "median", "stdDev", "p10", "p90", "count")}
+    return stats.feature_to_record({**props, **renamed})
+
+# 8-tuple of stats.extract_ndvi_stats for every farm of one group, one getInfo() call per page of
+# page_size features (a single call for groups of up to page_size farms x scenes)
+def extract_group_stats(farms, member_ids, start_date, end_date, cloud_pct=90, cloud_threshold=30, scale=10,
+                        page_size=PAGE_SIZE):
+    fc = group_stats_collection(farms, member_ids, start_date, end_date, cloud_pct, cloud_threshold, scale)
+    features = []
+    while True:
+        page = gee.get_info(fc.toList(page_size, len(features)))
+        features.extend(page)
+        if len(page) < page_size:
+            break
+    records = {str(i): [] for i in member_ids}
+    for f in features:
+        props = f['properties']
+        records[props['farm_id']].append(_group_feature_record(props))
+    return {i: stats.records_to_arrays(records[str(i)]) for i in member_ids}
+
+# Statistics for all farms {farm_id: lon/lat ring}, one query per group, groups run concurrently
+def extract_stats_by_tile(farms, start_date, end_date, cloud_pct=90, cloud_threshold=30, scale=10,
+                          group_size=GROUP_SIZE_DEG, max_workers=4, page_size=PAGE_SIZE):
+    groups = group_farms(farms, group_size)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        jobs = [pool.submit(extract_group_stats, farms, members, start_date, end_date,
+                            cloud_pct, cloud_threshold, scale, page_size) for members in groups]
+        for job in jobs:
+            results.update(job.result())
+    return results, groups
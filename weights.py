@@ -1,22 +1,24 @@
 import numpy as np
+from ndvi_series import NDVISeries
 
-def calculate_valid_fractions(valid_pixels, total_pixels):
+# Accepts the valid/total pixel counts, or an NDVISeries as the only argument
+def calculate_valid_fractions(valid_pixels, total_pixels=None):
+    if isinstance(valid_pixels, NDVISeries):
+        return valid_pixels.valid_fractions()
     fractions = np.array(valid_pixels) / np.array(total_pixels)
     return fractions
 
+# Quality weight 0-5 per acquisition from its valid pixel fraction (or an NDVISeries)
 def assign_weights(fractions):
-    def get_weight(f):
-        if f > 0.80:
-            return 5
-        elif f > 0.65:
-            return 4
-        elif f > 0.55:
-            return 3
-        elif f > 0.40:
-            return 2
-        elif f > 0.30:
-            return 1
-        else:
-            return 0
-    weights = np.array([get_weight(f) for f in fractions])
+    if isinstance(fractions, NDVISeries):
+        fractions = fractions.valid_fractions()
+    f = np.asarray(fractions, dtype=float)
+    weights = np.select([f > 0.80, f > 0.65, f > 0.55, f > 0.40, f > 0.30], [5, 4, 3, 2, 1], default=0)
     return weights
+
+# Incremental weighting of a stats.iter_ndvi_stats stream: yields (image_id, record, fraction, weight)
+def with_weights(stream):
+    for image_id, record in stream:
+        valid, total = record[6], record[7]
+        fraction = valid / total if valid is not None and total else np.nan
+        yield image_id, record, fraction, int(assign_weights(fraction))